@@ -1,15 +1,17 @@
 from pydantic_ai import Agent, RunContext
 from helpers.utils import get_prompt, get_today_date_str
-from agents.models import LLM_MODEL
+from agents.models import get_agent_model, get_model_config, agent_model_settings
 from agents.tools import TOOLS
 from pydantic_ai.settings import ModelSettings
 from agents.deps import FarmerContext
 
 
-from agents.models import LLM_PROVIDER
+from agents.models import PROMPT_LAYOUT, prompt_cache_settings
 from agents.tools.search import search_documents
 from agents.tools.terms import search_terms
 
+LLM_PROVIDER = get_model_config('agrinet').provider
+
 # Filter tools for Groq to avoid API errors with specific complex tools
 if LLM_PROVIDER == 'groq':
     # Remove search_terms and search_documents
@@ -19,7 +21,7 @@ else:
 
 
 agrinet_agent = Agent(
-    model=LLM_MODEL,
+    model=get_agent_model('agrinet'),
     name="Vistaar Agent",
     output_type=str,
     deps=FarmerContext,
@@ -27,14 +29,21 @@ agrinet_agent = Agent(
     tools=AGENT_TOOLS,
     end_strategy='exhaustive',
     model_settings=ModelSettings(
-        max_tokens=8192,
         parallel_tool_calls=True,
+        **prompt_cache_settings('agrinet', LLM_PROVIDER),
+        **agent_model_settings('agrinet', max_tokens=8192),
    )
 )
 
-@agrinet_agent.system_prompt
-def get_system_prompt(ctx: RunContext[FarmerContext]) -> str:
-    from agents.models import LLM_PROVIDER
+def render_system_prompt() -> str:
+    """The agrinet system prompt for the configured provider and prompt layout."""
     # Determine prompt file based on provider
     prompt_file = 'agrinet_system_groq' if LLM_PROVIDER == 'groq' else 'agrinet_system'
-    return get_prompt(prompt_file, context={'today_date': get_today_date_str()})
\ No newline at end of file
+    if PROMPT_LAYOUT == 'cached':
+        # The date is sent at the end of the user message instead (see FarmerContext)
+        return get_prompt(prompt_file)
+    return get_prompt(prompt_file, context={'today_date': get_today_date_str()})
+
+@agrinet_agent.system_prompt
+def get_system_prompt(ctx: RunContext[FarmerContext]) -> str:
+    return render_system_prompt()
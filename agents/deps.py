@@ -8,6 +8,7 @@ class FarmerContext(BaseModel):
     query: str = Field(description="The user's question.")
     lang_code: str = Field(description="The language code of the user's question.", default='mr')
     moderation_str: Optional[str] = Field(default=None, description="The moderation result of the user's question.")
+    today_date: Optional[str] = Field(default=None, description="Today's date, when it is not part of the system prompt.")
 
     def update_moderation_str(self, moderation_str: str):
         """Update the moderation result of the user's question."""
@@ -31,9 +32,17 @@ class FarmerContext(BaseModel):
         else:
             return None
     
+    def _date_string(self):
+        """Get the date string for the agrinet agent."""
+        if self.today_date:
+            return f"**Today's date:** {self.today_date}"
+        else:
+            return None
+
     def get_user_message(self):
         """Get the user message for the agrinet agent."""
-        strings = [self._query_string(), self._language_string(), self._moderation_string(),]
+        # Volatile parts last, after everything that could be part of a cached prefix
+        strings = [self._query_string(), self._language_string(), self._moderation_string(), self._date_string(),]
         return "\n".join([x for x in strings if x])
 
     
@@ -1,11 +1,22 @@
 import os
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Optional, Tuple
+import httpx
+from openai import APIConnectionError, AsyncOpenAI
+from pydantic_ai.exceptions import ModelHTTPError
 from pydantic_ai.models.openai import OpenAIModel
 from pydantic_ai.models.gemini import GeminiModel
+from pydantic_ai.models.fallback import FallbackModel
+from pydantic_ai.models.wrapper import WrapperModel
 from pydantic_ai.providers.openai import OpenAIProvider
 from pydantic_ai.providers.google_gla import GoogleGLAProvider
 from pydantic_ai.models.groq import GroqModel
 from pydantic_ai.providers.groq import GroqProvider
 from dotenv import load_dotenv
+from helpers.metrics import metrics
 from helpers.utils import get_logger
 
 load_dotenv()
@@ -15,64 +26,223 @@ logger = get_logger(__name__)
 LLM_PROVIDER = os.getenv('LLM_PROVIDER').lower().strip()
 LLM_MODEL_NAME = os.getenv('LLM_MODEL_NAME').strip()
 
+# "cached" keeps system prompts byte-identical across requests and moves
+# volatile content (today's date) into the user message, so that providers
+# can reuse the system prompt prefix. "inline" renders the date into it.
+PROMPT_LAYOUT = os.getenv('PROMPT_LAYOUT', 'cached').lower().strip()
+
 # Debug logging
 logger.info(f"Initializing LLM - Provider: '{LLM_PROVIDER}', Model: '{LLM_MODEL_NAME}'")
 
-def get_llm_model():
+
+@dataclass(frozen=True)
+class ModelConfig:
+    """Provider, model and endpoint used by one agent."""
+    provider: str
+    model_name: str
+    base_urls: Tuple[str, ...] = ()
+    api_key: Optional[str] = None
+
+
+def get_model_config(agent: Optional[str] = None) -> ModelConfig:
+    """
+    Read the model configuration of an agent from the environment.
+
+    Each agent can override the defaults with variables prefixed by its name,
+    e.g. MODERATION_LLM_PROVIDER, MODERATION_LLM_MODEL_NAME and, for vllm,
+    MODERATION_INFERENCE_ENDPOINT_URL / MODERATION_INFERENCE_API_KEY.
+
+    For vllm, INFERENCE_ENDPOINT_URLS takes a comma separated list of replicas
+    to balance requests over.
+    """
+    prefix = f"{agent.upper()}_" if agent else ""
+    provider = os.getenv(f'{prefix}LLM_PROVIDER', LLM_PROVIDER).lower().strip()
+    model_name = os.getenv(f'{prefix}LLM_MODEL_NAME', '').strip()
+    if not model_name:
+        if provider != LLM_PROVIDER:
+            raise ValueError(f"{prefix}LLM_MODEL_NAME is required when {prefix}LLM_PROVIDER is set")
+        model_name = LLM_MODEL_NAME
+
+    base_urls, api_key = (), None
+    if provider == 'vllm':
+        urls = (
+            os.getenv(f'{prefix}INFERENCE_ENDPOINT_URLS') or os.getenv(f'{prefix}INFERENCE_ENDPOINT_URL')
+            or os.getenv('INFERENCE_ENDPOINT_URLS') or os.getenv('INFERENCE_ENDPOINT_URL') or ''
+        )
+        base_urls = tuple(url.strip() for url in urls.split(',') if url.strip())
+        api_key = os.getenv(f'{prefix}INFERENCE_API_KEY') or os.getenv('INFERENCE_API_KEY', 'empty')
+    return ModelConfig(provider, model_name, base_urls, api_key)
+
+
+def agent_model_settings(agent: str, **defaults) -> dict:
+    """Per-agent generation settings, e.g. MODERATION_LLM_MAX_TOKENS or SUGGESTIONS_LLM_TEMPERATURE."""
+    prefix = agent.upper()
+    settings = dict(defaults)
+    for name, cast in (('max_tokens', int), ('temperature', float), ('top_p', float)):
+        value = os.getenv(f'{prefix}_LLM_{name.upper()}')
+        if value:
+            settings[name] = cast(value)
+    return settings
+
+
+def prompt_cache_settings(cache_key: str, provider: str = LLM_PROVIDER) -> dict:
+    """Model settings that help the provider reuse a cached prompt prefix.
+
+    OpenAI caches prefixes of 1024+ tokens automatically; a cache key routes
+    requests sharing a prefix to the same cache. vLLM (--enable-prefix-caching),
+    Gemini (implicit caching) and Groq need nothing in the request beyond a
+    stable prefix.
+    """
+    if PROMPT_LAYOUT == 'cached' and provider == 'openai':
+        return {'extra_body': {'prompt_cache_key': cache_key}}
+    return {}
+
+
+def cached_tokens(usage) -> int:
+    """Prompt tokens served from the provider's prefix cache, if reported."""
+    details = usage.details or {}
+    # OpenAI and vLLM report cached_tokens, Gemini cached_content_token_count
+    return details.get('cached_tokens') or details.get('cached_content_token_count') or 0
+
+
+@lru_cache(maxsize=None)
+def get_llm_model(config: Optional[ModelConfig] = None):
     """Confingure and return the LLM model based on environment settings."""
-    
-    if LLM_PROVIDER == 'gemini':
+    config = config or get_model_config()
+
+    if config.provider == 'gemini':
         api_key = os.getenv('GEMINI_API_KEY')
         if not api_key:
             raise ValueError("GEMINI_API_KEY is not set in environment variables")
-            
+
         return GeminiModel(
-            LLM_MODEL_NAME,
+            config.model_name,
             provider=GoogleGLAProvider(api_key=api_key)
-        )   
-        
-    elif LLM_PROVIDER in ['groq']:
+        )
+
+    elif config.provider in ['groq']:
         api_key = os.getenv('GROQ_API_KEY')
         if not api_key:
             raise ValueError("GROQ_API_KEY is not set in environment variables")
-            
+
         return GroqModel(
-            LLM_MODEL_NAME,
+            config.model_name,
             provider=GroqProvider(api_key=api_key)
         )
-        
-    elif LLM_PROVIDER == 'vllm':
-        base_url = os.getenv('INFERENCE_ENDPOINT_URL')
-        api_key = os.getenv('INFERENCE_API_KEY', 'empty')
-        
-        if not base_url:
+
+    elif config.provider == 'vllm':
+        if not config.base_urls:
             raise ValueError("INFERENCE_ENDPOINT_URL is required for vllm provider")
-            
+
+        if len(config.base_urls) == 1:
+            return OpenAIModel(
+                config.model_name,
+                provider=OpenAIProvider(
+                    base_url=config.base_urls[0],
+                    api_key=config.api_key
+                ),
+            )
+
+        # Several replicas: the pooled transport picks one per request and retries on
+        # another, so the OpenAI client's own retries (against the same pool) are off
+        from helpers.llm_pool import EndpointPool, PooledTransport
+        pool = EndpointPool(config.base_urls)
+        logger.info(f"Balancing {config.model_name} over {len(pool)} endpoints ({pool.strategy})")
         return OpenAIModel(
-            LLM_MODEL_NAME,
+            config.model_name,
             provider=OpenAIProvider(
-                base_url=base_url, 
-                api_key=api_key
+                openai_client=AsyncOpenAI(
+                    base_url=config.base_urls[0],
+                    api_key=config.api_key,
+                    max_retries=0,
+                    http_client=httpx.AsyncClient(transport=PooledTransport(pool)),
+                )
             ),
         )
-        
-    elif LLM_PROVIDER == 'openai':
+
+    elif config.provider == 'openai':
         api_key = os.getenv('OPENAI_API_KEY')
         if not api_key:
             raise ValueError("OPENAI_API_KEY is not set in environment variables")
-            
+
         return OpenAIModel(
-            LLM_MODEL_NAME,
+            config.model_name,
             provider=OpenAIProvider(api_key=api_key),
         )
-        
+
     else:
         supported_providers = ['gemini', 'groq', 'vllm', 'openai']
-        raise ValueError(f"Invalid LLM_PROVIDER: {LLM_PROVIDER}. Must be one of: {supported_providers}")
+        raise ValueError(f"Invalid LLM_PROVIDER: {config.provider}. Must be one of: {supported_providers}")
+
+
+class MeteredModel(WrapperModel):
+    """Records latency and token usage of every request as `llm.<agent>` metrics."""
+
+    def __init__(self, wrapped, agent: str):
+        super().__init__(wrapped)
+        self.agent = agent
+
+    def _record(self, started: float, usage, error: bool = False) -> None:
+        elapsed = time.perf_counter() - started
+        metrics.observe(f"llm.{self.agent}", elapsed, error=error)
+        if usage is None:
+            return
+        metrics.incr(f"llm.{self.agent}.input_tokens", usage.request_tokens or 0)
+        metrics.incr(f"llm.{self.agent}.output_tokens", usage.response_tokens or 0)
+        metrics.incr(f"llm.{self.agent}.cached_tokens", cached_tokens(usage))
+        logger.info(
+            f"[LLM] {self.agent} via {self.wrapped.model_name}: {elapsed:.2f}s, "
+            f"{usage.request_tokens} in ({cached_tokens(usage)} cached) / {usage.response_tokens} out tokens"
+        )
+
+    async def request(self, messages, model_settings, model_request_parameters):
+        started = time.perf_counter()
+        try:
+            response = await self.wrapped.request(messages, model_settings, model_request_parameters)
+        except Exception:
+            self._record(started, None, error=True)
+            raise
+        self._record(started, response.usage)
+        return response
+
+    @asynccontextmanager
+    async def request_stream(self, messages, model_settings, model_request_parameters):
+        started = time.perf_counter()
+        try:
+            async with self.wrapped.request_stream(messages, model_settings, model_request_parameters) as response_stream:
+                # The stream is open once the first chunk has arrived
+                metrics.observe(f"llm.{self.agent}.first_chunk", time.perf_counter() - started)
+                yield response_stream
+        except Exception:
+            self._record(started, None, error=True)
+            raise
+        self._record(started, response_stream.usage())
+
+
+def _is_unavailable(exc: Exception) -> bool:
+    """Errors after which a request is retried on the default model."""
+    return isinstance(exc, (ModelHTTPError, APIConnectionError, httpx.TransportError))
+
+
+def get_agent_model(agent: str):
+    """
+    Model for an agent. An agent routed to a model of its own (e.g. a small
+    vLLM-served model for moderation) falls back to the default model when
+    that one is unavailable, unless <AGENT>_LLM_FALLBACK=false.
+    """
+    config = get_model_config(agent)
+    model = get_llm_model(config)
+    default = get_model_config()
+    if config != default:
+        logger.info(f"Routing {agent} agent to {config.model_name} via {config.provider}")
+        if os.getenv(f'{agent.upper()}_LLM_FALLBACK', 'true').lower() == 'true':
+            model = FallbackModel(model, get_llm_model(default), fallback_on=_is_unavailable)
+    return MeteredModel(model, agent)
+
 
 try:
     LLM_MODEL = get_llm_model()
     logger.info(f"LLM Model successfully configured: {LLM_MODEL_NAME} via {LLM_PROVIDER}")
 except Exception as e:
     logger.critical(f"Failed to configure LLM Model: {str(e)}")
-    raise
\ No newline at end of file
+    raise
@@ -3,7 +3,6 @@ from typing import Literal
 from pydantic_ai import Agent
 from helpers.utils import get_prompt
 from pydantic_ai.models import ModelSettings
-from agents.models import LLM_MODEL
 
 
 class QueryModerationResult(BaseModel):
@@ -21,13 +20,15 @@ class QueryModerationResult(BaseModel):
         category_str = self.category.replace("_", " ").title()
         return f"**Moderation Recommendation:** {self.action} ({category_str})"
 
-from agents.models import LLM_MODEL, LLM_PROVIDER
+from agents.models import get_agent_model, get_model_config, agent_model_settings, prompt_cache_settings
+
+LLM_PROVIDER = get_model_config('moderation').provider
 
 # Determine prompt file based on provider
 prompt_file = 'moderation_system_groq' if LLM_PROVIDER == 'groq' else 'moderation_system'
 
 moderation_agent = Agent(
-    model=LLM_MODEL,
+    model=get_agent_model('moderation'),
     name="Moderation Agent",
     system_prompt=get_prompt(prompt_file),
     output_type=QueryModerationResult,
@@ -39,6 +40,8 @@ moderation_agent = Agent(
         # temperature=0.5,  # Absolute determinism for consistent outputs
         # top_p=0.95,      # Slightly higher to ensure all valid options are considered
         parallel_tool_calls=False,
+        **prompt_cache_settings('moderation', LLM_PROVIDER),
+        **agent_model_settings('moderation'),
         # extra_body={
         #     "top_k": 40,  # Increased to provide a wider range of token options
         #     "min_p": 0.05  # Small value to filter out extremely unlikely tokens
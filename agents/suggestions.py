@@ -1,17 +1,26 @@
 from pydantic_ai import Agent
 from pydantic_ai.settings import ModelSettings
 from typing import List
+from pydantic import BaseModel, Field
 from helpers.utils import get_prompt
-from agents.models import LLM_MODEL
 from agents.tools.search import search_documents
 from pydantic_ai import Tool
 
 
-from agents.models import LLM_MODEL, LLM_PROVIDER
+from agents.models import get_agent_model, get_model_config, agent_model_settings, prompt_cache_settings
+
+LLM_PROVIDER = get_model_config('suggestions').provider
+LLM_MODEL = get_agent_model('suggestions')
 
 # Determine prompt file based on provider
 prompt_file = 'suggestions_system_groq' if LLM_PROVIDER == 'groq' else 'suggestions_system'
 
+
+class SessionSuggestions(BaseModel):
+    conversation: int = Field(description="Number of the conversation the suggestions are for.")
+    suggestions: List[str] = Field(description="3-5 suggested questions for the farmer to ask.")
+
+
 suggestions_agent = Agent(
     name="Suggestions Agent",
     model=LLM_MODEL,
@@ -29,5 +38,30 @@ suggestions_agent = Agent(
     ] if LLM_PROVIDER != 'groq' else [],
     model_settings=ModelSettings(
         parallel_tool_calls=False, # Prevent multiple tool calls
+        **prompt_cache_settings('suggestions', LLM_PROVIDER),
+        **agent_model_settings('suggestions'),
+    )
+)
+
+# Suggestions for several conversations in one request
+batch_suggestions_agent = Agent(
+    name="Batch Suggestions Agent",
+    model=LLM_MODEL,
+    system_prompt=f"{get_prompt(prompt_file)}\n\n{get_prompt('suggestions_batch')}",
+    output_type=List[SessionSuggestions],
+    result_tool_name="suggestions",
+    result_tool_description="Suggested questions for each numbered conversation.",
+    retries=1,
+    end_strategy='exhaustive',
+    tools=[
+        Tool(
+            search_documents,
+            takes_ctx=False,
+        )
+    ] if LLM_PROVIDER != 'groq' else [],
+    model_settings=ModelSettings(
+        parallel_tool_calls=False, # Prevent multiple tool calls
+        **prompt_cache_settings('suggestions_batch', LLM_PROVIDER),
+        **agent_model_settings('suggestions'),
     )
-)
\ No newline at end of file
+)
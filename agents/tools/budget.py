@@ -0,0 +1,77 @@
+"""
+Token budgets for tool outputs.
+
+Tool results are sent back to the LLM on every step of a run and are kept in
+the conversation history, so large upstream responses inflate prompt tokens
+and latency for the rest of the session. Each tool ranks its output sections
+(search hits by score, warehouses by distance, forecast days by date) and keeps
+the best ones that fit within its budget.
+"""
+from typing import Callable, Dict, List, Sequence, TypeVar
+from helpers.utils import count_tokens_str, get_logger
+
+logger = get_logger(__name__)
+
+T = TypeVar("T")
+
+DEFAULT_TOKEN_BUDGET = 2_000
+
+# Maximum number of tokens each tool may return to the agent
+TOOL_TOKEN_BUDGETS: Dict[str, int] = {
+    "search_documents": 3_000,
+    "weather_forecast": 1_500,
+    "warehouse_data": 1_500,
+    "get_scheme_info": 4_000,
+}
+
+
+def get_token_budget(tool_name: str) -> int:
+    """Get the output token budget for a tool."""
+    return TOOL_TOKEN_BUDGETS.get(tool_name, DEFAULT_TOKEN_BUDGET)
+
+
+def select_within_budget(
+    tool_name: str,
+    sections: Sequence[T],
+    render: Callable[[T], str] = str,
+) -> List[T]:
+    """Keep the highest ranked sections that fit within a tool's token budget.
+
+    Sections are kept in ranked order until one does not fit. The top section is
+    always kept so that a tool never returns an empty result because of the
+    budget alone.
+
+    Args:
+        tool_name: Name of the tool, used to look up the budget.
+        sections: Output sections, best ranked first.
+        render: Function returning the text a section contributes to the output.
+
+    Returns:
+        List[T]: The sections to keep, in ranked order.
+    """
+    budget = get_token_budget(tool_name)
+    kept: List[T] = []
+    used = 0
+    dropped = 0
+    full = False
+    for section in sections:
+        tokens = count_tokens_str(render(section))
+        # Once a section does not fit, drop everything ranked below it
+        full = full or (bool(kept) and used + tokens > budget)
+        if full:
+            dropped += tokens
+            continue
+        kept.append(section)
+        used += tokens
+
+    if full:
+        logger.info(
+            f"[Tool Budget] {tool_name}: kept {len(kept)}/{len(sections)} sections, "
+            f"{used} tokens used, {dropped} tokens saved (budget {budget})"
+        )
+    return kept
+
+
+def omitted_note(count: int, noun: str = "results") -> str:
+    """Note appended to a tool output when sections were dropped."""
+    return f"_({count} more {noun} omitted to keep the response short.)_"
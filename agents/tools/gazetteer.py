@@ -0,0 +1,145 @@
+"""
+Offline gazetteer of Maharashtra districts, talukas and villages.
+
+Most geocoding requests are for a limited set of places in Maharashtra, so they
+are resolved in-process from a compact table before falling back to Nominatim.
+The table is built by ``scripts/build_gazetteer.py`` and is a tab separated file
+with the columns::
+
+    name  aliases  kind  taluka  district  latitude  longitude
+
+``aliases`` holds ``|`` separated alternate names (Marathi and transliterated
+spellings). ``kind`` is one of ``district``, ``taluka`` or ``village``.
+"""
+import csv
+import gzip
+import os
+from collections import defaultdict
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+from rapidfuzz import fuzz, process
+from helpers.utils import fold_place_name, get_logger
+
+logger = get_logger(__name__)
+
+GAZETTEER_PATH = os.getenv("GAZETTEER_PATH", "assets/gazetteer_mh.tsv.gz")
+
+# Higher ranked kinds win when a name matches several places in one district
+KIND_RANK = {"district": 3, "taluka": 2, "village": 1}
+
+FUZZY_SCORE_CUTOFF = 90
+PREFIX_LENGTH = 2
+
+
+def normalize_name(name: str) -> str:
+    """Normalize a place name for lookups."""
+    return fold_place_name(name)
+
+
+@dataclass(frozen=True)
+class Place:
+    name: str
+    kind: str
+    taluka: str
+    district: str
+    latitude: float
+    longitude: float
+
+    @property
+    def display_name(self) -> str:
+        parts = [self.name]
+        if self.kind == "village" and self.taluka:
+            parts.append(self.taluka)
+        if self.kind != "district" and self.district:
+            parts.append(self.district)
+        parts.append("Maharashtra")
+        return ", ".join(parts)
+
+
+class Gazetteer:
+    """In-memory index over the gazetteer table with exact, prefix and fuzzy lookup."""
+
+    def __init__(self, places: List[Tuple[Place, List[str]]]):
+        self.places: Dict[str, List[Place]] = defaultdict(list)
+        self._by_prefix: Dict[str, List[str]] = defaultdict(list)
+        for place, aliases in places:
+            for alias in {normalize_name(place.name), *map(normalize_name, aliases)}:
+                if alias:
+                    self.places[alias].append(place)
+        for key in self.places:
+            self._by_prefix[key[:PREFIX_LENGTH]].append(key)
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def load(cls, path: str) -> "Gazetteer":
+        opener = gzip.open if path.endswith(".gz") else open
+        places = []
+        with opener(path, "rt", encoding="utf-8", newline="") as f:
+            for row in csv.DictReader(f, delimiter="\t"):
+                place = Place(
+                    name=row["name"],
+                    kind=row["kind"],
+                    taluka=row["taluka"],
+                    district=row["district"],
+                    latitude=float(row["latitude"]),
+                    longitude=float(row["longitude"]),
+                )
+                aliases = [a for a in row["aliases"].split("|") if a]
+                places.append((place, aliases))
+        return cls(places)
+
+    def __len__(self) -> int:
+        return len(self.places)
+
+    def _candidates(self, name: str) -> List[Place]:
+        """Exact match first, then fuzzy match among names sharing a prefix."""
+        if name in self.places:
+            return self.places[name]
+        choices = self._by_prefix.get(name[:PREFIX_LENGTH])
+        if not choices:
+            return []
+        match = process.extractOne(name, choices, scorer=fuzz.ratio, score_cutoff=FUZZY_SCORE_CUTOFF)
+        return self.places[match[0]] if match else []
+
+    def lookup(self, query: str) -> Optional[Place]:
+        """Resolve a query such as ``"Wagholi, Haveli, Pune"``.
+
+        The first comma separated part is the place, the rest are used to pick
+        between places of the same name. Returns None when the query is unknown,
+        still ambiguous, or has a qualifier (taluka or district) that none of the
+        places match, so that the caller can fall back to Nominatim.
+        """
+        name, *qualifiers = [normalize_name(part) for part in query.split(",")]
+        qualifiers = [q for q in qualifiers if q and q not in ("maharashtra", "india")]
+        candidates = self._candidates(name) if name else []
+
+        for qualifier in qualifiers:
+            narrowed = [
+                p for p in candidates
+                if qualifier in (normalize_name(p.district), normalize_name(p.taluka))
+            ]
+            if not narrowed:
+                # e.g. "Shirur, Beed" when only Shirur in Pune is known
+                candidates = []
+                break
+            candidates = narrowed
+
+        # Unambiguous only if every candidate lies in the same district
+        if not candidates or len({p.district for p in candidates}) > 1:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return max(candidates, key=lambda p: KIND_RANK.get(p.kind, 0))
+
+
+@lru_cache(maxsize=1)
+def get_gazetteer() -> Optional[Gazetteer]:
+    """Load the gazetteer once. Returns None if the table has not been built."""
+    if not os.path.exists(GAZETTEER_PATH):
+        logger.info(f"Gazetteer table not found at {GAZETTEER_PATH}, using Nominatim only")
+        return None
+    gazetteer = Gazetteer.load(GAZETTEER_PATH)
+    logger.info(f"Loaded gazetteer with {len(gazetteer)} names from {GAZETTEER_PATH}")
+    return gazetteer
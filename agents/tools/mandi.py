@@ -5,6 +5,7 @@ import requests
 from pydantic import BaseModel, AnyHttpUrl, Field
 from typing import List, Optional, Dict, Any
 from pydantic_ai import ModelRetry, UnexpectedModelBehavior
+from agents.tools.render import TextWriter, render_text
 import os
 
 logger = get_logger(__name__)
@@ -73,7 +74,7 @@ class Provider(BaseModel):
     items: List[Item]
     time: Optional[Dict[str, Any]] = None
 
-    def __str__(self) -> str:
+    def render(self, w: TextWriter) -> None:
         lines = []
         lines.append(f"Provider: {self.descriptor.name}")
         
@@ -86,8 +87,10 @@ class Provider(BaseModel):
             lines.append("  Items:")
             for item in self.items:
                 lines.append(f"    - {item}")
-        
-        return "\n".join(lines)
+        w.lines(lines)
+
+    def __str__(self) -> str:
+        return render_text(self)
 
 # -----------------------
 # Catalog & Message Models
@@ -95,19 +98,22 @@ class Provider(BaseModel):
 class Catalog(BaseModel):
     providers: List[Provider]
 
-    def __str__(self) -> str:
-        lines = []
-        if self.providers:
+    def render(self, w: TextWriter) -> None:
+        with w.indent(2):
             for provider in self.providers:
-                provider_str = str(provider).replace("\n", "\n  ")
-                lines.append(f"  {provider_str}")
-        return "\n".join(lines)
+                provider.render(w)
+
+    def __str__(self) -> str:
+        return render_text(self)
 
 class Message(BaseModel):
     catalog: Catalog
 
+    def render(self, w: TextWriter) -> None:
+        self.catalog.render(w)
+
     def __str__(self) -> str:
-        return str(self.catalog)
+        return render_text(self)
 
 # -----------------------
 # Context & Response Models
@@ -132,8 +138,11 @@ class ResponseItem(BaseModel):
     context: Context
     message: Message
 
+    def render(self, w: TextWriter) -> None:
+        self.message.render(w)
+
     def __str__(self) -> str:
-        return str(self.message)
+        return render_text(self)
 
 class MandiResponse(BaseModel):
     context: Context
@@ -147,21 +156,22 @@ class MandiResponse(BaseModel):
                     return True
         return False
     
-    def __str__(self) -> str:
-        lines = []
-        lines.append("> Mandi Price Data")
+    def render(self, w: TextWriter) -> None:
+        w.line("> Mandi Price Data")
         
         has_mandi_data = self._has_mandi_data()
         if not self.responses or not has_mandi_data:
-            lines.append("No mandi price data found for the requested location.")
-            return "\n".join(lines)
+            w.line("No mandi price data found for the requested location.")
+            return
             
-        lines.append("Responses:")
+        w.line("Responses:")
         for idx, rsp in enumerate(self.responses, start=1):
-            rsp_str = str(rsp).replace("\n", "\n  ")
-            lines.append(f"  Response {idx}:")
-            lines.append(f"    {rsp_str}")
-        return "\n".join(lines)
+            w.line(f"  Response {idx}:")
+            with w.indent(2, first="    "):
+                rsp.render(w)
+
+    def __str__(self) -> str:
+        return render_text(self)
 
 # -----------------------
 # Request Model
@@ -1,23 +1,17 @@
-import os
-from dotenv import load_dotenv
-from geopy.geocoders import Nominatim
-from geopy.exc import GeocoderTimedOut, GeocoderServiceError
-from typing import Optional
-from pydantic import BaseModel, Field, field_validator
-from helpers.utils import get_logger
+import re
+import httpx
+from typing import Optional, Tuple
+from pydantic import BaseModel, field_validator
+from app.config import settings
+from app.core.cache import cache, LRUCache
+from agents.tools.gazetteer import get_gazetteer
+from helpers.utils import fold_place_name, get_logger
 
 logger = get_logger(__name__)
 
-load_dotenv()
+# Coordinates are rounded to 3 decimals (~110 m), which is also the cache cell size
+COORDINATE_PRECISION = 3
 
-# Initialize Nominatim geocoder (self-hosted)
-# Initialize Nominatim geocoder (self-hosted)
-geocoder = Nominatim(
-    user_agent="bharathvistaar", 
-    domain=os.getenv('NOMINATIM_DOMAIN', "nominatim:8080"),
-    scheme="http",
-    timeout=10
-)
 
 class Location(BaseModel):
     """Location model for the maps tool."""
@@ -29,23 +23,8 @@ class Location(BaseModel):
     @classmethod
     def round_coordinates(cls, v):
         if v is not None:
-            return round(float(v), 3)
+            return round(float(v), COORDINATE_PRECISION)
         return v
-    
-    def model_post_init(self, __context__) -> None:
-        """Called after the model is initialized."""
-        super().model_post_init(__context__)
-        self.check_place_name()
-    
-    def check_place_name(self) -> None:
-        """If coordinates are provided but not place name, do reverse geocoding."""
-        if self.latitude is not None and self.longitude is not None and self.place_name is None:
-            try:
-                location = geocoder.reverse((self.latitude, self.longitude), exactly_one=True)
-                if location:
-                    self.place_name = location.raw['display_name']
-            except (GeocoderTimedOut, GeocoderServiceError) as e:
-                logger.error(f"Reverse geocoding error: {e}")
 
     def _location_string(self):
         if self.latitude and self.longitude:
@@ -57,36 +36,160 @@ class Location(BaseModel):
         return f"{self.place_name} ({self.latitude}, {self.longitude})"
 
 
-def forward_geocode(place_name: str) -> Optional[Location]:
-    """Forward geocoding using Nominatim."""
-    try:
-        response = geocoder.geocode(place_name, exactly_one=True, addressdetails=True, country_codes='in')
+def normalize_place_name(place_name: str) -> str:
+    """Normalize a place name for use as a cache key."""
+    return re.sub(r"\s*,\s*", ",", fold_place_name(place_name, keep=",")).strip(" ,")
+
+
+class GeocodingService:
+    """
+    Async client for the self-hosted Nominatim service.
+
+    Forward lookups first try the offline gazetteer (see ``agents.tools.gazetteer``)
+    and only go to Nominatim for places it cannot resolve unambiguously.
+
+    Results are cached in-process (LRU) and in the shared cache, keyed on the
+    normalized place name for forward lookups and on coordinates rounded to
+    ``COORDINATE_PRECISION`` for reverse lookups. Misses are kept in the shared
+    cache for ``geocode_miss_ttl`` only, so a place Nominatim does not know is
+    not looked up again on every request, but a transient miss does not stick.
+    """
+    def __init__(self, base_url: str, user_agent: str, timeout: float = 10.0, lru_size: int = 4096):
+        self.base_url = base_url
+        self.user_agent = user_agent
+        self.timeout = timeout
+        self._lru = LRUCache(maxsize=lru_size)
+        self._client: Optional[httpx.AsyncClient] = None
 
-        if response:
-            return Location(
-                place_name=response.raw['display_name'],
-                latitude=response.latitude,
-                longitude=response.longitude
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                timeout=self.timeout,
+                headers={"User-Agent": self.user_agent},
             )
-        else:
+        return self._client
+
+    async def close(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def _cached(self, key: str) -> Tuple[bool, Optional[dict]]:
+        """Look a key up in the LRU, then the shared cache."""
+        if key in self._lru:
+            return True, self._lru.get(key)
+        try:
+            value = await cache.get(key)
+        except Exception as e:
+            logger.warning(f"Geocode cache lookup failed for {key}: {e}")
+            return False, None
+        if value is None:
+            return False, None
+        # Misses are stored as an empty dict
+        if not value:
+            return True, None
+        self._lru.set(key, value)
+        return True, value
+
+    async def _store(self, key: str, value: Optional[dict]) -> None:
+        # The LRU does not expire entries, so misses only go to the shared cache
+        if value:
+            self._lru.set(key, value)
+        try:
+            ttl = settings.geocode_cache_ttl if value else settings.geocode_miss_ttl
+            await cache.set(key, value or {}, ttl=ttl)
+        except Exception as e:
+            logger.warning(f"Geocode cache store failed for {key}: {e}")
+
+    async def _request(self, path: str, params: dict) -> Optional[dict]:
+        """Query Nominatim and return the first result, if any."""
+        response = await self.client.get(path, params={**params, "format": "jsonv2"})
+        response.raise_for_status()
+        data = response.json()
+        if isinstance(data, list):
+            return data[0] if data else None
+        return None if "error" in data else data
+
+    async def geocode(self, place_name: str) -> Optional[Location]:
+        # Known Maharashtra places are resolved offline, without a network call
+        gazetteer = get_gazetteer()
+        if gazetteer is not None:
+            place = gazetteer.lookup(place_name)
+            if place is not None:
+                return Location(
+                    place_name=place.display_name,
+                    latitude=place.latitude,
+                    longitude=place.longitude,
+                )
+
+        key = f"geocode:fwd:{normalize_place_name(place_name)}"
+        hit, result = await self._cached(key)
+        if not hit:
+            result = await self._request("/search", {
+                "q": place_name,
+                "limit": 1,
+                "addressdetails": 1,
+                "countrycodes": "in",
+            })
+            await self._store(key, result)
+        if not result:
+            return None
+        return Location(
+            place_name=result["display_name"],
+            latitude=result["lat"],
+            longitude=result["lon"],
+        )
+
+    async def reverse(self, latitude: float, longitude: float, cached: bool = True) -> Optional[Location]:
+        """Reverse geocode a point. With `cached=False` Nominatim is always queried."""
+        latitude = round(float(latitude), COORDINATE_PRECISION)
+        longitude = round(float(longitude), COORDINATE_PRECISION)
+        key = f"geocode:rev:{latitude:.{COORDINATE_PRECISION}f},{longitude:.{COORDINATE_PRECISION}f}"
+        hit, result = await self._cached(key) if cached else (False, None)
+        if not hit:
+            result = await self._request("/reverse", {"lat": latitude, "lon": longitude})
+            await self._store(key, result)
+        if not result:
+            return None
+        return Location(
+            place_name=result["display_name"],
+            latitude=latitude,
+            longitude=longitude,
+        )
+
+
+# Initialize geocoding service (self-hosted Nominatim)
+geocoder = GeocodingService(
+    base_url=f"{settings.nominatim_scheme}://{settings.nominatim_domain}",
+    user_agent=settings.nominatim_user_agent,
+    timeout=10,
+    lru_size=settings.geocode_lru_size,
+)
+
+
+async def forward_geocode(place_name: str) -> Optional[Location]:
+    """Forward geocoding using Nominatim."""
+    try:
+        location = await geocoder.geocode(place_name)
+        if location is None:
             logger.info("No results found.")
-    except (GeocoderTimedOut, GeocoderServiceError) as e:
+        return location
+    except (httpx.HTTPError, ValueError) as e:
+        # ValueError: a non-JSON body, e.g. an HTML error page from a proxy
         logger.error(f"Forward geocoding error: {e}")
     return None
 
 
-def reverse_geocode(latitude: float, longitude: float) -> Optional[Location]:
+async def reverse_geocode(latitude: float, longitude: float) -> Optional[Location]:
     """Reverse geocoding using Nominatim."""
     try:
-        location = geocoder.reverse((latitude, longitude), exactly_one=True)
-        if location:
-            return Location(
-                place_name=location.raw['display_name'],
-                latitude=latitude,
-                longitude=longitude
-            )
-        else:
+        location = await geocoder.reverse(latitude, longitude)
+        if location is None:
             logger.info("No results found.")
-    except (GeocoderTimedOut, GeocoderServiceError) as e:
+        return location
+    except (httpx.HTTPError, ValueError) as e:
+        # ValueError: a non-JSON body, e.g. an HTML error page from a proxy
         logger.error(f"Reverse geocoding error: {e}")
-    return None
\ No newline at end of file
+    return None
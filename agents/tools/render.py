@@ -0,0 +1,79 @@
+"""
+Single-pass text rendering for the Beckn tool responses.
+
+The weather, mandi, warehouse and scheme models used to build their output by
+rendering each child to a string and re-indenting it with
+``str.replace("\\n", "\\n    ")``. Every nesting level rewrote the full text of
+everything below it, so deep catalogs cost O(depth * size). ``TextWriter``
+instead keeps the current indentation as state and writes each line exactly
+once while the model tree is walked.
+"""
+from typing import Iterable, List, Optional, Protocol, Tuple
+
+
+class Renderable(Protocol):
+    def render(self, w: "TextWriter") -> None: ...
+
+
+class TextWriter:
+    """Line writer that tracks the indentation of nested models."""
+
+    def __init__(self):
+        self._lines: List[str] = []
+        self._pad = ""
+        self._first: Optional[str] = None
+        self._stack: List[Tuple[str, Optional[str], int]] = []
+
+    def line(self, text: str = "") -> None:
+        """Write ``text`` at the current indentation.
+
+        Embedded newlines are indented like separate lines, matching the old
+        ``replace``-based output.
+        """
+        pad = self._pad
+        if pad and "\n" in text:
+            text = text.replace("\n", "\n" + pad)
+        first = self._first
+        if first is None:
+            self._lines.append(pad + text)
+        else:
+            self._first = None
+            self._lines.append(first + text)
+
+    def lines(self, texts: Iterable[str]) -> None:
+        """Write each of ``texts`` as a line at the current indentation."""
+        self.line("\n".join(texts))
+
+    def indent(self, width: int, first: Optional[str] = None) -> "TextWriter":
+        """Indent every line written inside the ``with`` block by ``width`` spaces.
+
+        Args:
+            width: Number of spaces added for the lines of the block.
+            first: Optional prefix used instead of the padding on the first
+                line of the block, e.g. a list marker such as ``"  1. "``.
+        """
+        pad, pending = self._pad, self._first
+        self._stack.append((pad, pending, len(self._lines)))
+        self._pad = pad + " " * width
+        if first is not None or pending is not None:
+            lead = first if first is not None else " " * width
+            self._first = (pending if pending is not None else pad) + lead
+        return self
+
+    def __enter__(self) -> "TextWriter":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._pad, pending, count = self._stack.pop()
+        # A marker that was never used still belongs to the enclosing block
+        self._first = pending if len(self._lines) == count else None
+
+    def getvalue(self) -> str:
+        return "\n".join(self._lines)
+
+
+def render_text(model: Renderable) -> str:
+    """Render a model tree to a string in a single pass."""
+    w = TextWriter()
+    model.render(w)
+    return w.getvalue()
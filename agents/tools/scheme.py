@@ -5,6 +5,8 @@ import requests
 from pydantic import BaseModel, AnyHttpUrl, Field
 from typing import List, Optional, Dict, Any, Literal
 from pydantic_ai import ModelRetry, UnexpectedModelBehavior
+from agents.tools.render import TextWriter, render_text
+from agents.tools.budget import select_within_budget, omitted_note
 import os
 
 logger = get_logger(__name__)
@@ -65,7 +67,7 @@ class Item(BaseModel):
     descriptor: Descriptor
     tags: Optional[List[Tag]] = None
 
-    def __str__(self) -> str:
+    def render(self, w: TextWriter) -> None:
         lines = []
         
         # Use the scheme name from the descriptor, fallback to id if not available
@@ -81,20 +83,24 @@ class Item(BaseModel):
                         lines.append(f"## {tag_item.descriptor.name}")
                         lines.append(f"{tag_item.value}")
                         lines.append("")  # Add blank line after each section
-        
-        return "\n".join(lines)
+        w.lines(lines)
+
+    def __str__(self) -> str:
+        return render_text(self)
 
 class Provider(BaseModel):
     id: Optional[str] = None
     descriptor: Descriptor
     items: Optional[List[Item]] = None
 
+    def render(self, w: TextWriter) -> None:
+        for idx, item in enumerate(self.items or []):
+            if idx:
+                w.line("\n---\n")
+            item.render(w)
+
     def __str__(self) -> str:
-        lines = []
-        if self.items:
-            for item in self.items:
-                lines.append(str(item))
-        return "\n\n---\n\n".join(lines)
+        return render_text(self)
 
 # -----------------------
 # Catalog & Message Models
@@ -103,18 +109,21 @@ class Catalog(BaseModel):
     descriptor: Descriptor
     providers: List[Provider]
 
+    def render(self, w: TextWriter) -> None:
+        for provider in self.providers:
+            provider.render(w)
+
     def __str__(self) -> str:
-        lines = []
-        if self.providers:
-            for provider in self.providers:
-                lines.append(str(provider))
-        return "\n".join(lines)
+        return render_text(self)
 
 class Message(BaseModel):
     catalog: Catalog
 
+    def render(self, w: TextWriter) -> None:
+        self.catalog.render(w)
+
     def __str__(self) -> str:
-        return str(self.catalog)
+        return render_text(self)
 
 # -----------------------
 # Context & Response Models
@@ -139,13 +148,36 @@ class ResponseItem(BaseModel):
     context: Context
     message: Message
 
+    def render(self, w: TextWriter) -> None:
+        self.message.render(w)
+
     def __str__(self) -> str:
-        return str(self.message)
+        return render_text(self)
 
 class SchemeResponse(BaseModel):
     context: Context
     responses: List[ResponseItem]
 
+    def trim_to_budget(self) -> int:
+        """Drop trailing schemes that do not fit the tool's token budget.
+
+        Schemes are kept in the order the upstream service returns them.
+
+        Returns:
+            int: The number of schemes removed.
+        """
+        providers = [
+            provider
+            for response in self.responses
+            for provider in response.message.catalog.providers
+            if provider.items
+        ]
+        items = [item for provider in providers for item in provider.items]
+        kept = {id(item) for item in select_within_budget("get_scheme_info", items)}
+        for provider in providers:
+            provider.items = [item for item in provider.items if id(item) in kept]
+        return len(items) - len(kept)
+
     def _has_scheme_data(self) -> bool:
         """Check if there are any responses with providers that have items."""
         for response in self.responses:
@@ -154,17 +186,17 @@ class SchemeResponse(BaseModel):
                     return True
         return False
     
-    def __str__(self) -> str:
-        lines = []
-        
+    def render(self, w: TextWriter) -> None:
         has_scheme_data = self._has_scheme_data()
         if not self.responses or not has_scheme_data:
-            lines.append("No scheme data found.")
-            return "\n".join(lines)
+            w.line("No scheme data found.")
+            return
             
-        for idx, rsp in enumerate(self.responses, start=1):
-            lines.append(str(rsp))
-        return "\n".join(lines)
+        for rsp in self.responses:
+            rsp.render(w)
+
+    def __str__(self) -> str:
+        return render_text(self)
 
 # -----------------------
 # Request Model
@@ -246,6 +278,9 @@ def get_scheme_info(scheme_name: Optional[Literal["kcc", "pmkisan", "pmfby"]] =
             return "Scheme service unavailable. Retrying"
             
         scheme_response = SchemeResponse.model_validate(response.json())
+        dropped = scheme_response.trim_to_budget()
+        if dropped:
+            return f"{scheme_response}\n{omitted_note(dropped, 'schemes')}"
         return str(scheme_response)
                 
     except requests.Timeout as e:
@@ -7,6 +7,7 @@ import marqo
 from typing import List, Optional, Literal, Dict
 from pydantic import BaseModel, Field
 from helpers.utils import get_logger
+from agents.tools.budget import select_within_budget, omitted_note
 
 
 logger = get_logger(__name__)
@@ -95,8 +96,11 @@ def search_documents(
     if len(results) == 0:
         return f"No results found for `{query}`"
     else:            
-        search_hits = [SearchHit(**hit) for hit in results]
+        search_hits = sorted((SearchHit(**hit) for hit in results), key=lambda hit: hit.score, reverse=True)
+        kept_hits = select_within_budget("search_documents", search_hits)
         
         # Convert back to dict format for compatibility
-        document_string = '\n\n----\n\n'.join([str(document) for document in search_hits])
+        document_string = '\n\n----\n\n'.join([str(document) for document in kept_hits])
+        if len(kept_hits) < len(search_hits):
+            document_string += "\n\n" + omitted_note(len(search_hits) - len(kept_hits))
         return "> Search Results for `" + query + "`\n\n" + document_string
\ No newline at end of file
@@ -1,10 +1,12 @@
 import uuid
 from datetime import datetime, timezone
-from helpers.utils import get_logger
+from helpers.utils import get_logger, haversine_km
 import requests
 from pydantic import BaseModel, AnyHttpUrl, Field
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Tuple
 from pydantic_ai import ModelRetry, UnexpectedModelBehavior
+from agents.tools.render import TextWriter, render_text
+from agents.tools.budget import select_within_budget, omitted_note
 import os
 
 logger = get_logger(__name__)
@@ -93,6 +95,14 @@ class FulfillmentLocation(BaseModel):
     id: str
     gps: str
 
+    def coordinates(self) -> Optional[Tuple[float, float]]:
+        """Parse the ``"lat, lon"`` GPS string."""
+        try:
+            lat, lon = (float(x) for x in self.gps.split(","))
+            return lat, lon
+        except ValueError:
+            return None
+
 class Fulfillment(BaseModel):
     id: str
     type: str
@@ -115,8 +125,9 @@ class Item(BaseModel):
     status: List[str]
     category_ids: List[str]
     tags: List[TagList]
+    distance_km: Optional[float] = Field(default=None, exclude=True)
 
-    def __str__(self) -> str:
+    def render(self, w: TextWriter) -> None:
         lines = []
         lines.append(f"Warehouse: {self.descriptor.name}")
         lines.append(f"Description: {self.descriptor.short_desc}")
@@ -124,13 +135,17 @@ class Item(BaseModel):
         lines.append(f"{self.contact}")
         lines.append(f"Price: {self.price}")
         lines.append(f"Rating: {self.rating}")
+        if self.distance_km is not None:
+            lines.append(f"Distance: {self.distance_km:.1f} km")
         
         if self.tags:
             for tag_list in self.tags:
                 for tag in tag_list.list:
                     lines.append(f"{tag.descriptor.code}: {tag.value}")
-        
-        return "\n".join(lines)
+        w.lines(lines)
+
+    def __str__(self) -> str:
+        return render_text(self)
 
 class Provider(BaseModel):
     id: str
@@ -138,19 +153,18 @@ class Provider(BaseModel):
     fulfillments: List[Fulfillment]
     items: List[Item]
 
-    def __str__(self) -> str:
-        lines = []
-        lines.append(f"Provider: {self.descriptor.name}")
-        lines.append(f"Description: {self.descriptor.short_desc}")
+    def render(self, w: TextWriter) -> None:
+        w.lines([f"Provider: {self.descriptor.name}", f"Description: {self.descriptor.short_desc}"])
         
         if self.items:
-            lines.append("\nWarehouses:")
+            w.line("\nWarehouses:")
             for idx, item in enumerate(self.items, start=1):
-                item_str = str(item).replace("\n", "\n    ") 
-                lines.append(f"  {idx}. {item_str}")
-                lines.append("") 
-        
-        return "\n".join(lines)
+                with w.indent(4, first=f"  {idx}. "):
+                    item.render(w)
+                w.line("")
+
+    def __str__(self) -> str:
+        return render_text(self)
 
 # -----------------------
 # Catalog & Message Models
@@ -159,19 +173,22 @@ class Catalog(BaseModel):
     descriptor: Descriptor
     providers: List[Provider]
 
-    def __str__(self) -> str:
-        lines = []
-        if self.providers:
+    def render(self, w: TextWriter) -> None:
+        with w.indent(2):
             for provider in self.providers:
-                provider_str = str(provider).replace("\n", "\n  ")
-                lines.append(f"  {provider_str}")
-        return "\n".join(lines)
+                provider.render(w)
+
+    def __str__(self) -> str:
+        return render_text(self)
 
 class Message(BaseModel):
     catalog: Catalog
 
+    def render(self, w: TextWriter) -> None:
+        self.catalog.render(w)
+
     def __str__(self) -> str:
-        return str(self.catalog)
+        return render_text(self)
 
 # -----------------------
 # Context & Response Models
@@ -196,13 +213,51 @@ class ResponseItem(BaseModel):
     context: Context
     message: Message
 
+    def render(self, w: TextWriter) -> None:
+        self.message.render(w)
+
     def __str__(self) -> str:
-        return str(self.message)
+        return render_text(self)
 
 class WarehouseResponse(BaseModel):
     context: Context
     responses: List[ResponseItem]
 
+    def trim_to_budget(self, latitude: float, longitude: float) -> int:
+        """Sort warehouses by distance and drop those that do not fit the tool's token budget.
+
+        Args:
+            latitude (float): Latitude of the requested location
+            longitude (float): Longitude of the requested location
+
+        Returns:
+            int: The number of warehouses removed.
+        """
+        providers = [
+            provider
+            for response in self.responses
+            for provider in response.message.catalog.providers
+            if provider.items
+        ]
+        for provider in providers:
+            gps = {f.id: f.locations.coordinates() for f in provider.fulfillments}
+            for item in provider.items:
+                distances = [
+                    haversine_km(latitude, longitude, *gps[f_id])
+                    for f_id in item.fulfillment_ids
+                    if gps.get(f_id)
+                ]
+                item.distance_km = min(distances) if distances else None
+
+        def by_distance(item: Item) -> float:
+            return item.distance_km if item.distance_km is not None else float("inf")
+
+        items = [item for provider in providers for item in provider.items]
+        kept = {id(item) for item in select_within_budget("warehouse_data", sorted(items, key=by_distance))}
+        for provider in providers:
+            provider.items = sorted((item for item in provider.items if id(item) in kept), key=by_distance)
+        return len(items) - len(kept)
+
     def _has_warehouse_data(self) -> bool:
         """Check if there are any responses with providers that have items."""
         for response in self.responses:
@@ -211,21 +266,22 @@ class WarehouseResponse(BaseModel):
                     return True
         return False
     
-    def __str__(self) -> str:
-        lines = []
-        lines.append("> Warehouse Data")
+    def render(self, w: TextWriter) -> None:
+        w.line("> Warehouse Data")
         
         has_warehouse_data = self._has_warehouse_data()
         if not self.responses or not has_warehouse_data:
-            lines.append("No warehouse data found for the requested location.")
-            return "\n".join(lines)
+            w.line("No warehouse data found for the requested location.")
+            return
             
-        lines.append("Responses:")
+        w.line("Responses:")
         for idx, rsp in enumerate(self.responses, start=1):
-            rsp_str = str(rsp).replace("\n", "\n  ")
-            lines.append(f"  Response {idx}:")
-            lines.append(f"    {rsp_str}")
-        return "\n".join(lines)
+            w.line(f"  Response {idx}:")
+            with w.indent(2, first="    "):
+                rsp.render(w)
+
+    def __str__(self) -> str:
+        return render_text(self)
 
 # -----------------------
 # Request Model
@@ -318,6 +374,9 @@ def warehouse_data(latitude: float | str, longitude: float | str) -> str:
             return "Warehouse service unavailable. Retrying"
             
         warehouse_response = WarehouseResponse.model_validate(response.json())
+        dropped = warehouse_response.trim_to_budget(float(latitude), float(longitude))
+        if dropped:
+            return f"{warehouse_response}\n{omitted_note(dropped, 'warehouses')}"
         return str(warehouse_response)
                 
     except requests.Timeout as e:
@@ -1,5 +1,6 @@
 import uuid
-from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+from datetime import date, datetime, timedelta, timezone
 from helpers.utils import get_logger
 import requests
 from pydantic import BaseModel, AnyHttpUrl, Field
@@ -7,10 +8,81 @@ from typing import List, Optional, Dict, Any, Tuple
 from dateutil import parser
 from dateutil.parser import ParserError
 from pydantic_ai import ModelRetry, UnexpectedModelBehavior
+from agents.tools.render import TextWriter, render_text
+from agents.tools.budget import select_within_budget, omitted_note
 import os
 
 logger = get_logger(__name__)
 
+# Maximum allowed difference between the request and the response timestamps
+MAX_RESPONSE_AGE = timedelta(hours=1)
+
+# Number of requests made before giving up on stale weather data
+WEATHER_FETCH_ATTEMPTS = 2
+
+# Formats tried before falling back to dateutil's fuzzy parser
+DATE_FORMATS = (
+    "%Y-%m-%d",
+    "%Y-%m-%dT%H:%M:%S.%fZ",
+    "%Y-%m-%dT%H:%M:%SZ",
+    "%Y-%m-%d %H:%M:%S",
+    "%d-%m-%Y",
+    "%d/%m/%Y",
+    "%Y/%m/%d",
+    "%d %B %Y",
+    "%d %b %Y",
+    "%B %d, %Y",
+    "%b %d, %Y",
+)
+
+
+def parse_date(text: str, fuzzy: bool = True) -> Optional[datetime]:
+    """Parse a date string, trying strict formats before the fuzzy parser.
+
+    Args:
+        text (str): The string to parse.
+        fuzzy (bool): Whether to fall back to ``dateutil``'s fuzzy parsing.
+
+    Returns:
+        Optional[datetime]: The parsed datetime, or None if no date was found.
+    """
+    text = text.strip()
+    try:
+        # fromisoformat() does not accept a trailing 'Z' before Python 3.11
+        return datetime.fromisoformat(text[:-1] + "+00:00" if text.endswith("Z") else text)
+    except ValueError:
+        pass
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(text, fmt)
+        except ValueError:
+            continue
+    # Fuzzy parsing is slow, and anything without a digit is not a date
+    if not fuzzy or not any(c.isdigit() for c in text):
+        return None
+    try:
+        return parser.parse(text, fuzzy=True)
+    except (ParserError, OverflowError, TypeError, ValueError):
+        return None
+
+
+def parse_descriptor_date(text: str) -> Optional[datetime]:
+    """Cached ``parse_date`` for tag descriptors, which repeat across responses."""
+    # dateutil fills in a missing year or month from today, so cache per day
+    return _parse_descriptor_date(text, date.today())
+
+
+@lru_cache(maxsize=4096)
+def _parse_descriptor_date(text: str, today: date) -> Optional[datetime]:
+    return parse_date(text)
+
+
+def _as_utc(value: Optional[datetime]) -> Optional[datetime]:
+    """Treat naive datetimes as UTC."""
+    if value is not None and value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value
+
 # -----------------------
 # Images
 # -----------------------
@@ -33,16 +105,13 @@ class Descriptor(BaseModel):
         Returns:
             Tuple[bool, Optional[datetime]]: (True, datetime_obj) if date found, (False, None) if not
         """
-        try:
-            # Try code first as it's more likely to contain the date
-            if self.code:
-                return True, parser.parse(self.code, fuzzy=True)
-            # Try name if code didn't work
-            if self.name:
-                return True, parser.parse(self.name, fuzzy=True)
-            return False, None
-        except (ParserError, TypeError, ValueError):
-            return False, None
+        # Try code first as it's more likely to contain the date
+        for text in (self.code, self.name):
+            if text:
+                date_obj = parse_descriptor_date(text)
+                if date_obj is not None:
+                    return True, date_obj
+        return False, None
 
     def __str__(self) -> str:
         """Return the 'name' or 'code' if present, else empty."""
@@ -97,7 +166,7 @@ class Tag(BaseModel):
     descriptor: Descriptor
     list: List[TagItem]
 
-    def __str__(self) -> str:
+    def block(self, indent: str = "") -> str:
         """Example format:
            TagGroupName:
                TagItem1
@@ -105,7 +174,15 @@ class Tag(BaseModel):
         """
         heading = self.descriptor.name or self.descriptor.code or "Tag Group"
         items_str = "\n      ".join(str(tag_item) for tag_item in self.list)
-        return f"{heading}:\n      {items_str}"
+        block = f"{heading}:\n      {items_str}"
+        # Tags are leaves, so indenting the block here stays linear in its size
+        return indent + block.replace("\n", "\n" + indent) if indent else block
+
+    def render(self, w: TextWriter) -> None:
+        w.line(self.block())
+
+    def __str__(self) -> str:
+        return render_text(self)
 
 # -----------------------
 # TimeRange, Time, Stop, Fulfillment
@@ -124,13 +201,16 @@ class Fulfillment(BaseModel):
     id: str
     stops: Optional[List[Stop]] = None
 
-    def __str__(self) -> str:
+    def render(self, w: TextWriter) -> None:
         lines = [f"Fulfillment ID: {self.id}"]
         if self.stops:
             lines.append("  Stops:")
             for stop in self.stops:
                 lines.append(f"    - Start: {stop.time.range.start}, End: {stop.time.range.end}")
-        return "\n".join(lines)
+        w.lines(lines)
+
+    def __str__(self) -> str:
+        return render_text(self)
 
 # -----------------------
 # Category
@@ -154,7 +234,7 @@ class Item(BaseModel):
     fulfillment_ids: Optional[List[str]] = None
     tags: Optional[List[Tag]] = None
 
-    def __str__(self) -> str:
+    def render(self, w: TextWriter) -> None:
         lines = []
         # Item name / ID heading
         lines.append(f"**Item:** {self.descriptor.name or self.id}")
@@ -170,10 +250,20 @@ class Item(BaseModel):
         if self.tags:
             lines.append("  Tags:")
             for t in self.tags:
-                tag_str = str(t).replace("\n", "\n    ")
-                lines.append(f"    {tag_str}")
+                lines.append(t.block(indent="    "))
+        w.lines(lines)
+
+    def forecast_date(self) -> Optional[datetime]:
+        """Earliest date found in the item's tag descriptors, if any."""
+        dates = []
+        for tag in self.tags or []:
+            is_date, date_obj = tag.descriptor.is_date()
+            if is_date:
+                dates.append(_as_utc(date_obj))
+        return min(dates) if dates else None
 
-        return "\n".join(lines)
+    def __str__(self) -> str:
+        return render_text(self)
 
 # -----------------------
 # Provider
@@ -185,28 +275,29 @@ class Provider(BaseModel):
     fulfillments: Optional[List[Fulfillment]] = None
     items: Optional[List[Item]] = None
 
-    def __str__(self) -> str:
-        lines = []
-        lines.append(f"Provider: {self.descriptor.name or self.id}")
+    def render(self, w: TextWriter) -> None:
+        lines = [f"Provider: {self.descriptor.name or self.id}"]
 
         if self.categories:
             lines.append("  Categories:")
             for cat in self.categories:
                 lines.append(f"    - {cat}")
+        w.lines(lines)
 
         if self.fulfillments:
-            lines.append("  Fulfillments:")
-            for f in self.fulfillments:
-                f_str = str(f).replace("\n", "\n    ")
-                lines.append(f"    {f_str}")
+            w.line("  Fulfillments:")
+            with w.indent(4):
+                for f in self.fulfillments:
+                    f.render(w)
 
         if self.items:
-            lines.append("  Items:")
-            for item in self.items:
-                item_str = str(item).replace("\n", "\n    ")
-                lines.append(f"    {item_str}")
+            w.line("  Items:")
+            with w.indent(4):
+                for item in self.items:
+                    item.render(w)
 
-        return "\n".join(lines)
+    def __str__(self) -> str:
+        return render_text(self)
 
 # -----------------------
 # Catalog
@@ -215,15 +306,16 @@ class Catalog(BaseModel):
     descriptor: Descriptor
     providers: List[Provider]
 
-    def __str__(self) -> str:
-        lines = []
-        lines.append(f"Catalog: {self.descriptor.name or 'N/A'}")
+    def render(self, w: TextWriter) -> None:
+        w.line(f"Catalog: {self.descriptor.name or 'N/A'}")
         if self.providers:
-            lines.append("Providers:")
-            for provider in self.providers:
-                provider_str = str(provider).replace("\n", "\n  ")
-                lines.append(f"  {provider_str}")
-        return "\n".join(lines)
+            w.line("Providers:")
+            with w.indent(2):
+                for provider in self.providers:
+                    provider.render(w)
+
+    def __str__(self) -> str:
+        return render_text(self)
 
 # -----------------------
 # Message & ResponseItem
@@ -231,17 +323,23 @@ class Catalog(BaseModel):
 class Message(BaseModel):
     catalog: Catalog
 
+    def render(self, w: TextWriter) -> None:
+        self.catalog.render(w)
+
     def __str__(self) -> str:
-        return str(self.catalog)
+        return render_text(self)
 
 class ResponseItem(BaseModel):
     context: Context
     message: Message
 
-    def __str__(self) -> str:
+    def render(self, w: TextWriter) -> None:
         # Optionally, you can logger.info context info here or just the catalog:
         # e.g. f"Context: {self.context.transaction_id}\n{self.message}"
-        return str(self.message)
+        self.message.render(w)
+
+    def __str__(self) -> str:
+        return render_text(self)
 
 # -----------------------
 # Weather Response
@@ -253,78 +351,90 @@ class WeatherResponse(BaseModel):
     def validate_dates(self, request_payload: Dict[str, Any]) -> bool:
         """
         Validate if the weather data is current based on the requested dates.
-        At least one date in the response should fall within the requested range.
+
+        The response must have been generated within ``MAX_RESPONSE_AGE`` of the
+        request, and if the forecast tags carry dates, at least one of them must
+        fall within the requested range. Responses without dated tags are judged
+        on the timestamp alone.
         
         Args:
             request_payload (Dict[str, Any]): The original request payload containing the date range
             
         Returns:
-            bool: True if at least one valid date is found, False if no dates are within range
+            bool: True if the data is current, False if it is stale or could not be validated
         """
         try:
             # Get requested date range from payload and ensure they're timezone aware
-            request_start = parser.parse(request_payload["message"]["intent"]["item"]["time"]["range"]["start"])
-            if request_start.tzinfo is None:
-                request_start = request_start.replace(tzinfo=timezone.utc)
-                
-            request_end = parser.parse(request_payload["message"]["intent"]["item"]["time"]["range"]["end"])
-            if request_end.tzinfo is None:
-                request_end = request_end.replace(tzinfo=timezone.utc)
+            time_range = request_payload["message"]["intent"]["item"]["time"]["range"]
+            request_start = _as_utc(parse_date(time_range["start"], fuzzy=False))
+            request_end = _as_utc(parse_date(time_range["end"], fuzzy=False))
+            request_time = _as_utc(parse_date(request_payload["context"]["timestamp"], fuzzy=False))
             
             # Get response timestamp and ensure it's timezone aware
-            response_time = parser.parse(self.context.timestamp)
-            if response_time.tzinfo is None:
-                response_time = response_time.replace(tzinfo=timezone.utc)
+            response_time = _as_utc(parse_date(self.context.timestamp))
+            if None in (request_start, request_end, request_time, response_time):
+                logger.warning("Could not parse weather request or response timestamps")
+                return False
             
             # Check if we have any responses
             if not self.responses:
                 logger.warning("No weather data found in response")
                 return False
             
-            # Check if response timestamp is within 1 hour of request start time
-            time_diff = abs((response_time - request_start).total_seconds())
-            if time_diff > 3600:  # 3600 seconds = 1 hour
-                logger.warning(f"Weather data may be outdated. Response time: {response_time}, Request start: {request_start}")
+            # Check if response timestamp is close to the time the request was sent
+            if abs(response_time - request_time) > MAX_RESPONSE_AGE:
+                logger.warning(f"Weather data may be outdated. Response time: {response_time}, Request time: {request_time}")
                 return False
                 
-            # Track all dates found and their validity
+            # Iterate through all providers and their items to find dates,
+            # stopping at the first one within the requested range
             dates_found = []
-            valid_dates = []
-            
-            # Iterate through all providers and their items to find dates
             for response in self.responses:
                 for provider in response.message.catalog.providers:
                     for item in provider.items or []:
                         for tag in item.tags or []:
                             is_date, date_obj = tag.descriptor.is_date()
-                            if is_date and date_obj:
-                                # Ensure the found date is timezone aware
-                                if date_obj.tzinfo is None:
-                                    date_obj = date_obj.replace(tzinfo=timezone.utc)
-                                dates_found.append(date_obj)
-                                # Check if the date is within our request range
-                                if request_start <= date_obj <= request_end:
-                                    valid_dates.append(date_obj)
+                            if not is_date:
+                                continue
+                            date_obj = _as_utc(date_obj)
+                            if request_start <= date_obj <= request_end:
+                                return True
+                            dates_found.append(date_obj)
             
-            # Log the results
-            if dates_found:
-                logger.info(f"Found {len(dates_found)} dates in response, {len(valid_dates)} within requested range")
-                if valid_dates:
-                    logger.info(f"Valid dates: {', '.join(d.isoformat() for d in valid_dates)}")
-                else:
-                    logger.warning(f"All dates found were outside range [{request_start} - {request_end}]")
-                    logger.warning(f"Found dates: {', '.join(d.isoformat() for d in dates_found)}")
-            else:
-                logger.warning("No dates found in weather data")
-            
-            # Return True if we found at least one valid date
-            return len(valid_dates) > 0
+            if not dates_found:
+                logger.debug("No dates found in weather data, accepting based on response timestamp")
+                return True
+
+            logger.warning(f"All dates found were outside range [{request_start} - {request_end}]")
+            logger.warning(f"Found dates: {', '.join(d.isoformat() for d in dates_found)}")
+            return False
             
         except Exception as e:
             logger.error(f"Error validating weather dates: {e}")
             return False
 
 
+    def trim_to_budget(self) -> int:
+        """Drop the furthest forecast items that do not fit the tool's token budget.
+
+        Returns:
+            int: The number of items removed.
+        """
+        providers = [
+            provider
+            for response in self.responses
+            for provider in response.message.catalog.providers
+            if provider.items
+        ]
+        items = [item for provider in providers for item in provider.items]
+        # Rank by date so the nearest days are kept; undated items go last
+        far_future = datetime.max.replace(tzinfo=timezone.utc)
+        ranked = sorted(items, key=lambda item: item.forecast_date() or far_future)
+        kept = {id(item) for item in select_within_budget("weather_forecast", ranked)}
+        for provider in providers:
+            provider.items = [item for item in provider.items if id(item) in kept]
+        return len(items) - len(kept)
+
     def _has_weather_data(self) -> bool:
         """Check if there are any responses with providers that have items."""
         for response in self.responses:
@@ -333,22 +443,22 @@ class WeatherResponse(BaseModel):
                     return True
         return False
     
-    def __str__(self) -> str:
-        lines = []
-        lines.append("> Weather Forecast Data")
+    def render(self, w: TextWriter) -> None:
+        w.line("> Weather Forecast Data")
     
         # Check if there are any responses with providers that have items
         has_weather_data = self._has_weather_data()
         if len(self.responses) == 0 or not has_weather_data:
-            lines.append("No weather data found for the requested location.")
-            return "\n".join(lines)
-        else:
-            lines.append("Responses:")
-            for idx, rsp in enumerate(self.responses, start=1):
-                rsp_str = str(rsp).replace("\n", "\n  ")
-                lines.append(f"  Response {idx}:")
-                lines.append(f"    {rsp_str}")
-            return "\n".join(lines)
+            w.line("No weather data found for the requested location.")
+            return
+        w.line("Responses:")
+        for idx, rsp in enumerate(self.responses, start=1):
+            w.line(f"  Response {idx}:")
+            with w.indent(2, first="    "):
+                rsp.render(w)
+
+    def __str__(self) -> str:
+        return render_text(self)
 
 # -----------------------
 # Weather Request
@@ -425,18 +535,28 @@ def weather_forecast(latitude: float, longitude: float, days: int = 5) -> str:
         str: The weather forecast for the specific location
     """    
     try:        
-        payload  = WeatherRequest(latitude=latitude, longitude=longitude, days=days).get_payload()
-        response = requests.post(os.getenv("BAP_ENDPOINT"),
-                                 json=payload,
-                                 timeout=(10,15))
-        
-        if response.status_code != 200:
-            logger.error(f"Weather API returned status code {response.status_code}")
-            return "Weather service unavailable. Retrying"
-            
-        weather_response = WeatherResponse.model_validate(response.json())
+        for attempt in range(1, WEATHER_FETCH_ATTEMPTS + 1):
+            payload  = WeatherRequest(latitude=latitude, longitude=longitude, days=days).get_payload()
+            response = requests.post(os.getenv("BAP_ENDPOINT"),
+                                     json=payload,
+                                     timeout=(10,15))
             
-        return str(weather_response)
+            if response.status_code != 200:
+                logger.error(f"Weather API returned status code {response.status_code}")
+                return "Weather service unavailable. Retrying"
+                
+            weather_response = WeatherResponse.model_validate(response.json())
+
+            if not weather_response._has_weather_data():
+                return str(weather_response)
+            if weather_response.validate_dates(payload):
+                dropped = weather_response.trim_to_budget()
+                if dropped:
+                    return f"{weather_response}\n{omitted_note(dropped, 'forecast entries')}"
+                return str(weather_response)
+            logger.warning(f"Stale weather data received (attempt {attempt}/{WEATHER_FETCH_ATTEMPTS})")
+
+        return "Current weather forecast is not available for this location. Please try again later."
                 
     except requests.Timeout:
         logger.error("Weather API request timed out")
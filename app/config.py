@@ -20,7 +20,20 @@ class Settings(BaseSettings):
     host: str = "0.0.0.0"
     port: int = 8000
     api_prefix: str = "/api"
-    rate_limit_requests_per_minute: int = 1000
+    # Limits are shared by all workers with CACHE_TYPE=redis; with the memory
+    # backend each of the uvicorn_workers processes applies them on its own
+    rate_limit_enabled: bool = os.getenv("RATE_LIMIT_ENABLED", "true").lower() == "true"
+    rate_limit_requests_per_minute: int = int(os.getenv("RATE_LIMIT_REQUESTS_PER_MINUTE", "1000"))  # per client IP
+    rate_limit_user_requests_per_minute: int = int(os.getenv("RATE_LIMIT_USER_REQUESTS_PER_MINUTE", "60"))
+    rate_limit_burst_seconds: float = float(os.getenv("RATE_LIMIT_BURST_SECONDS", "10"))
+    # Only behind proxies that append the client address to X-Forwarded-For; the
+    # client IP is taken that many proxy hops from the right of the header
+    rate_limit_trust_forwarded_for: bool = os.getenv("RATE_LIMIT_TRUST_FORWARDED_FOR", "false").lower() == "true"
+    rate_limit_trusted_proxies: int = int(os.getenv("RATE_LIMIT_TRUSTED_PROXIES", "1"))
+    # Answers generated at once across all workers (per worker with the memory
+    # backend), and how long a chat request queues for one
+    llm_max_streams: int = int(os.getenv("LLM_MAX_STREAMS", "64"))
+    llm_stream_queue_seconds: float = float(os.getenv("LLM_STREAM_QUEUE_SECONDS", "5"))
 
     # Security Settings
     allowed_origins: List[str] = os.getenv("ALLOWED_ORIGINS", "*").split(",")
@@ -50,6 +63,43 @@ class Settings(BaseSettings):
     cache_type: str = os.getenv("CACHE_TYPE", "redis")  # "redis" or "memory"
     default_cache_ttl: int = 60 * 60 * 24  # 24 hours
     suggestions_cache_ttl: int = 60 * 30    # 30 minutes
+    geocode_cache_ttl: int = 60 * 60 * 24 * 30  # 30 days
+    geocode_miss_ttl: int = 60 * 10  # places Nominatim found nothing for
+    geocode_lru_size: int = 4096
+    tts_cache_ttl: int = 60 * 60 * 24 * 30  # 30 days
+    tts_cache_inline_max_bytes: int = 256 * 1024  # larger clips are stored in S3 or on disk
+    tts_cache_dir: str = os.getenv("TTS_CACHE_DIR", "/tmp/tts-cache")
+    tts_cache_dir_max_bytes: int = int(os.getenv("TTS_CACHE_DIR_MAX_BYTES", str(512 * 1024 * 1024)))
+    tts_stream_concurrency: int = 4  # concurrent Bhashini calls per streaming TTS request
+
+    # Background Jobs
+    job_queue_backend: str = os.getenv("JOB_QUEUE_BACKEND", "memory")  # "memory" or "redis"
+    job_concurrency: int = int(os.getenv("JOB_CONCURRENCY", "2"))
+    job_queue_size: int = int(os.getenv("JOB_QUEUE_SIZE", "200"))
+    job_shed_latency: float = float(os.getenv("JOB_SHED_LATENCY", "6.0"))  # seconds to first chat chunk
+    # Suggestion jobs for several sessions can share one LLM request (1 disables batching)
+    suggestions_batch_size: int = int(os.getenv("SUGGESTIONS_BATCH_SIZE", "1"))
+    suggestions_batch_window: float = float(os.getenv("SUGGESTIONS_BATCH_WINDOW", "0.5"))
+
+    # Server-Sent Events
+    sse_heartbeat_seconds: float = float(os.getenv("SSE_HEARTBEAT_SECONDS", "15"))
+    sse_flush_bytes: int = int(os.getenv("SSE_FLUSH_BYTES", "256"))
+    sse_flush_delay: float = float(os.getenv("SSE_FLUSH_DELAY", "0.25"))
+    # How long a finished answer can still be resumed after a dropped connection
+    stream_buffer_ttl: int = int(os.getenv("STREAM_BUFFER_TTL", "300"))
+    # How long a new question waits for the session's previous answer to finish
+    chat_turn_wait: float = float(os.getenv("CHAT_TURN_WAIT", "30"))
+
+    # Answer Cache (first-turn questions whose answers need no location or history)
+    answer_cache_enabled: bool = os.getenv("ANSWER_CACHE_ENABLED", "true").lower() == "true"
+    answer_cache_ttl: int = int(os.getenv("ANSWER_CACHE_TTL", str(60 * 60 * 6)))
+
+    # Audio Processing
+    # Downsample and trim audio before ASR. The whole clip is decoded, with several
+    # float32 working copies (4 bytes per sample each) on top of the raw audio, so
+    # larger clips than audio_preprocessing_max_bytes are sent as they are.
+    audio_preprocessing: bool = os.getenv("AUDIO_PREPROCESSING", "true").lower() == "true"
+    audio_preprocessing_max_bytes: int = int(os.getenv("AUDIO_PREPROCESSING_MAX_BYTES", str(16 * 1024 * 1024)))
 
     # Logging Configuration
     log_level: str = "INFO"
@@ -61,6 +111,10 @@ class Settings(BaseSettings):
     ollama_endpoint_url: Optional[str] = None
     marqo_endpoint_url: Optional[str] = None
     inference_endpoint_url: Optional[str] = None
+    nominatim_domain: str = os.getenv("NOMINATIM_DOMAIN", "nominatim:8080")
+    nominatim_scheme: str = os.getenv("NOMINATIM_SCHEME", "http")
+    # Nominatim's usage policy asks clients to identify themselves, with a contact
+    nominatim_user_agent: str = os.getenv("NOMINATIM_USER_AGENT", "bharathvistaar")
 
     # External Service API Keys
     openai_api_key: Optional[str] = None
@@ -3,7 +3,11 @@ Core cache instance configuration using Redis and aiocache.
 Provides a resilient cache that falls back to memory if Redis is unavailable.
 """
 import asyncio
+import random
 import socket
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional
 from aiocache import Cache
 from aiocache.serializers import JsonSerializer
 from app.config import settings
@@ -11,6 +15,13 @@ from helpers.utils import get_logger
 
 logger = get_logger(__name__)
 
+UPDATE_RETRIES = 20
+# Jittered exponential backoff between conflicting Redis updates
+UPDATE_BACKOFF_SECONDS = 0.005
+UPDATE_BACKOFF_MAX_SECONDS = 0.5
+# Updates of a key within the process are serialized by one of these locks, picked by key
+UPDATE_LOCK_STRIPES = 64
+
 def is_placeholder_host(host: str) -> bool:
     """Check if the hostname is a common placeholder or unconfigured value."""
     placeholders = [
@@ -35,6 +46,7 @@ class ResilientCache:
             key_builder=lambda key, namespace: f"{settings.redis_key_prefix}{namespace}:{key}" if namespace else f"{settings.redis_key_prefix}{key}",
         )
         self._use_fallback = False
+        self._update_locks = [asyncio.Lock() for _ in range(UPDATE_LOCK_STRIPES)]
         
         cache_type = getattr(settings, "cache_type", "redis").lower()
         
@@ -88,6 +100,19 @@ class ResilientCache:
             self._use_fallback = True
             return await self._memory.set(*args, **kwargs)
 
+    async def add(self, *args, **kwargs):
+        """Set a key only if it does not exist yet; raises ValueError if it does."""
+        if self._use_fallback:
+            return await self._memory.add(*args, **kwargs)
+        try:
+            return await self._redis.add(*args, **kwargs)
+        except ValueError:
+            raise
+        except Exception as e:
+            logger.warning(f"Redis connection failed during ADD: {e}. Switching to Memory cache fallback.")
+            self._use_fallback = True
+            return await self._memory.add(*args, **kwargs)
+
     async def delete(self, *args, **kwargs):
         if self._use_fallback:
             return await self._memory.delete(*args, **kwargs)
@@ -118,5 +143,85 @@ class ResilientCache:
             self._use_fallback = True
             return await self._memory.clear(*args, **kwargs)
 
+    async def update(self, key: str, fn: Callable[[Any], Any], ttl: Optional[int] = None):
+        """
+        Atomically replace the value of `key` with `fn(current value)` and return it.
+
+        Updates of a key are serialized within the process by a lock. On Redis
+        they are also an optimistic WATCH/MULTI transaction, retried when
+        another worker writes the key in between; `fn` may therefore be called
+        more than once and must not have side effects. Only a Redis connection
+        failure switches to the memory fallback; errors raised by `fn` are
+        passed on.
+        """
+        from redis.exceptions import ConnectionError as RedisConnectionError, TimeoutError as RedisTimeoutError
+        async with self._update_locks[hash(key) % UPDATE_LOCK_STRIPES]:
+            if not self._use_fallback:
+                try:
+                    return await self._update_redis(key, fn, ttl)
+                except (RedisConnectionError, RedisTimeoutError, OSError) as e:
+                    logger.warning(f"Redis connection failed during UPDATE: {e}. Switching to Memory cache fallback.")
+                    self._use_fallback = True
+            value = fn(await self._memory.get(key))
+            await self._memory.set(key, value, ttl=ttl)
+            return value
+
+    async def _update_redis(self, key: str, fn: Callable[[Any], Any], ttl: Optional[int]):
+        from redis.exceptions import WatchError
+        backend = self._redis
+        redis_key = backend.build_key(key, namespace=backend.namespace)
+        async with backend.client.pipeline(transaction=True) as pipe:
+            for attempt in range(UPDATE_RETRIES):
+                try:
+                    await pipe.watch(redis_key)
+                    value = fn(backend.serializer.loads(await pipe.get(redis_key)))
+                    pipe.multi()
+                    pipe.set(redis_key, backend.serializer.dumps(value), ex=ttl)
+                    await pipe.execute()
+                    return value
+                except WatchError:
+                    # Back off a little so that contending writers do not keep colliding
+                    await asyncio.sleep(random.uniform(0, min(UPDATE_BACKOFF_MAX_SECONDS, UPDATE_BACKOFF_SECONDS * 2 ** attempt)))
+        raise RuntimeError(f"Gave up updating {key} after {UPDATE_RETRIES} conflicting writes")
+
+class LRUCache:
+    """
+    A small in-process LRU cache used in front of the shared cache for hot keys.
+    Entries optionally expire after ``ttl`` seconds.
+    """
+    def __init__(self, maxsize: int = 1024, ttl: Optional[float] = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        entry = self._data.get(key)
+        if entry is None:
+            return default
+        value, expires_at = entry
+        if expires_at is not None and expires_at < time.monotonic():
+            del self._data[key]
+            return default
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        expires_at = time.monotonic() + self.ttl if self.ttl is not None else None
+        self._data[key] = (value, expires_at)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return self.get(key, _MISSING) is not _MISSING
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def clear(self) -> None:
+        self._data.clear()
+
+_MISSING = object()
+
 # Export the singleton instance
 cache = ResilientCache()
\ No newline at end of file
@@ -0,0 +1,356 @@
+"""
+Bounded background job executor for LLM side-jobs such as suggestions.
+
+Jobs are registered by name with ``@job("name")`` and submitted with a
+priority. At most ``job_concurrency`` jobs run at once; the rest wait in a
+priority queue of ``job_queue_size`` entries. When the queue is full the
+lowest priority job is dropped. Jobs submitted with a ``key`` are coalesced
+with a queued job of the same key, and ``sheddable`` jobs are dropped while
+user-facing chat latency is above ``job_shed_latency``.
+
+A job registered with a ``batch_size`` is run for several queued jobs at
+once: the worker that picks one up collects up to ``batch_size`` jobs of the
+same name for at most ``batch_window`` seconds and calls the job function with
+the list of their arguments. It returns one result per job, in order.
+
+With ``JOB_QUEUE_BACKEND=redis`` jobs are pushed to Redis lists (one per
+priority) instead and run by a separate worker process::
+
+    python -m app.worker
+
+A job with a ``key`` is then coalesced across processes by a marker key that
+is set when it is handed off and cleared when the worker takes it. The job's
+result stays in the worker: the future returned by ``submit`` resolves to None
+as soon as the job is handed off, coalesced or dropped.
+"""
+import asyncio
+import heapq
+import itertools
+import json
+import time
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set
+from app.config import settings
+from helpers.metrics import metrics
+from helpers.utils import get_logger
+
+logger = get_logger(__name__)
+
+PRIORITY_HIGH = 0
+PRIORITY_NORMAL = 5
+PRIORITY_LOW = 10
+
+# Chat latency samples older than this no longer count towards shedding
+LATENCY_WINDOW = 60.0
+LATENCY_EWMA_ALPHA = 0.2
+
+# Coalescing marker of a job handed off to Redis; outlives a worker that died with it
+HANDOFF_MARKER_TTL = 600
+
+
+@dataclass
+class JobSpec:
+    fn: Callable[..., Awaitable[Any]]
+    batch_size: Optional[int] = None
+    batch_window: float = 0.0
+
+
+JOBS: Dict[str, JobSpec] = {}
+
+
+def job(name: str, batch_size: Optional[int] = None, batch_window: float = 0.0):
+    """Register a coroutine function as a background job.
+
+    With `batch_size` the function takes a list of argument tuples and
+    returns a list of results.
+    """
+    def decorator(fn):
+        JOBS[name] = JobSpec(fn, batch_size, batch_window)
+        return fn
+    return decorator
+
+
+@dataclass(order=True)
+class Job:
+    priority: int
+    seq: int
+    name: str = field(compare=False)
+    args: tuple = field(compare=False)
+    key: Optional[str] = field(compare=False, default=None)
+    sheddable: bool = field(compare=False, default=False)
+    enqueued_at: float = field(compare=False, default_factory=time.monotonic)
+    future: Optional[asyncio.Future] = field(compare=False, default=None)
+
+
+class JobExecutor:
+    def __init__(
+        self,
+        concurrency: int = settings.job_concurrency,
+        queue_size: int = settings.job_queue_size,
+        shed_latency: float = settings.job_shed_latency,
+        backend: str = settings.job_queue_backend,
+    ):
+        self.concurrency = concurrency
+        self.queue_size = queue_size
+        self.shed_latency = shed_latency
+        self.backend = backend
+        self._heap: List[Job] = []
+        self._queued: Dict[str, Job] = {}
+        self._seq = itertools.count()
+        self._not_empty: Optional[asyncio.Condition] = None
+        self._workers: List[asyncio.Task] = []
+        # Notify and Redis hand-off tasks, referenced until they are done
+        self._tasks: Set[asyncio.Task] = set()
+        self._latency = 0.0
+        self._latency_at = 0.0
+        self._redis = None
+
+    # Load signal
+
+    def record_latency(self, seconds: float) -> None:
+        """Record a user-facing latency sample (time to first chat chunk)."""
+        self._latency += LATENCY_EWMA_ALPHA * (seconds - self._latency)
+        self._latency_at = time.monotonic()
+        metrics.gauge("jobs.chat_latency_ewma", round(self._latency, 3))
+
+    @property
+    def overloaded(self) -> bool:
+        recent = time.monotonic() - self._latency_at < LATENCY_WINDOW
+        return recent and self._latency > self.shed_latency
+
+    # Submission
+
+    def submit(
+        self,
+        name: str,
+        *args,
+        priority: int = PRIORITY_NORMAL,
+        key: Optional[str] = None,
+        sheddable: bool = False,
+    ) -> asyncio.Future:
+        """Queue a job. Returns a future resolved with its result, or None if dropped or shed.
+
+        With the Redis backend the job runs in the worker process, and the
+        future resolves to None as soon as the job is handed off (or coalesced
+        with one already waiting in Redis), never to the job's result.
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+
+        if sheddable and self.overloaded:
+            self._discard(Job(priority, next(self._seq), name, args, future=future), "shed")
+            return future
+
+        if self.backend == "redis":
+            task = self._spawn(self._push_redis(name, args, priority, key, sheddable))
+            task.add_done_callback(lambda t: future.set_result(None) if not future.done() else None)
+            return future
+
+        if key is not None and key in self._queued:
+            metrics.incr(f"jobs.{name}.coalesced")
+            return self._queued[key].future
+
+        new = Job(priority, next(self._seq), name, args, key, sheddable, future=future)
+        if len(self._heap) >= self.queue_size:
+            # Drop whichever of the new job and the worst queued job ranks lower
+            worst = max(self._heap)
+            if new > worst:
+                self._discard(new, "dropped")
+                return future
+            self._heap.remove(worst)
+            heapq.heapify(self._heap)
+            self._forget(worst)
+            self._discard(worst, "dropped")
+
+        heapq.heappush(self._heap, new)
+        if key is not None:
+            self._queued[key] = new
+        metrics.gauge("jobs.queue_depth", len(self._heap))
+        self._start()
+        self._spawn(self._notify())
+        return future
+
+    def _spawn(self, coro) -> asyncio.Task:
+        task = asyncio.get_running_loop().create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    def _forget(self, job: Job) -> None:
+        if job.key is not None and self._queued.get(job.key) is job:
+            del self._queued[job.key]
+
+    def _discard(self, job: Job, reason: str) -> None:
+        metrics.incr(f"jobs.{job.name}.{reason}")
+        logger.info(f"Background job {job.name}{job.args} {reason}")
+        if job.future is not None and not job.future.done():
+            job.future.set_result(None)
+
+    # Execution
+
+    def _start(self) -> None:
+        if self._workers:
+            return
+        self._not_empty = asyncio.Condition()
+        self._workers = [asyncio.create_task(self._work()) for _ in range(self.concurrency)]
+
+    async def _notify(self) -> None:
+        # Wake everyone: a worker collecting a batch only takes jobs of its own name
+        async with self._not_empty:
+            self._not_empty.notify_all()
+
+    async def _next(self) -> Job:
+        async with self._not_empty:
+            await self._not_empty.wait_for(lambda: bool(self._heap))
+            job = heapq.heappop(self._heap)
+        self._forget(job)
+        metrics.gauge("jobs.queue_depth", len(self._heap))
+        return job
+
+    async def _collect(self, first: Job, spec: JobSpec) -> List[Job]:
+        """Take further queued jobs of the same name until the batch is full or the window ends."""
+        batch = [first]
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + spec.batch_window
+        while True:
+            same = sorted(j for j in self._heap if j.name == first.name)[:spec.batch_size - len(batch)]
+            if same:
+                taken = set(map(id, same))
+                self._heap = [j for j in self._heap if id(j) not in taken]
+                heapq.heapify(self._heap)
+                for queued in same:
+                    self._forget(queued)
+                batch.extend(same)
+                metrics.gauge("jobs.queue_depth", len(self._heap))
+            remaining = deadline - loop.time()
+            if len(batch) >= spec.batch_size or remaining <= 0:
+                return batch
+            async with self._not_empty:
+                try:
+                    await asyncio.wait_for(self._not_empty.wait(), remaining)
+                except asyncio.TimeoutError:
+                    pass
+
+    async def _work(self) -> None:
+        while True:
+            job = await self._next()
+            spec = JOBS.get(job.name)
+            if spec is None:
+                # e.g. handed off through Redis by a process running another version
+                logger.error(f"Unknown background job {job.name}, discarding it")
+                self._discard(job, "unknown")
+                continue
+            batch = await self._collect(job, spec) if spec.batch_size else [job]
+
+            runnable = []
+            for queued in batch:
+                if queued.sheddable and self.overloaded:
+                    self._discard(queued, "shed")
+                else:
+                    metrics.observe(f"jobs.{queued.name}.wait", time.monotonic() - queued.enqueued_at)
+                    runnable.append(queued)
+            if not runnable:
+                continue
+
+            try:
+                with metrics.timer(f"jobs.{job.name}"):
+                    if spec.batch_size:
+                        metrics.incr(f"jobs.{job.name}.batches")
+                        metrics.incr(f"jobs.{job.name}.batched", len(runnable))
+                        results = await spec.fn([queued.args for queued in runnable])
+                        if len(results) != len(runnable):
+                            logger.error(
+                                f"Batch job {job.name} returned {len(results)} results for {len(runnable)} jobs"
+                            )
+                            results = (list(results) + [None] * len(runnable))[:len(runnable)]
+                    else:
+                        results = [await spec.fn(*job.args)]
+            except Exception as e:
+                logger.error(f"Background job {job.name}{job.args} failed: {str(e)}")
+                results = [None] * len(runnable)
+            for queued, result in zip(runnable, results):
+                if queued.future is not None and not queued.future.done():
+                    queued.future.set_result(result)
+
+    async def close(self) -> None:
+        tasks = [*self._workers, *self._tasks]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._workers = []
+        for queued in self._heap:
+            self._discard(queued, "dropped")
+        self._heap.clear()
+        self._queued.clear()
+        if self._redis is not None:
+            await self._redis.aclose()
+            self._redis = None
+
+    # Redis hand-off
+
+    @property
+    def redis(self):
+        if self._redis is None:
+            import redis.asyncio as redis
+            self._redis = redis.Redis(
+                host=settings.redis_host,
+                port=settings.redis_port,
+                db=settings.redis_db,
+                socket_timeout=None,
+            )
+        return self._redis
+
+    def _redis_key(self, priority: int) -> str:
+        return f"{settings.redis_key_prefix}jobs:{priority}"
+
+    def _marker_key(self, key: str) -> str:
+        return f"{settings.redis_key_prefix}jobs:queued:{key}"
+
+    async def _push_redis(self, name: str, args: tuple, priority: int, key: Optional[str], sheddable: bool) -> None:
+        payload = json.dumps({
+            "name": name,
+            "args": list(args),
+            "key": key,
+            "sheddable": sheddable,
+            "enqueued_at": time.time(),
+        })
+        try:
+            if key is not None and not await self.redis.set(self._marker_key(key), 1, nx=True, ex=HANDOFF_MARKER_TTL):
+                metrics.incr(f"jobs.{name}.coalesced")
+                return
+            await self.redis.lpush(self._redis_key(priority), payload)
+            metrics.incr(f"jobs.{name}.handed_off")
+        except Exception as e:
+            metrics.incr(f"jobs.{name}.dropped")
+            logger.error(f"Could not hand off background job {name} to Redis: {str(e)}")
+
+    async def run_redis_worker(self) -> None:
+        """Pop jobs from Redis, highest priority first, and run them on a local executor."""
+        keys = [self._redis_key(p) for p in (PRIORITY_HIGH, PRIORITY_NORMAL, PRIORITY_LOW)]
+        local = JobExecutor(self.concurrency, self.queue_size, self.shed_latency, backend="memory")
+        # Only pop what the local queue can hold, the rest waits in Redis
+        slots = asyncio.Semaphore(self.queue_size)
+        logger.info(f"Background job worker listening on {keys}")
+        try:
+            while True:
+                await slots.acquire()
+                key, payload = await self.redis.brpop(keys)
+                data = json.loads(payload)
+                metrics.observe(f"jobs.{data['name']}.handoff", max(0.0, time.time() - data["enqueued_at"]))
+                if data.get("key") is not None:
+                    # Taken off Redis: a new submission is queued again, and coalesced locally if this one still waits
+                    await self.redis.delete(self._marker_key(data["key"]))
+                priority = int(key.decode().rsplit(":", 1)[1])
+                future = local.submit(
+                    data["name"],
+                    *data["args"],
+                    priority=priority,
+                    key=data.get("key"),
+                    sheddable=data.get("sheddable", False),
+                )
+                future.add_done_callback(lambda _: slots.release())
+        finally:
+            await local.close()
+
+
+job_executor = JobExecutor()
@@ -0,0 +1,275 @@
+"""
+Rate limiting and admission control.
+
+``RateLimitMiddleware`` gives every client IP and every authenticated user a
+token bucket: ``rate_limit_requests_per_minute`` per IP and
+``rate_limit_user_requests_per_minute`` per user (from ``get_current_user``),
+each allowing a burst of ``rate_limit_burst_seconds`` worth of requests.
+Requests over the limit get a 429 with ``Retry-After``. Buckets live in Redis,
+updated by one Lua script so that all workers share them, and in process
+memory when the cache is not Redis or Redis fails.
+
+``llm_streams`` bounds how many answers are generated at once across all
+workers (``llm_max_streams``). A chat request waits up to
+``llm_stream_queue_seconds`` for a slot and is then turned away with a 429.
+
+With the memory backend the buckets and ``llm_max_streams`` are per worker
+process, not per service: with ``uvicorn_workers`` workers (one per CPU) a
+client can make up to that many times its limit, and that many times
+``llm_max_streams`` answers can be generated at once.
+
+Rejections are counted as ``ratelimit.rejected.ip``, ``ratelimit.rejected.user``
+and ``llm.streams.rejected``.
+"""
+import asyncio
+import json
+import time
+import uuid
+from typing import Optional, Tuple
+from fastapi import HTTPException
+from app.auth.jwt_auth import get_current_user
+from app.config import settings
+from app.core.cache import LRUCache
+from helpers.metrics import metrics
+from helpers.utils import get_logger
+
+logger = get_logger(__name__)
+
+# KEYS[1] bucket; ARGV: tokens per second, capacity. Returns {allowed, seconds until a token}
+TOKEN_BUCKET_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[2])
+local time = redis.call('TIME')
+local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(bucket[1]) or capacity
+local ts = tonumber(bucket[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+local allowed = 0
+local retry_after = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+    allowed = 1
+else
+    retry_after = (1 - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 1)
+return {allowed, tostring(retry_after)}
+"""
+
+# KEYS[1] sorted set of leases; ARGV: limit, lease id, lease seconds. Returns 1 if acquired
+ACQUIRE_SLOT_SCRIPT = """
+local time = redis.call('TIME')
+local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now)
+if redis.call('ZCARD', KEYS[1]) >= tonumber(ARGV[1]) then
+    return 0
+end
+redis.call('ZADD', KEYS[1], now + tonumber(ARGV[3]), ARGV[2])
+redis.call('EXPIRE', KEYS[1], math.ceil(tonumber(ARGV[3])))
+return 1
+"""
+
+
+class _RedisBacked:
+    """Lazy Redis client that is given up on (for memory) after the first failure."""
+
+    def __init__(self, backend: str):
+        self._use_redis = backend == "redis"
+        self._redis = None
+
+    @property
+    def redis(self):
+        if self._redis is None:
+            import redis.asyncio as redis
+            self._redis = redis.Redis(
+                host=settings.redis_host,
+                port=settings.redis_port,
+                db=settings.redis_db,
+                socket_timeout=settings.redis_socket_timeout,
+            )
+        return self._redis
+
+    def _redis_failed(self, e: Exception) -> None:
+        logger.warning(f"Redis failed in {type(self).__name__}: {e}. Using in-process state.")
+        self._use_redis = False
+
+    async def close(self) -> None:
+        if self._redis is not None:
+            await self._redis.aclose()
+            self._redis = None
+
+
+class RateLimiter(_RedisBacked):
+    """Token buckets keyed by client."""
+
+    def __init__(self, backend: str = settings.cache_type, max_local_buckets: int = 100_000):
+        super().__init__(backend)
+        self._local = LRUCache(maxsize=max_local_buckets)
+        self._script = None
+
+    async def hit(self, key: str, per_minute: int, burst_seconds: float = settings.rate_limit_burst_seconds) -> Tuple[bool, float]:
+        """Take a token from the bucket of `key`. Returns (allowed, seconds until the next token)."""
+        rate = per_minute / 60
+        capacity = max(1.0, rate * burst_seconds)
+        if self._use_redis:
+            try:
+                if self._script is None:
+                    self._script = self.redis.register_script(TOKEN_BUCKET_SCRIPT)
+                allowed, retry_after = await self._script(
+                    keys=[f"{settings.redis_key_prefix}ratelimit:{key}"], args=[rate, capacity]
+                )
+                return bool(allowed), float(retry_after)
+            except Exception as e:
+                self._redis_failed(e)
+        return self._hit_local(key, rate, capacity)
+
+    def _hit_local(self, key: str, rate: float, capacity: float) -> Tuple[bool, float]:
+        now = time.monotonic()
+        tokens, ts = self._local.get(key, (capacity, now))
+        tokens = min(capacity, tokens + (now - ts) * rate)
+        if tokens >= 1:
+            self._local.set(key, (tokens - 1, now))
+            return True, 0.0
+        self._local.set(key, (tokens, now))
+        return False, (1 - tokens) / rate
+
+
+class StreamSlots(_RedisBacked):
+    """
+    Counting semaphore for concurrent LLM answer streams. With Redis the slots
+    are leases in a sorted set shared by all workers; a lease left behind by a
+    crashed worker expires after `lease_seconds`.
+    """
+
+    def __init__(self, limit: int = settings.llm_max_streams, backend: str = settings.cache_type, lease_seconds: float = 600):
+        super().__init__(backend)
+        self.limit = limit
+        self.lease_seconds = lease_seconds
+        self._active = 0
+        self._script = None
+
+    @property
+    def _key(self) -> str:
+        return f"{settings.redis_key_prefix}llm-streams"
+
+    async def _try_acquire(self, lease: str) -> bool:
+        if self._use_redis:
+            try:
+                if self._script is None:
+                    self._script = self.redis.register_script(ACQUIRE_SLOT_SCRIPT)
+                return bool(await self._script(keys=[self._key], args=[self.limit, lease, self.lease_seconds]))
+            except Exception as e:
+                self._redis_failed(e)
+        if self._active >= self.limit:
+            return False
+        self._active += 1
+        return True
+
+    async def acquire(self, timeout: float = settings.llm_stream_queue_seconds) -> Optional[str]:
+        """Wait up to `timeout` seconds for a slot. Returns its lease, or None if none freed up."""
+        lease = uuid.uuid4().hex
+        started = time.monotonic()
+        while not await self._try_acquire(lease):
+            if time.monotonic() - started >= timeout:
+                metrics.incr("llm.streams.rejected")
+                return None
+            await asyncio.sleep(0.1)
+        metrics.observe("llm.streams.queued", time.monotonic() - started)
+        metrics.incr("llm.streams.admitted")
+        return lease
+
+    async def release(self, lease: str) -> None:
+        if self._use_redis:
+            try:
+                await self.redis.zrem(self._key, lease)
+                return
+            except Exception as e:
+                self._redis_failed(e)
+        self._active = max(0, self._active - 1)
+
+
+def _client_ip(scope) -> str:
+    """
+    The address the request came from. With `rate_limit_trust_forwarded_for`,
+    the X-Forwarded-For entry added by the outermost of the
+    `rate_limit_trusted_proxies` proxies; entries left of it are client supplied.
+    """
+    headers = dict(scope.get("headers") or [])
+    forwarded = headers.get(b"x-forwarded-for")
+    if forwarded and settings.rate_limit_trust_forwarded_for:
+        addresses = [a.strip() for a in forwarded.decode("latin-1").split(",") if a.strip()]
+        hops = max(1, settings.rate_limit_trusted_proxies)
+        if len(addresses) >= hops:
+            return addresses[-hops]
+    client = scope.get("client")
+    return client[0] if client else "unknown"
+
+
+async def _user_id(scope) -> Optional[str]:
+    """The user of a request with a valid bearer token, per get_current_user."""
+    headers = dict(scope.get("headers") or [])
+    authorization = headers.get(b"authorization", b"").decode("latin-1")
+    scheme, _, token = authorization.partition(" ")
+    # In development get_current_user returns one fixed user for everyone
+    if scheme.lower() != "bearer" or not token or settings.environment == "development":
+        return None
+    try:
+        return await get_current_user(token)
+    except HTTPException:
+        # Invalid tokens are rejected (or not) by the endpoint itself
+        return None
+
+
+async def _reject(send, retry_after: float, detail: str) -> None:
+    body = json.dumps({"detail": detail}).encode()
+    await send({
+        "type": "http.response.start",
+        "status": 429,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+            (b"retry-after", str(max(1, round(retry_after))).encode()),
+        ],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+class RateLimitMiddleware:
+    """ASGI middleware applying per IP and per user token buckets to API requests."""
+
+    def __init__(self, app, limiter: Optional[RateLimiter] = None):
+        self.app = app
+        self.limiter = limiter or rate_limiter
+        self.exempt = (f"{settings.api_prefix}/health",)
+
+    async def __call__(self, scope, receive, send):
+        path = scope.get("path", "")
+        if (
+            scope["type"] != "http"
+            or not settings.rate_limit_enabled
+            or not path.startswith(settings.api_prefix)
+            or path.startswith(self.exempt)
+        ):
+            return await self.app(scope, receive, send)
+
+        allowed, retry_after = await self.limiter.hit(f"ip:{_client_ip(scope)}", settings.rate_limit_requests_per_minute)
+        if not allowed:
+            metrics.incr("ratelimit.rejected.ip")
+            return await _reject(send, retry_after, "Too many requests")
+
+        user = await _user_id(scope)
+        if user:
+            allowed, retry_after = await self.limiter.hit(f"user:{user}", settings.rate_limit_user_requests_per_minute)
+            if not allowed:
+                metrics.incr("ratelimit.rejected.user")
+                logger.warning(f"Rate limited user {user} on {path}")
+                return await _reject(send, retry_after, "Too many requests")
+
+        await self.app(scope, receive, send)
+
+
+# Export the singleton instances
+rate_limiter = RateLimiter()
+llm_streams = StreamSlots()
@@ -0,0 +1,127 @@
+"""
+Server-Sent Events encoding for streamed answers.
+
+Text deltas are framed as ``id: <n>`` / ``data: {"text": ...}`` events. Instead
+of one frame per model delta, text is coalesced and flushed when it ends a
+sentence, when ``sse_flush_bytes`` have built up, or ``sse_flush_delay``
+seconds after the first unsent delta; the first delta is sent at once to keep
+time to first token low. While nothing is sent for ``sse_heartbeat_seconds`` a
+comment line keeps proxies from timing the connection out. The stream ends
+with an ``event: done`` frame carrying whatever the ``done`` callback returns
+(e.g. usage), or ``event: error`` if the source failed.
+"""
+import asyncio
+import json
+import re
+from typing import AsyncIterator, Callable, Optional, Tuple, Union
+from app.config import settings
+from helpers.utils import get_logger
+
+logger = get_logger(__name__)
+
+HEARTBEAT = ": keep-alive\n\n"
+# Ends with a sentence terminator or a line break, possibly followed by whitespace
+FLUSH_BOUNDARY = re.compile(r"(?:[.!?।:]|\n)\s*$")
+
+
+def format_event(data: Union[str, dict], id: Optional[Union[int, str]] = None, event: Optional[str] = None) -> str:
+    """Encode one SSE frame. Dicts are sent as JSON, multi-line strings as several data lines."""
+    if not isinstance(data, str):
+        data = json.dumps(data, ensure_ascii=False)
+    lines = []
+    if id is not None:
+        lines.append(f"id: {id}")
+    if event is not None:
+        lines.append(f"event: {event}")
+    lines.extend(f"data: {line}" for line in data.split("\n"))
+    return "\n".join(lines) + "\n\n"
+
+
+def parse_event(frame: str) -> Tuple[Optional[str], Optional[Union[str, dict]]]:
+    """Decode a frame from `format_event` into (event, data); comments give (None, None)."""
+    event, data = None, []
+    for line in frame.rstrip("\n").split("\n"):
+        if line.startswith("event: "):
+            event = line[7:]
+        elif line.startswith("data: "):
+            data.append(line[6:])
+    if not data:
+        return event, None
+    text = "\n".join(data)
+    try:
+        return event, json.loads(text)
+    except ValueError:
+        return event, text
+
+
+async def encode_sse(
+    chunks: AsyncIterator[str],
+    done: Optional[Callable[[], dict]] = None,
+    heartbeat: float = settings.sse_heartbeat_seconds,
+    flush_bytes: int = settings.sse_flush_bytes,
+    flush_delay: float = settings.sse_flush_delay,
+) -> AsyncIterator[str]:
+    """Frame a stream of text deltas as SSE text events with adaptive coalescing."""
+    # One reader task buffers deltas; the delayed flush and heartbeat are loop
+    # timers, so there is no task or wait per delta.
+    loop = asyncio.get_running_loop()
+    iterator = chunks.__aiter__()
+    frames: asyncio.Queue = asyncio.Queue()
+    state = {"buffer": "", "id": 0, "flush": None, "heartbeat": None}
+
+    def beat() -> None:
+        frames.put_nowait(HEARTBEAT)
+        state["heartbeat"] = loop.call_later(heartbeat, beat)
+
+    def send(frame: str) -> None:
+        state["heartbeat"].cancel()
+        frames.put_nowait(frame)
+        state["heartbeat"] = loop.call_later(heartbeat, beat)
+
+    def flush() -> None:
+        if state["flush"] is not None:
+            state["flush"].cancel()
+            state["flush"] = None
+        if state["buffer"]:
+            state["id"] += 1
+            send(format_event({"text": state["buffer"]}, id=state["id"]))
+            state["buffer"] = ""
+
+    async def read() -> None:
+        first = True
+        try:
+            async for chunk in iterator:
+                if not chunk:
+                    continue
+                state["buffer"] += chunk
+                if first or FLUSH_BOUNDARY.search(chunk) or len(state["buffer"].encode("utf-8")) >= flush_bytes:
+                    first = False
+                    flush()
+                elif state["flush"] is None:
+                    state["flush"] = loop.call_later(flush_delay, flush)
+            flush()
+            frames.put_nowait(format_event(done() if done else {}, id=state["id"] + 1, event="done"))
+        except Exception as e:
+            logger.error(f"Error while streaming events: {str(e)}")
+            flush()
+            frames.put_nowait(format_event({"detail": str(e)}, id=state["id"] + 1, event="error"))
+        frames.put_nowait(None)
+
+    state["heartbeat"] = loop.call_later(heartbeat, beat)
+    reader = asyncio.create_task(read())
+    try:
+        while (frame := await frames.get()) is not None:
+            yield frame
+    finally:
+        for timer in (state["flush"], state["heartbeat"]):
+            if timer is not None:
+                timer.cancel()
+        if not reader.done():
+            # Client went away: stop reading the answer
+            reader.cancel()
+            try:
+                await reader
+            except asyncio.CancelledError:
+                pass
+        if hasattr(iterator, "aclose"):
+            await iterator.aclose()
@@ -0,0 +1,264 @@
+"""
+Replayable buffers for the SSE frames of chat answers.
+
+An answer is generated by a background task that appends its frames to a
+buffer keyed by session and turn; the ``/chat`` response only tails that
+buffer. The generation is not tied to the connection, so it finishes (and the
+history is saved) even if the client goes away. A client that reconnects to
+``/chat/{session_id}/stream`` with the ``Last-Event-ID`` it last saw gets the
+frames it missed and then the live ones, without running the agents again.
+
+Frames are kept in process for local readers and, with ``CACHE_TYPE=redis``,
+also in a Redis stream so that a reconnect can be served by any worker. Both
+expire ``stream_buffer_ttl`` seconds after the answer has finished.
+"""
+import asyncio
+import time
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+from app.config import settings
+from app.core.sse import HEARTBEAT, format_event
+from helpers.metrics import metrics
+from helpers.utils import get_logger
+
+logger = get_logger(__name__)
+
+# Stop tailing a stream that has not finished within this time
+MAX_ANSWER_SECONDS = 600
+MAX_FRAMES = 5000
+# How long a reader waits for a turn's stream to appear; the request that runs
+# the turn may first queue for an LLM stream slot
+START_GRACE_SECONDS = settings.llm_stream_queue_seconds + 5
+NOT_STARTED = format_event({"detail": "This answer was not started, please send the question again"}, event="error")
+
+
+def frame_id(frame: str) -> Optional[int]:
+    """The numeric id of a frame from `encode_sse`, or None for comments."""
+    if not frame.startswith("id: "):
+        return None
+    return int(frame[4:frame.index("\n")])
+
+
+def is_final(frame: str) -> bool:
+    return "\nevent: done\n" in frame or "\nevent: error\n" in frame
+
+
+@dataclass
+class _LocalStream:
+    frames: List[Tuple[int, str]] = field(default_factory=list)
+    finished: bool = False
+    changed: asyncio.Event = field(default_factory=asyncio.Event)
+
+    def append(self, frame: str) -> None:
+        self.frames.append((frame_id(frame), frame))
+        self._wake()
+
+    def finish(self) -> None:
+        self.finished = True
+        self._wake()
+
+    def _wake(self) -> None:
+        # Readers wait on the current event; a fresh one is used for the next change
+        self.changed.set()
+        self.changed = asyncio.Event()
+
+
+class StreamBuffer:
+    """Runs answer streams in the background and serves their frames to any number of readers."""
+
+    def __init__(self, ttl: int = settings.stream_buffer_ttl, backend: str = settings.cache_type):
+        self.ttl = ttl
+        self._use_redis = backend == "redis"
+        self._redis = None
+        self._local: Dict[Tuple[str, int], _LocalStream] = {}
+        self._tasks: Set[asyncio.Task] = set()
+
+    def _key(self, session_id: str, turn: Optional[int] = None) -> str:
+        return f"{settings.redis_key_prefix}stream:{session_id}:{'latest' if turn is None else turn}"
+
+    @property
+    def redis(self):
+        if self._redis is None:
+            import redis.asyncio as redis
+            self._redis = redis.Redis(
+                host=settings.redis_host,
+                port=settings.redis_port,
+                db=settings.redis_db,
+                socket_timeout=settings.redis_socket_timeout + settings.sse_heartbeat_seconds,
+            )
+        return self._redis
+
+    def _redis_failed(self, action: str, e: Exception) -> None:
+        logger.warning(f"Redis stream buffer failed during {action}: {e}. Keeping answer streams in memory only.")
+        self._use_redis = False
+
+    # Writing
+
+    def start(
+        self,
+        session_id: str,
+        turn: int,
+        frames: AsyncIterator[str],
+        on_finish: Optional[Callable[[bool], Awaitable[None]]] = None,
+    ) -> None:
+        """
+        Generate `frames` in the background into the buffer of this turn.
+        `on_finish` is awaited when the stream ends, however it ends, with
+        whether it got to its `done` event.
+        """
+        stream = _LocalStream()
+        self._local[(session_id, turn)] = stream
+        task = asyncio.create_task(self._pump(session_id, turn, frames, stream, on_finish))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def abandon(self, session_id: str, turn: int, detail: str) -> None:
+        """End a turn that will not be answered, so that readers attached to it get an error event."""
+        async def frames():
+            yield format_event({"detail": detail}, id=1, event="error")
+        self.start(session_id, turn, frames())
+
+    async def _pump(
+        self,
+        session_id: str,
+        turn: int,
+        frames: AsyncIterator[str],
+        stream: _LocalStream,
+        on_finish: Optional[Callable[[bool], Awaitable[None]]],
+    ) -> None:
+        key = self._key(session_id, turn)
+        completed = False
+        try:
+            if self._use_redis:
+                try:
+                    await self.redis.set(self._key(session_id), turn, ex=MAX_ANSWER_SECONDS + self.ttl)
+                except Exception as e:
+                    self._redis_failed("SET", e)
+            async for frame in frames:
+                if frame == HEARTBEAT:
+                    continue  # readers send their own
+                stream.append(frame)
+                completed = "\nevent: done\n" in frame
+                if self._use_redis:
+                    try:
+                        await self.redis.xadd(key, {"frame": frame}, maxlen=MAX_FRAMES, approximate=True)
+                        if len(stream.frames) == 1:
+                            await self.redis.expire(key, MAX_ANSWER_SECONDS + self.ttl)
+                    except Exception as e:
+                        self._redis_failed("XADD", e)
+        except Exception as e:
+            logger.error(f"Answer stream for session {session_id} turn {turn} failed: {str(e)}")
+        finally:
+            stream.finish()
+            if on_finish is not None:
+                try:
+                    await on_finish(completed)
+                except Exception as e:
+                    logger.error(f"Finishing answer stream for session {session_id} turn {turn} failed: {str(e)}")
+            if self._use_redis:
+                try:
+                    await self.redis.expire(key, self.ttl)
+                except Exception as e:
+                    self._redis_failed("EXPIRE", e)
+            asyncio.get_running_loop().call_later(self.ttl, self._local.pop, (session_id, turn), None)
+
+    # Reading
+
+    async def latest_turn(self, session_id: str) -> Optional[int]:
+        """The most recent turn of a session that still has a buffer."""
+        local = [turn for (sid, turn) in self._local if sid == session_id]
+        if local:
+            return max(local)
+        if self._use_redis:
+            try:
+                turn = await self.redis.get(self._key(session_id))
+                return int(turn) if turn is not None else None
+            except Exception as e:
+                self._redis_failed("GET", e)
+        return None
+
+    async def exists(self, session_id: str, turn: int) -> bool:
+        if (session_id, turn) in self._local:
+            return True
+        if self._use_redis:
+            try:
+                return bool(await self.redis.exists(self._key(session_id, turn)))
+            except Exception as e:
+                self._redis_failed("EXISTS", e)
+        return False
+
+    async def tail(self, session_id: str, turn: int, after: int = 0) -> AsyncIterator[str]:
+        """Frames of a turn with an id above `after`, then live ones until the answer ends."""
+        if after:
+            metrics.incr("chat.stream.resumed")
+        stream = self._local.get((session_id, turn))
+        if stream is None and not self._use_redis:
+            # A duplicate request can get here just before the turn's stream is started
+            deadline = time.monotonic() + START_GRACE_SECONDS
+            while stream is None and time.monotonic() < deadline:
+                await asyncio.sleep(0.05)
+                stream = self._local.get((session_id, turn))
+            if stream is None:
+                yield NOT_STARTED
+                return
+        if stream is not None:
+            source = self._tail_local(stream, after)
+        else:
+            source = self._tail_redis(session_id, turn, after)
+        async for frame in source:
+            yield frame
+
+    async def _tail_local(self, stream: _LocalStream, after: int) -> AsyncIterator[str]:
+        position = 0
+        deadline = time.monotonic() + MAX_ANSWER_SECONDS
+        while True:
+            while position < len(stream.frames):
+                number, frame = stream.frames[position]
+                position += 1
+                if number > after:
+                    yield frame
+            if stream.finished or time.monotonic() > deadline:
+                return
+            try:
+                await asyncio.wait_for(stream.changed.wait(), settings.sse_heartbeat_seconds)
+            except asyncio.TimeoutError:
+                yield HEARTBEAT
+
+    async def _tail_redis(self, session_id: str, turn: int, after: int) -> AsyncIterator[str]:
+        key = self._key(session_id, turn)
+        last = "0-0"
+        started = time.monotonic()
+        deadline = started + MAX_ANSWER_SECONDS
+        while time.monotonic() < deadline:
+            try:
+                # Until the first frame, check back within the grace period whether the turn started at all
+                block = settings.sse_heartbeat_seconds if last != "0-0" else min(settings.sse_heartbeat_seconds, START_GRACE_SECONDS)
+                result = await self.redis.xread({key: last}, count=100, block=int(block * 1000))
+            except Exception as e:
+                self._redis_failed("XREAD", e)
+                return
+            if not result:
+                if last == "0-0" and time.monotonic() - started > START_GRACE_SECONDS and not await self.exists(session_id, turn):
+                    yield NOT_STARTED
+                    return
+                yield HEARTBEAT
+                continue
+            for entry_id, fields in result[0][1]:
+                last = entry_id
+                frame = fields[b"frame"].decode("utf-8")
+                if (frame_id(frame) or 0) > after:
+                    yield frame
+                if is_final(frame):
+                    return
+
+    async def close(self) -> None:
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        if self._redis is not None:
+            await self._redis.aclose()
+            self._redis = None
+
+
+# Export the singleton instance
+stream_buffer = StreamBuffer()
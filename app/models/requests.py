@@ -15,6 +15,7 @@ class TranscribeRequest(BaseModel):
 class SuggestionsRequest(BaseModel):
     session_id: str = Field(..., description="Session ID to get suggestions for")
     target_lang: str = Field('mr', description="Target language for suggestions")
+    wait_seconds: float = Field(0, ge=0, le=10, description="Seconds to wait for suggestions that are still being generated")
 
 class TTSRequest(BaseModel):
     text: str = Field(..., description="Text to convert to speech")
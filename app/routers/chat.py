@@ -1,21 +1,23 @@
 from fastapi.responses import StreamingResponse
 import uuid
 import asyncio
-from fastapi import APIRouter, BackgroundTasks
+from fastapi import APIRouter, Header, HTTPException
 from helpers.utils import get_logger
 from app.utils import _get_message_history
-from app.tasks.suggestions import create_suggestions
-from app.services.chat import stream_chat_messages
+from app.core.sse import encode_sse, parse_event
+from app.core.ratelimit import llm_streams
+from app.core.streams import stream_buffer
+from app.services.chat import claim_turn, release_turn, stream_chat_messages
+from app.services.tts import split_sentences, stream_speech
 from app.models.requests import ChatRequest
-from typing import Optional
+from typing import Optional, Tuple
 
 logger = get_logger(__name__)
 
 router = APIRouter(prefix="/chat", tags=["chat"])
 
-@router.post("/")
-async def chat(request: ChatRequest, background_tasks: BackgroundTasks):
-    """Handles chat sessions between a user and the AI assistant."""
+async def _start_chat(request: ChatRequest):
+    """Resolve the session and load its history."""
     session_id = request.session_id or str(uuid.uuid4())
     
     logger.info(
@@ -27,45 +29,182 @@ async def chat(request: ChatRequest, background_tasks: BackgroundTasks):
     history = await _get_message_history(session_id)
     logger.debug(f"Retrieved message history for session {session_id} - length: {len(history)}")
 
-    # Create suggestions for the session: 1, 3, 5, 7, ...
-    if (len(history)+1) % 2 == 0:
-        logger.debug(f"Creating suggestions for session {session_id}")
-        background_tasks.add_task(create_suggestions, session_id, request.target_lang)
-
-    # Create an event loop for running the async generator
-    async def run_async():
-        logger.debug(f"Generator function run_async created for session {session_id}")
-        try:
-            # Log the event loop state
-            loop = asyncio.get_running_loop()
-            logger.debug(f"Using event loop {id(loop)} for session {session_id}")
-            
-            logger.debug(f"Starting streaming response for session {session_id}")
-            chunks_yielded = 0
-            async for chunk in stream_chat_messages(
-                query=request.query,
-                session_id=session_id,
-                source_lang=request.source_lang,
-                target_lang=request.target_lang,
-                user_id=request.user_id,
-                history=history
-            ):
-                chunks_yielded += 1
-                yield chunk
-            
-            logger.info(f"Completed streaming response for session {session_id} - total chunks: {chunks_yielded}")
-        except Exception as e:
-            logger.error(f"Error during streaming for session {session_id}: {str(e)}")
-            raise
+    return session_id, history
+
+
+async def _stream_chat(request: ChatRequest, session_id: str, history: list, usage: Optional[dict] = None):
+    """Async generator streaming the answer text for a chat request."""
+    logger.debug(f"Chat stream generator created for session {session_id}")
+    try:
+        # Log the event loop state
+        loop = asyncio.get_running_loop()
+        logger.debug(f"Using event loop {id(loop)} for session {session_id}")
+        
+        logger.debug(f"Starting streaming response for session {session_id}")
+        chunks_yielded = 0
+        async for chunk in stream_chat_messages(
+            query=request.query,
+            session_id=session_id,
+            source_lang=request.source_lang,
+            target_lang=request.target_lang,
+            user_id=request.user_id,
+            history=history,
+            usage=usage,
+        ):
+            chunks_yielded += 1
+            yield chunk
+        
+        logger.info(f"Completed streaming response for session {session_id} - total chunks: {chunks_yielded}")
+    except Exception as e:
+        logger.error(f"Error during streaming for session {session_id}: {str(e)}")
+        raise
+
+
+async def _admit() -> str:
+    """Wait for an LLM stream slot, or turn the request away when the service is saturated."""
+    lease = await llm_streams.acquire()
+    if lease is None:
+        raise HTTPException(
+            status_code=429,
+            detail="Too many answers are being generated, please retry shortly",
+            headers={"Retry-After": "5"},
+        )
+    return lease
+
+
+async def _open_turn(request: ChatRequest) -> Tuple[str, int]:
+    """
+    Claim the session's next turn and start answering it in the background,
+    or find the turn in progress that a duplicate request belongs to.
+    Returns the session id and the turn whose stream to read.
+    """
+    session_id, history = await _start_chat(request)
+    try:
+        turn, start = await claim_turn(session_id, request.query, history)
+    except TimeoutError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+    if not start:
+        logger.info(f"Duplicate chat request for session {session_id} attached to turn {turn}")
+        return session_id, turn
+
+    try:
+        lease = await _admit()
+    except HTTPException as e:
+        # Duplicates may already be waiting on this turn's stream
+        stream_buffer.abandon(session_id, turn, e.detail)
+        await release_turn(session_id, turn, completed=False)
+        raise
+
+    async def finish(completed: bool) -> None:
+        # Runs however the stream ends, even if its generator was never started
+        await llm_streams.release(lease)
+        await release_turn(session_id, turn, completed=completed)
+
+    usage = {}
+    stream_buffer.start(
+        session_id,
+        turn,
+        encode_sse(
+            _stream_chat(request, session_id, history, usage),
+            done=lambda: {"session_id": session_id, "turn": turn, "usage": usage},
+        ),
+        on_finish=finish,
+    )
+    return session_id, turn
+
+
+async def _tail_text(session_id: str, turn: int):
+    """The answer text of a turn, read back from its stream buffer."""
+    async for frame in stream_buffer.tail(session_id, turn):
+        event, data = parse_event(frame)
+        if event == "error":
+            raise RuntimeError(data.get("detail") if isinstance(data, dict) else data)
+        if event is None and isinstance(data, dict) and "text" in data:
+            yield data["text"]
+
+
+@router.post("/")
+async def chat(request: ChatRequest):
+    """
+    Handles chat sessions between a user and the AI assistant.
+
+    The answer is streamed as Server-Sent Events: `id: <n>` frames with
+    `data: {"text": ...}`, keep-alive comments while the model is busy, and a
+    final `event: done` with the session id, turn and token usage. The answer
+    is generated in the background, so a dropped connection can be resumed
+    with `GET /chat/{session_id}/stream`.
+
+    Turns of a session run one at a time. A retried request for the turn in
+    progress gets that turn's stream instead of a new answer; a new question
+    waits for the previous answer to be saved.
+    """
+    session_id, turn = await _open_turn(request)
 
     logger.debug(f"Creating StreamingHttpResponse for session {session_id}")
     response = StreamingResponse(
-        run_async(),
+        stream_buffer.tail(session_id, turn),
         media_type='text/event-stream; charset=utf-8',
         headers={
             'Cache-Control': 'no-cache',
-            'X-Accel-Buffering': 'no'
+            'X-Accel-Buffering': 'no',
+            'X-Session-ID': session_id,
+            'X-Chat-Turn': str(turn),
         }
     )    
     logger.debug(f"StreamingHttpResponse created for session {session_id}")
     return response
+
+
+@router.get("/{session_id}/stream")
+async def resume_chat(
+    session_id: str,
+    turn: Optional[int] = None,
+    last_event_id: Optional[int] = Header(None, alias="Last-Event-ID"),
+):
+    """
+    Resume the answer stream of a chat turn (the latest one by default) after
+    a dropped connection: frames after `Last-Event-ID` are replayed, followed by
+    the rest of the answer as it is generated.
+    """
+    if turn is None:
+        turn = await stream_buffer.latest_turn(session_id)
+    if turn is None or not await stream_buffer.exists(session_id, turn):
+        raise HTTPException(status_code=404, detail="No answer stream to resume for this session")
+
+    logger.info(f"Resuming answer stream for session {session_id} turn {turn} after event {last_event_id or 0}")
+    return StreamingResponse(
+        stream_buffer.tail(session_id, turn, after=last_event_id or 0),
+        media_type='text/event-stream; charset=utf-8',
+        headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no',
+            'X-Session-ID': session_id,
+            'X-Chat-Turn': str(turn),
+        }
+    )
+
+
+@router.post("/speech")
+async def chat_speech(request: ChatRequest):
+    """
+    Same as chat, but streams the answer as speech: every sentence is
+    synthesized as soon as the model has generated it, and sent in order as
+    `data: {"index", "text", "audio_content"}` events, followed by `event: done`.
+
+    The answer is generated as a chat turn in the background, with the same
+    one-turn-at-a-time and duplicate handling as chat.
+    """
+    session_id, turn = await _open_turn(request)
+
+    sentences = split_sentences(_tail_text(session_id, turn))
+    return StreamingResponse(
+        stream_speech(sentences, request.target_lang),
+        media_type='text/event-stream; charset=utf-8',
+        headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no',
+            'X-Session-ID': session_id,
+            'X-Chat-Turn': str(turn),
+        }
+    )
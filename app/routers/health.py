@@ -1,6 +1,7 @@
 from fastapi import APIRouter, HTTPException, status
 from app.utils import cache
 from app.config import settings
+from helpers.metrics import metrics
 import time
 from typing import Dict, Any
 
@@ -78,4 +79,12 @@ async def health_check():
             detail=health_status
         )
     
-    return health_status 
\ No newline at end of file
+    return health_status 
+
+@router.get("/metrics", status_code=status.HTTP_200_OK)
+async def get_metrics():
+    """
+    In-process latency and counter metrics for this worker
+    (e.g. Bhashini latency per pipeline task)
+    """
+    return metrics.snapshot()
@@ -1,35 +1,88 @@
+import asyncio
 import uuid
-from helpers.transcription import transcribe_bhashini, detect_audio_language_bhashini
-from helpers.utils import get_logger
-from fastapi import APIRouter, HTTPException
+from typing import Optional
+from helpers.audio import preprocess_audio_base64
+from helpers.transcription import detect_and_transcribe_bhashini
+from helpers.utils import get_logger, encode_base64_file, Base64Encoder
+from fastapi import APIRouter, HTTPException, File, Form, Request, UploadFile
 from fastapi.responses import JSONResponse
 from app.models.requests import TranscribeRequest
 from app.models.responses import TranscribeResponse, ErrorResponse
+from app.config import settings
+from app.utils import get_cache, set_cache
 
 logger = get_logger(__name__)
 
 router = APIRouter(prefix="/transcribe", tags=["transcribe"])
 
-@router.post("/", response_model=TranscribeResponse)
-async def transcribe(request: TranscribeRequest):
-    """Handles language detection and transcription of audio using Bhashini service."""
-    
-    if not request.audio_content:
-        raise HTTPException(status_code=400, detail="audio_content is required")
-   
+
+async def _transcribe(audio_base64: str, session_id: Optional[str]) -> TranscribeResponse:
+    """Detect the language of base64 encoded audio and transcribe it.
+
+    Preprocessing decodes the whole clip into memory, so clips larger than
+    `audio_preprocessing_max_bytes` are sent to the ASR service as they are.
+    """
+    session_id = session_id or str(uuid.uuid4())
+    lang_key = f"{session_id}_asr_lang"
+
     try:
-        lang_code = detect_audio_language_bhashini(request.audio_content)
+        audio_bytes = len(audio_base64) * 3 // 4
+        if settings.audio_preprocessing and audio_bytes > settings.audio_preprocessing_max_bytes:
+            logger.info(f"Skipping audio preprocessing for a {audio_bytes} byte clip")
+        elif settings.audio_preprocessing:
+            # Mono at up to 16 kHz without surrounding silence; CPU bound, so off the event loop
+            audio_base64 = await asyncio.to_thread(preprocess_audio_base64, audio_base64)
+
+        # The language of the previous voice query in the session is the best guess
+        likely_lang = await get_cache(lang_key, 'mr')
+        transcription, lang_code = await detect_and_transcribe_bhashini(audio_base64, likely_lang)
         logger.info(f"Detected language code: {lang_code}")
-        
-        transcription = transcribe_bhashini(request.audio_content, lang_code)
         logger.info(f"Transcription: {transcription}")
-        
+
+        if lang_code != likely_lang:
+            await set_cache(lang_key, lang_code)
+
         return TranscribeResponse(
             status='success',
             text=transcription,
             lang_code=lang_code,
-            session_id=request.session_id or str(uuid.uuid4())
+            session_id=session_id
         )
     except Exception as e:
         logger.error(f"Transcription error: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Transcription failed: {str(e)}")
+
+
+@router.post("/", response_model=TranscribeResponse)
+async def transcribe(request: TranscribeRequest):
+    """Handles language detection and transcription of audio using Bhashini service."""
+
+    if not request.audio_content:
+        raise HTTPException(status_code=400, detail="audio_content is required")
+
+    return await _transcribe(request.audio_content, request.session_id)
+
+
+@router.post("/upload", response_model=TranscribeResponse)
+async def transcribe_upload(file: UploadFile = File(...), session_id: Optional[str] = Form(None)):
+    """Same as transcribe, for a WAV file sent as multipart/form-data."""
+    # Encoded chunk by chunk from the spooled upload; only clips small enough to
+    # preprocess are ever decoded in full
+    audio_base64 = await asyncio.to_thread(encode_base64_file, file.file)
+    if not audio_base64:
+        raise HTTPException(status_code=400, detail="file is empty")
+
+    return await _transcribe(audio_base64, session_id)
+
+
+@router.post("/binary", response_model=TranscribeResponse)
+async def transcribe_binary(request: Request, session_id: Optional[str] = None):
+    """Same as transcribe, for a raw WAV request body (Content-Type: audio/wav)."""
+    encoder = Base64Encoder()
+    async for chunk in request.stream():
+        encoder.update(chunk)
+    audio_base64 = encoder.getvalue()
+    if not audio_base64:
+        raise HTTPException(status_code=400, detail="request body is empty")
+
+    return await _transcribe(audio_base64, session_id)
@@ -1,8 +1,8 @@
-from helpers.tts import text_to_speech_bhashini
-from helpers.utils import get_logger
+from app.services.tts import synthesize_speech, split_sentences, stream_speech
+from helpers.utils import get_logger, iter_base64_decode
 import uuid
-import base64
 from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
 from app.models.requests import TTSRequest
 from app.models.responses import TTSResponse
 
@@ -18,11 +18,8 @@ async def tts(request: TTSRequest):
         raise HTTPException(status_code=400, detail="text is required")
     
     try:
-        audio_data = text_to_speech_bhashini(request.text, request.lang_code, gender='female', sampling_rate=8000)
-        
-        # Base64 encode the binary audio data for JSON serialization
-        if isinstance(audio_data, bytes):
-            audio_data = base64.b64encode(audio_data).decode('utf-8')
+        # Base64 encoded audio, served from the TTS cache when the text was spoken before
+        audio_data = await synthesize_speech(request.text, request.lang_code, gender='female', sampling_rate=8000)
         
         return TTSResponse(
             status='success',
@@ -32,3 +29,50 @@ async def tts(request: TTSRequest):
     except Exception as e:
         logger.error(f"TTS error: {str(e)}")
         raise HTTPException(status_code=500, detail=f"TTS failed: {str(e)}")
+
+@router.post("/audio")
+async def tts_audio(request: TTSRequest):
+    """Same as tts, but responds with the WAV audio itself instead of base64 in JSON."""
+
+    if not request.text:
+        raise HTTPException(status_code=400, detail="text is required")
+
+    try:
+        audio_data = await synthesize_speech(request.text, request.lang_code, gender='female', sampling_rate=8000)
+    except Exception as e:
+        logger.error(f"TTS error: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"TTS failed: {str(e)}")
+
+    # Decoded chunk by chunk while sending
+    return StreamingResponse(
+        iter_base64_decode(audio_data),
+        media_type='audio/wav',
+        headers={
+            'Content-Length': str(len(audio_data) // 4 * 3 - audio_data[-2:].count('=')),
+            'X-Session-ID': request.session_id or str(uuid.uuid4()),
+        }
+    )
+
+@router.post("/stream")
+async def tts_stream(request: TTSRequest):
+    """
+    Streams speech for the text sentence by sentence as Server-Sent Events.
+
+    Sentences are synthesized concurrently and sent in order as
+    `data: {"index", "text", "audio_content"}` events, followed by `event: done`,
+    so playback can start after the first sentence instead of the whole text.
+    """
+    if not request.text:
+        raise HTTPException(status_code=400, detail="text is required")
+
+    async def text_chunks():
+        yield request.text
+
+    return StreamingResponse(
+        stream_speech(split_sentences(text_chunks()), request.lang_code),
+        media_type='text/event-stream; charset=utf-8',
+        headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no'
+        }
+    )
@@ -1,21 +1,198 @@
 
-from typing import AsyncGenerator
-from agents.agrinet import agrinet_agent
+import asyncio
+import hashlib
+import re
+import time
+import unicodedata
+from typing import AsyncGenerator, List, Optional, Tuple
+from pydantic_ai.messages import ModelMessage, ModelMessagesTypeAdapter, ModelRequest, UserPromptPart
+from pydantic_core import to_jsonable_python
+from agents.agrinet import agrinet_agent, render_system_prompt
 from agents.moderation import moderation_agent
-from helpers.utils import get_logger
+from helpers.utils import get_logger, get_today_date_str
 from app.utils import (
-    update_message_history, 
+    _get_message_history,
+    append_message_history,
     trim_history, 
     format_message_pairs
 )
+from app.tasks.suggestions import refresh_suggestions
+from app.core.jobs import job_executor
+from app.core.cache import cache
+from app.core.streams import stream_buffer
+from app.config import settings
 from dotenv import load_dotenv
 from agents.deps import FarmerContext
+from agents.models import PROMPT_LAYOUT, cached_tokens, get_model_config
+from helpers.metrics import metrics
 from helpers.utils import get_logger
 
 load_dotenv()
 
 logger = get_logger(__name__)
 
+# Tools whose results depend on neither the farmer's location nor the date
+CACHEABLE_TOOLS = {"search_documents", "search_terms", "get_scheme_info"}
+REPLAY_CHUNK_CHARS = 80
+# A turn lock outlives a crashed worker by at most this long
+TURN_LOCK_TTL = 600
+TURN_POLL_SECONDS = 0.25
+
+
+def normalize_query(query: str) -> str:
+    """Case, whitespace and trailing punctuation insensitive form of a query."""
+    query = unicodedata.normalize("NFC", query).casefold()
+    query = re.sub(r"\s+", " ", query).strip()
+    return query.rstrip(" ?.!।")
+
+
+def _prompt_version() -> str:
+    """Changes with the agrinet system prompt (which may include the date) or model."""
+    config = get_model_config('agrinet')
+    source = f"{config.provider}:{config.model_name}\n{render_system_prompt()}"
+    return hashlib.sha256(source.encode("utf-8")).hexdigest()[:12]
+
+
+def query_hash(query: str) -> str:
+    return hashlib.sha256(normalize_query(query).encode("utf-8")).hexdigest()
+
+
+def answer_cache_key(query: str, target_lang: str) -> str:
+    return f"answer:{_prompt_version()}:{target_lang}:{query_hash(query)}"
+
+
+def turn_index(history: list) -> int:
+    """1-based index of the next turn: one more than the user prompts in the history."""
+    prompts = sum(
+        1 for message in history
+        if isinstance(message, ModelRequest) and any(isinstance(part, UserPromptPart) for part in message.parts)
+    )
+    return prompts + 1
+
+
+async def claim_turn(session_id: str, query: str, history: list) -> Tuple[int, bool]:
+    """
+    Take the session's turn lock for answering `query`, so that only one turn
+    of a session runs at a time.
+
+    Returns ``(turn, True)`` when this request should run the turn. A request
+    with the same ``(session, normalized query, turn index)`` as the turn that
+    holds the lock, or as the session's last completed turn while its stream
+    is still buffered (a retry that read the history before that turn was
+    saved), returns ``(turn, False)`` for that turn: the caller attaches to its
+    stream instead of running the agents again. The same message sent again
+    after the answer was saved is a new turn. A new
+    question waits up to `chat_turn_wait` seconds for the running turn to finish
+    and raises TimeoutError if it does not.
+    """
+    lock_key = f"chat:turn:{session_id}"
+    last_key = f"chat:last:{session_id}"
+    claim = {"query": query_hash(query)}
+    deadline = time.monotonic() + settings.chat_turn_wait
+    waited = False
+    while True:
+        claim["turn"] = turn_index(history)
+        try:
+            await cache.add(lock_key, claim, ttl=TURN_LOCK_TTL)
+            break
+        except ValueError:
+            pass
+        current = await cache.get(lock_key)
+        if current and current["query"] == claim["query"] and current["turn"] == claim["turn"]:
+            metrics.incr("chat.turn.duplicate")
+            return current["turn"], False
+        if time.monotonic() > deadline:
+            metrics.incr("chat.turn.timeout")
+            raise TimeoutError(f"Session {session_id} is still answering a previous question")
+        waited = True
+        await asyncio.sleep(TURN_POLL_SECONDS)
+        if not await cache.exists(lock_key):
+            # The previous turn is in the history now
+            history[:] = await _get_message_history(session_id)
+    if waited:
+        metrics.incr("chat.turn.waited")
+
+    last = await cache.get(last_key)
+    if (
+        last
+        and last["query"] == claim["query"]
+        and last["turn"] == claim["turn"]
+        and await stream_buffer.exists(session_id, last["turn"])
+    ):
+        await cache.delete(lock_key)
+        metrics.incr("chat.turn.duplicate")
+        return last["turn"], False
+    await cache.set(last_key, claim, ttl=TURN_LOCK_TTL + settings.stream_buffer_ttl)
+    return claim["turn"], True
+
+
+async def release_turn(session_id: str, turn: int, completed: bool = True) -> None:
+    """
+    Release the session's turn lock once the turn's history has been saved.
+    A turn that did not complete is forgotten, so that retrying it runs it again.
+    """
+    lock_key = f"chat:turn:{session_id}"
+    current = await cache.get(lock_key)
+    if current and current["turn"] == turn:
+        await cache.delete(lock_key)
+    if not completed:
+        last_key = f"chat:last:{session_id}"
+        last = await cache.get(last_key)
+        if last and last["turn"] == turn:
+            await cache.delete(last_key)
+
+
+def _tool_names(messages: List[ModelMessage]) -> List[str]:
+    return [
+        part.tool_name
+        for msg in messages
+        for part in getattr(msg, 'parts', [])
+        if part.part_kind == 'tool-call'
+    ]
+
+
+async def get_cached_answer(query: str, target_lang: str) -> Optional[dict]:
+    if not settings.answer_cache_enabled:
+        return None
+    entry = await cache.get(answer_cache_key(query, target_lang))
+    metrics.incr("chat.answer_cache.hit" if entry else "chat.answer_cache.miss")
+    return entry
+
+
+async def store_answer(query: str, target_lang: str, answer: str, new_messages: List[ModelMessage]) -> bool:
+    """
+    Cache a first-turn answer if it used tools and every one of them is location
+    and date independent. Answers written without any tool call come from the
+    model's general knowledge, possibly shaped by the date in the user message,
+    and are not cached.
+    """
+    tools = _tool_names(new_messages)
+    if not settings.answer_cache_enabled or not answer or not tools or not CACHEABLE_TOOLS.issuperset(tools):
+        return False
+    entry = {"answer": answer, "messages": to_jsonable_python(new_messages)}
+    await cache.set(answer_cache_key(query, target_lang), entry, ttl=settings.answer_cache_ttl)
+    metrics.incr("chat.answer_cache.stored")
+    return True
+
+
+def _add_usage(usage: dict, run_usage) -> None:
+    usage["input_tokens"] += run_usage.request_tokens or 0
+    usage["output_tokens"] += run_usage.response_tokens or 0
+    usage["cached_tokens"] += cached_tokens(run_usage)
+
+
+def _replay_chunks(answer: str) -> List[str]:
+    """Split a cached answer into stream-sized chunks at whitespace."""
+    chunks, current = [], ""
+    for word in re.findall(r"\S+\s*", answer):
+        current += word
+        if len(current) >= REPLAY_CHUNK_CHARS:
+            chunks.append(current)
+            current = ""
+    if current:
+        chunks.append(current)
+    return chunks
+
 async def stream_chat_messages(
     query: str,
     session_id: str,
@@ -23,14 +200,37 @@ async def stream_chat_messages(
     target_lang: str,
     user_id: str,
     history: list,
+    usage: Optional[dict] = None,
 ) -> AsyncGenerator[str, None]:
-    """Async generator for streaming chat messages."""
+    """Async generator for streaming chat messages.
+
+    If `usage` is given it is filled with the token usage of the turn.
+    """
+    usage = usage if usage is not None else {}
+    usage.update(input_tokens=0, output_tokens=0, cached_tokens=0, answer_cache=False)
+    started = time.monotonic()
     # Generate a unique content ID for this query
-    content_id = f"query_{session_id}_{len(history)//2 + 1}"
+    content_id = f"query_{session_id}_{turn_index(history)}"
+
+    # A first question that has been answered before is replayed without running either agent
+    first_turn = not history
+    if first_turn:
+        cached = await get_cached_answer(query, target_lang)
+        if cached:
+            logger.info(f"Answer cache hit for session {session_id}")
+            usage["answer_cache"] = True
+            for chunk in _replay_chunks(cached["answer"]):
+                yield chunk
+            await append_message_history(
+                session_id, ModelMessagesTypeAdapter.validate_python(cached["messages"]), expected_length=0
+            )
+            await refresh_suggestions(session_id, target_lang)
+            return
        
     deps = FarmerContext(
         query=query,
         lang_code=target_lang,
+        today_date=get_today_date_str() if PROMPT_LAYOUT == 'cached' else None,
     )
 
     message_pairs = "\n\n".join(format_message_pairs(history, 3))
@@ -45,9 +245,11 @@ async def stream_chat_messages(
     
     # Log Moderation Agent Usage
     mod_usage = moderation_run.usage()
+    _add_usage(usage, mod_usage)
     logger.info(
         f"\n[Moderation Agent Usage] Session: {session_id}\n"
         f"  Input Tokens: {mod_usage.request_tokens}\n"
+        f"  Cached Tokens: {cached_tokens(mod_usage)}\n"
         f"  Output Tokens: {mod_usage.response_tokens}\n"
         f"  Total Tokens: {mod_usage.total_tokens}"
     )
@@ -66,8 +268,16 @@ async def stream_chat_messages(
             ),
             deps=deps,
         ) as response_stream:  # response_stream is a StreamedRunResult
-            async for chunk in response_stream.stream_text(delta=True, debounce_by=0.1): 
+            first_chunk = True
+            answer = []
+            # Raw deltas; the SSE encoder coalesces them into frames
+            async for chunk in response_stream.stream_text(delta=True, debounce_by=None): 
                 if chunk:  # Ensure non-empty chunks are yielded
+                    answer.append(chunk)
+                    if first_chunk:
+                        # Background jobs back off while users wait long for answers
+                        job_executor.record_latency(time.monotonic() - started)
+                        first_chunk = False
                     yield chunk
             
             # After streaming is complete, get the run result for history
@@ -75,6 +285,7 @@ async def stream_chat_messages(
             
             # Log Agrinet Agent Usage
             main_usage = response_stream.usage()
+            _add_usage(usage, main_usage)
             
             # Helper to extract tool calls from new messages
             tool_calls = [
@@ -92,16 +303,18 @@ async def stream_chat_messages(
             logger.info(
                 f"\n[Vistaar Agent Usage] Session: {session_id}\n"
                 f"  Input Tokens: {main_usage.request_tokens}\n"
+                f"  Cached Tokens: {cached_tokens(main_usage)}\n"
                 f"  Output Tokens: {main_usage.response_tokens}\n"
                 f"  Total Tokens: {main_usage.total_tokens}\n"
                 f"  Tool Hits:\n    - {tool_hits_str}"
             )
 
-            messages = [
-                *history,
-                *new_messages
-            ]
-            await update_message_history(session_id, messages)
+            # Appended to the stored history, so a concurrent turn's messages are not lost
+            await append_message_history(session_id, new_messages, expected_length=len(history))
+            if first_turn and moderation_data.category == "valid_agricultural":
+                await store_answer(query, target_lang, "".join(answer), new_messages)
+            # Suggestions for the next turn, now that this answer is in the history
+            await refresh_suggestions(session_id, target_lang)
 
     except Exception as e:
         logger.error(f"Error during streaming for session {session_id}: {str(e)}")
@@ -114,10 +327,10 @@ async def stream_chat_messages(
              # Note: We can't easily reconstruction the 'partial' tool call that failed, 
              # so we just add the assistant's fallback response.
              messages = [
-                *history,
                 {"role": "user", "content": query}, # Ensure user query is recorded if not already
                 {"role": "model", "content": fallback_msg}
             ]
-             await update_message_history(session_id, messages)
+             await append_message_history(session_id, messages, expected_length=len(history))
+             await refresh_suggestions(session_id, target_lang)
         else:
             raise e
\ No newline at end of file
@@ -0,0 +1,261 @@
+"""
+Content-addressed cache for synthesized speech.
+
+The same advisories, suggestions and canned responses are spoken over and over,
+so TTS output is cached on ``sha256(NFC(text))`` together with the language,
+voice and sampling rate. Small clips are stored inline in the shared cache;
+larger ones are written to S3 (or to local disk when no bucket is configured)
+and the shared cache only holds a pointer to them.
+
+Pointers expire after ``tts_cache_ttl``; the clips they point to have to be
+removed separately:
+
+- S3: the bucket needs a lifecycle rule expiring objects under ``tts-cache/``
+  a day after ``tts_cache_ttl``. Its presence is checked on the first write
+  and a warning is logged without it (the bucket configuration is left alone).
+- Disk: files older than ``tts_cache_ttl`` are deleted, and the oldest ones
+  beyond ``tts_cache_dir_max_bytes``, at most once per ``DISK_EVICT_INTERVAL``.
+"""
+import asyncio
+import hashlib
+import json
+import os
+import re
+import time
+import unicodedata
+from typing import AsyncIterator, Optional
+from app.config import settings
+from app.core.cache import cache
+from helpers.bhashini import bhashini
+from helpers.metrics import metrics
+from helpers.utils import get_logger, get_s3_client, is_sentence_complete, split_text
+
+logger = get_logger(__name__)
+
+S3_PREFIX = "tts-cache"
+DISK_EVICT_INTERVAL = 300
+
+# Sentence terminators followed by whitespace; not after digits, so that list
+# numbering such as "1. " does not end a sentence
+SENTENCE_END = re.compile(r"(?<=[^\d\s][.!?।])\s+")
+
+
+def tts_cache_key(text: str, lang_code: str, gender: str, sampling_rate: int) -> str:
+    digest = hashlib.sha256(unicodedata.normalize("NFC", text).encode("utf-8")).hexdigest()
+    return f"tts:{digest}:{lang_code}:{gender}:{sampling_rate}"
+
+
+class TTSCache:
+    """Two-tier TTS cache: inline in Redis for small clips, S3 or disk for large ones."""
+
+    def __init__(self, bucket: Optional[str], cache_dir: str, inline_max_bytes: int, ttl: int, dir_max_bytes: int):
+        self.bucket = bucket
+        self.cache_dir = cache_dir
+        self.inline_max_bytes = inline_max_bytes
+        self.ttl = ttl
+        self.dir_max_bytes = dir_max_bytes
+        self._s3 = None
+        self._lifecycle_checked = False
+        self._last_eviction = 0.0
+
+    @property
+    def s3(self):
+        if self._s3 is None:
+            self._s3 = get_s3_client()
+        return self._s3
+
+    def _blob_name(self, key: str) -> str:
+        return key.replace(":", "_") + ".b64"
+
+    def _read_blob(self, location: dict) -> Optional[str]:
+        if "s3" in location:
+            obj = self.s3.get_object(Bucket=location["bucket"], Key=location["s3"])
+            return obj["Body"].read().decode("ascii")
+        path = location.get("file")
+        if path and os.path.exists(path):
+            with open(path, "r", encoding="ascii") as f:
+                return f.read()
+        return None
+
+    def _check_lifecycle(self) -> None:
+        """Warn once if no lifecycle rule expires the cached clips in the bucket."""
+        self._lifecycle_checked = True
+        try:
+            rules = self.s3.get_bucket_lifecycle_configuration(Bucket=self.bucket).get("Rules", [])
+        except Exception as e:
+            rules = []
+            logger.debug(f"Could not read the lifecycle configuration of {self.bucket}: {e}")
+        for rule in rules:
+            prefix = rule.get("Filter", {}).get("Prefix", rule.get("Prefix", ""))
+            if rule.get("Status") == "Enabled" and "Expiration" in rule and f"{S3_PREFIX}/".startswith(prefix):
+                return
+        days = self.ttl // 86400 + 1
+        logger.warning(
+            f"S3 bucket {self.bucket} has no lifecycle rule expiring '{S3_PREFIX}/'; cached TTS clips "
+            f"will accumulate. Add a rule with Filter.Prefix='{S3_PREFIX}/' and Expiration.Days={days}."
+        )
+
+    def _evict_disk(self) -> None:
+        """Delete clips older than the TTL, then the oldest ones beyond the size limit."""
+        self._last_eviction = time.monotonic()
+        now = time.time()
+        files = []
+        with os.scandir(self.cache_dir) as entries:
+            for entry in entries:
+                if not entry.is_file():
+                    continue
+                stat = entry.stat()
+                if now - stat.st_mtime > self.ttl:
+                    os.remove(entry.path)
+                else:
+                    files.append((stat.st_mtime, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if total <= self.dir_max_bytes:
+                break
+            os.remove(path)
+            total -= size
+
+    def _write_blob(self, key: str, audio_base64: str) -> dict:
+        name = self._blob_name(key)
+        if self.bucket:
+            if not self._lifecycle_checked:
+                self._check_lifecycle()
+            s3_key = f"{S3_PREFIX}/{name}"
+            self.s3.put_object(Bucket=self.bucket, Key=s3_key, Body=audio_base64.encode("ascii"))
+            return {"bucket": self.bucket, "s3": s3_key}
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = os.path.join(self.cache_dir, name)
+        # Write to a temporary file first so readers never see a partial clip
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="ascii") as f:
+            f.write(audio_base64)
+        os.replace(tmp_path, path)
+        if time.monotonic() - self._last_eviction > DISK_EVICT_INTERVAL:
+            try:
+                self._evict_disk()
+            except OSError as e:
+                logger.warning(f"TTS disk cache eviction failed: {e}")
+        return {"file": path}
+
+    async def get(self, key: str) -> Optional[str]:
+        """Return the cached base64 audio for a key, if any."""
+        try:
+            entry = await cache.get(key)
+            if not entry:
+                return None
+            if "audio" in entry:
+                return entry["audio"]
+            return await asyncio.to_thread(self._read_blob, entry)
+        except Exception as e:
+            logger.warning(f"TTS cache lookup failed for {key}: {e}")
+        return None
+
+    async def set(self, key: str, audio_base64: str) -> None:
+        try:
+            if len(audio_base64) <= self.inline_max_bytes:
+                entry = {"audio": audio_base64}
+            else:
+                entry = await asyncio.to_thread(self._write_blob, key, audio_base64)
+            await cache.set(key, entry, ttl=self.ttl)
+        except Exception as e:
+            logger.warning(f"TTS cache store failed for {key}: {e}")
+
+
+tts_cache = TTSCache(
+    bucket=settings.aws_s3_bucket,
+    cache_dir=settings.tts_cache_dir,
+    inline_max_bytes=settings.tts_cache_inline_max_bytes,
+    ttl=settings.tts_cache_ttl,
+    dir_max_bytes=settings.tts_cache_dir_max_bytes,
+)
+
+
+async def synthesize_speech(text: str, lang_code: str = 'mr', gender: str = 'female', sampling_rate: int = 8000) -> str:
+    """Synthesize speech with Bhashini, serving repeated requests from the TTS cache.
+
+    Returns:
+        str: Base64 encoded audio.
+    """
+    key = tts_cache_key(text, lang_code, gender, sampling_rate)
+    audio_base64 = await tts_cache.get(key)
+    if audio_base64 is not None:
+        metrics.incr("tts.cache.hit")
+        return audio_base64
+
+    metrics.incr("tts.cache.miss")
+    audio_base64 = await bhashini.text_to_speech(text, lang_code, gender=gender, sampling_rate=sampling_rate)
+    await tts_cache.set(key, audio_base64)
+    return audio_base64
+
+
+
+async def split_sentences(chunks: AsyncIterator[str]) -> AsyncIterator[str]:
+    """Split incrementally arriving text into sentences as soon as they are complete."""
+    buffer = ""
+    async for chunk in chunks:
+        buffer += chunk
+        lines = split_text(buffer)
+        # The last line is still incomplete unless the buffer ends with a newline
+        buffer = "" if is_sentence_complete(buffer) else lines[-1][:-1]
+        for line in lines[:-1]:
+            for sentence in SENTENCE_END.split(line):
+                if sentence.strip():
+                    yield sentence.strip()
+        *sentences, buffer = SENTENCE_END.split(buffer)
+        for sentence in sentences:
+            if sentence.strip():
+                yield sentence.strip()
+    if buffer.strip():
+        yield buffer.strip()
+
+
+async def stream_speech(
+    sentences: AsyncIterator[str],
+    lang_code: str = 'mr',
+    gender: str = 'female',
+    sampling_rate: int = 8000,
+    concurrency: int = settings.tts_stream_concurrency,
+) -> AsyncIterator[str]:
+    """Synthesize sentences concurrently and yield them in order as Server-Sent Events.
+
+    At most ``concurrency`` sentences are synthesized at a time, and reading
+    ahead stops once that many are waiting to be sent.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    pending: asyncio.Queue = asyncio.Queue(maxsize=concurrency)
+
+    async def synthesize(text: str) -> str:
+        async with semaphore:
+            return await synthesize_speech(text, lang_code, gender=gender, sampling_rate=sampling_rate)
+
+    async def produce():
+        try:
+            async for sentence in sentences:
+                await pending.put((sentence, asyncio.create_task(synthesize(sentence))))
+        except Exception:
+            # Let the consumer finish what was queued, then raise from `await producer`
+            await pending.put(None)
+            raise
+        await pending.put(None)
+
+    producer = asyncio.create_task(produce())
+    index = 0
+    try:
+        while (item := await pending.get()) is not None:
+            text, task = item
+            try:
+                event = {"index": index, "text": text, "audio_content": await task}
+            except Exception as e:
+                logger.error(f"TTS failed for segment {index}: {e}")
+                event = {"index": index, "text": text, "error": str(e)}
+            yield f"data: {json.dumps(event, ensure_ascii=False)}\n\n"
+            index += 1
+        await producer
+        yield f"event: done\ndata: {json.dumps({'segments': index})}\n\n"
+    finally:
+        producer.cancel()
+        while not pending.empty():
+            item = pending.get_nowait()
+            if item is not None:
+                item[1].cancel()
@@ -24,8 +24,11 @@ async def verify_llm():
         # We handle the import here to avoid circular dependencies if any, 
         # though agents.models is likely already imported by routers.
         # This also acts as a check if the module loaded correctly.
-        from agents.models import LLM_PROVIDER, LLM_MODEL_NAME
+        from agents.models import LLM_PROVIDER, LLM_MODEL_NAME, get_model_config
         logger.info(f"LLM: Configured with Provider='{LLM_PROVIDER}', Model='{LLM_MODEL_NAME}'")
+        for agent in ('agrinet', 'moderation', 'suggestions'):
+            config = get_model_config(agent)
+            logger.info(f"LLM: {agent} agent uses Provider='{config.provider}', Model='{config.model_name}'")
     except ImportError as e:
         logger.error(f"LLM: Failed to import configuration. Error: {e}")
     except Exception as e:
@@ -104,24 +107,11 @@ async def verify_nominatim():
         # Use a well known location: Gateway of India, Mumbai (approx)
         test_lat, test_lon = 18.9220, 72.8347
         
-        # Run synchronous call in executor
-        def _test_nominatim():
-            # Using the direct geocoder instance to test connectivity
-            # reverse_geocode wrapper handles logging, we want raw check or use wrapper but catch output
-            try:
-                # We specify a timeout for the check
-                start_val = geocoder.reverse((test_lat, test_lon), exactly_one=True, timeout=5)
-                return start_val
-            except Exception as e:
-                # Log the actual exception for debugging
-                logger.debug(f"Nominatim check internal error: {e}")
-                raise e
-
-        loop = asyncio.get_event_loop()
-        location = await loop.run_in_executor(None, _test_nominatim)
+        # Bypass the cache so that the service itself is queried
+        location = await asyncio.wait_for(geocoder.reverse(test_lat, test_lon, cached=False), timeout=5)
         
         if location:
-            logger.info(f"Nominatim: Service operational. Test location resolved to: {location.address.split(',')[0]}")
+            logger.info(f"Nominatim: Service operational. Test location resolved to: {location.place_name.split(',')[0]}")
         else:
             logger.warning("Nominatim: Connected but returned no result for test coordinates.")
             
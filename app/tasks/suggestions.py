@@ -1,36 +1,47 @@
+import asyncio
+from typing import Dict, List, Optional, Tuple
+from app.config import settings
 from app.core.cache import cache
+from app.core.jobs import job, job_executor, PRIORITY_LOW, PRIORITY_NORMAL
+from app.utils import get_cache
+from helpers.metrics import metrics
 from helpers.utils import get_logger
 from app.utils import _get_message_history, trim_history, format_message_pairs
-from agents.suggestions import suggestions_agent
+from agents.models import cached_tokens
+from agents.suggestions import suggestions_agent, batch_suggestions_agent
 from langcodes import Language
 
 logger = get_logger(__name__)
 
 
 SUGGESTIONS_CACHE_TTL = 60*30 # 30 minutes
+SUGGESTIONS_LOCK_TTL = 60 # upper bound for one generation
+SUGGESTIONS_POLL_INTERVAL = 0.25
+# Delay before a refresh that found a generation in progress is queued again
+SUGGESTIONS_RETRY_DELAY = 1.0
 
-async def create_suggestions(session_id: str, target_lang: str = 'mr'):
-    """
-    Create and save suggestions for a session
-    """
-    logger.info(f"Getting suggestions for session {session_id}")
+# Generations running in this process, by (session_id, target_lang)
+_in_flight: Dict[Tuple[str, str], asyncio.Future] = {}
 
-    target_lang_name = Language.get(target_lang).display_name(target_lang)
 
+def suggestions_key(session_id: str, target_lang: str) -> str:
+    return f"suggestions_{session_id}_{target_lang}"
+
+async def _conversation_excerpt(session_id: str) -> str:
     history   = trim_history(await _get_message_history(session_id),
                              30_000,
                              include_tool_calls=False,
                              include_system_prompts=False
                              )
-    message_pairs = "\n\n".join(format_message_pairs(history, 5))
+    return "\n\n".join(format_message_pairs(history, 5))
 
-    message       = f"**Conversation**\n\n{message_pairs}\n\n**Based on the conversation, suggest 3-5 questions the farmer can ask in {target_lang_name}.**"
-    agent_run    = await suggestions_agent.run(message)
-    suggestions = [x for x in agent_run.output]
-    
-    # Log Suggestions Agent Usage
+
+def _log_usage(label: str, agent_run) -> None:
+    """Log token usage and tool hits of a suggestions agent run."""
     sugg_usage = agent_run.usage()
-    
+    metrics.incr("suggestions.requests")
+    metrics.incr("suggestions.tokens", sugg_usage.total_tokens or 0)
+
     # Extract tool usage if any
     new_messages = agent_run.new_messages()
     tool_calls = [
@@ -46,19 +57,182 @@ async def create_suggestions(session_id: str, target_lang: str = 'mr'):
     tool_hits_str = "\n    - ".join(tool_usage_details) if tool_usage_details else "None"
     
     logger.info(
-        f"\n[Suggestions Agent Usage] Session: {session_id}\n"
+        f"\n[Suggestions Agent Usage] {label}\n"
         f"  Input Tokens: {sugg_usage.request_tokens}\n"
+        f"  Cached Tokens: {cached_tokens(sugg_usage)}\n"
         f"  Output Tokens: {sugg_usage.response_tokens}\n"
         f"  Total Tokens: {sugg_usage.total_tokens}\n"
         f"  Tool Hits:\n    - {tool_hits_str}"
     )
 
+
+async def create_suggestions(session_id: str, target_lang: str = 'mr'):
+    """
+    Create and save suggestions for a session
+    """
+    logger.info(f"Getting suggestions for session {session_id}")
+
+    target_lang_name = Language.get(target_lang).display_name(target_lang)
+    message_pairs = await _conversation_excerpt(session_id)
+
+    message       = f"**Conversation**\n\n{message_pairs}\n\n**Based on the conversation, suggest 3-5 questions the farmer can ask in {target_lang_name}.**"
+    agent_run    = await suggestions_agent.run(message)
+    suggestions = [x for x in agent_run.output]
+    
+    # Log Suggestions Agent Usage
+    _log_usage(f"Session: {session_id}", agent_run)
+    metrics.incr("suggestions.sessions")
+
     logger.info(f"Suggestions: {suggestions}")
     # Store suggestions in cache
-    await cache.set(f"suggestions_{session_id}_{target_lang}", suggestions, ttl=SUGGESTIONS_CACHE_TTL)
+    await cache.set(suggestions_key(session_id, target_lang), suggestions, ttl=SUGGESTIONS_CACHE_TTL)
     logger.info(f"Suggestions created and saved for session {session_id}")
     
     return {
         "status": "success",
         "message": f"Suggestions created and saved for session {session_id}"
-    }
\ No newline at end of file
+    }
+
+
+async def create_suggestions_batch(sessions: List[Tuple[str, str]]):
+    """
+    Create and save suggestions for several (session_id, target_lang) pairs
+    with a single request. Sessions missing from the response get a request
+    of their own.
+    """
+    if len(sessions) == 1:
+        return await create_suggestions(*sessions[0])
+
+    logger.info(f"Getting suggestions for {len(sessions)} sessions in one batch")
+    excerpts = await asyncio.gather(*(_conversation_excerpt(session_id) for session_id, _ in sessions))
+
+    # Conversations are numbered rather than keyed by session id, which the model could garble
+    sections = []
+    for number, ((_, target_lang), message_pairs) in enumerate(zip(sessions, excerpts), start=1):
+        target_lang_name = Language.get(target_lang).display_name(target_lang)
+        sections.append(f"**Conversation {number}** (language: {target_lang_name})\n\n{message_pairs}")
+    message = (
+        "\n\n---\n\n".join(sections)
+        + f"\n\n**For each of the {len(sessions)} conversations, suggest 3-5 questions the farmer can ask in the language given for it.**"
+    )
+
+    agent_run = await batch_suggestions_agent.run(message)
+    _log_usage(f"Batch of {len(sessions)} sessions: {', '.join(s for s, _ in sessions)}", agent_run)
+
+    missing = []
+    by_number = {entry.conversation: entry.suggestions for entry in agent_run.output if entry.suggestions}
+    for number, (session_id, target_lang) in enumerate(sessions, start=1):
+        suggestions = by_number.get(number)
+        if suggestions is None:
+            missing.append((session_id, target_lang))
+            continue
+        metrics.incr("suggestions.sessions")
+        await cache.set(suggestions_key(session_id, target_lang), suggestions, ttl=SUGGESTIONS_CACHE_TTL)
+
+    if missing:
+        logger.warning(f"Batch response had no suggestions for {len(missing)} sessions, generating them one by one")
+        metrics.incr("suggestions.batch_misses", len(missing))
+        await asyncio.gather(*(create_suggestions(session_id, target_lang) for session_id, target_lang in missing))
+
+    logger.info(f"Suggestions created and saved for {len(sessions)} sessions")
+
+
+async def _acquire_lock(session_id: str, target_lang: str) -> bool:
+    """Take the per-session lock shared by all workers, unless another worker is generating."""
+    try:
+        await cache.add(f"{suggestions_key(session_id, target_lang)}_lock", 1, ttl=SUGGESTIONS_LOCK_TTL)
+        return True
+    except ValueError:
+        return False
+
+
+def _retry_later(session_id: str, target_lang: str) -> None:
+    """Schedule a refresh again after a delay, rather than waiting for the lock in a job slot."""
+    logger.info(f"Suggestions for session {session_id} are being generated, refreshing again in {SUGGESTIONS_RETRY_DELAY}s")
+    metrics.incr("suggestions.deferred")
+    asyncio.get_running_loop().call_later(SUGGESTIONS_RETRY_DELAY, schedule_suggestions, session_id, target_lang, True)
+
+
+@job("suggestions", batch_size=settings.suggestions_batch_size, batch_window=settings.suggestions_batch_window)
+async def _generate_suggestions(jobs: List[Tuple[str, str, bool]]) -> List[None]:
+    """
+    Run create_suggestions_batch for the sessions whose lock could be taken.
+    A refresh (after a new answer) whose session is locked is retried later so
+    that it sees that answer; other jobs leave the session to the running generation.
+    """
+    acquired = await asyncio.gather(*(_acquire_lock(session_id, target_lang) for session_id, target_lang, _ in jobs))
+    sessions = []
+    for (session_id, target_lang, refresh), ok in zip(jobs, acquired):
+        if ok:
+            sessions.append((session_id, target_lang))
+        elif refresh:
+            _retry_later(session_id, target_lang)
+        else:
+            logger.info(f"Suggestions for session {session_id} are already being generated")
+    if sessions:
+        try:
+            await create_suggestions_batch(sessions)
+        except Exception as e:
+            logger.error(f"Error creating suggestions for sessions {sessions}: {str(e)}")
+        finally:
+            await asyncio.gather(*(
+                cache.delete(f"{suggestions_key(session_id, target_lang)}_lock")
+                for session_id, target_lang in sessions
+            ))
+    return [None] * len(jobs)
+
+
+def schedule_suggestions(session_id: str, target_lang: str = 'mr', refresh: bool = False) -> asyncio.Future:
+    """
+    Queue a suggestions generation for a session unless one is already pending.
+
+    A refresh after a chat answer is low priority and is shed while chat is
+    slow; while another generation is running it is queued again after a
+    delay, so that it sees the new answer. A generation requested by /suggest
+    runs at normal priority.
+    """
+    key = (session_id, target_lang)
+    future = _in_flight.get(key)
+    if future is not None and not future.done() and not refresh:
+        return future
+
+    future = job_executor.submit(
+        "suggestions",
+        session_id,
+        target_lang,
+        refresh,
+        priority=PRIORITY_LOW if refresh else PRIORITY_NORMAL,
+        key=suggestions_key(session_id, target_lang),
+        sheddable=refresh,
+    )
+    _in_flight[key] = future
+
+    def _done(f: asyncio.Future):
+        if _in_flight.get(key) is f:
+            del _in_flight[key]
+    future.add_done_callback(_done)
+    return future
+
+
+async def refresh_suggestions(session_id: str, target_lang: str = 'mr'):
+    """Drop the previous turn's suggestions and generate new ones in the background."""
+    await cache.delete(suggestions_key(session_id, target_lang))
+    schedule_suggestions(session_id, target_lang, refresh=True)
+
+
+async def wait_for_suggestions(session_id: str, target_lang: str, timeout: float) -> Optional[List[str]]:
+    """Wait up to `timeout` seconds for suggestions that are being generated."""
+    key = suggestions_key(session_id, target_lang)
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while True:
+        suggestions = await get_cache(key)
+        remaining = deadline - loop.time()
+        if suggestions or remaining <= 0:
+            return suggestions
+        future = _in_flight.get((session_id, target_lang))
+        if future is not None and not future.done():
+            await asyncio.wait([future], timeout=remaining)
+        else:
+            # Possibly being generated by another worker or the job worker process
+            await asyncio.sleep(min(SUGGESTIONS_POLL_INTERVAL, remaining))
@@ -1,5 +1,6 @@
-from typing import List
+from typing import List, Optional
 from app.core.cache import cache
+from helpers.metrics import metrics
 from helpers.utils import get_logger, count_tokens_for_part
 from copy import deepcopy
 from pydantic_ai.messages import (
@@ -63,6 +64,32 @@ async def update_message_history(session_id: str, all_messages: List[ModelMessag
     """Update message history."""
     await cache.set(f"{session_id}_{HISTORY_SUFFIX}", to_jsonable_python(all_messages), ttl=DEFAULT_CACHE_TTL)
 
+async def append_message_history(session_id: str, new_messages: list, expected_length: Optional[int] = None) -> int:
+    """
+    Atomically append a turn's messages to the stored history.
+
+    `expected_length` is the length of the history the turn was generated
+    from. If other messages were saved in the meantime they are kept, the new
+    ones go after them, and the conflict is counted as `chat.history.conflict`.
+    Returns by how many messages the stored history differed from
+    `expected_length` (negative if it had expired), 0 if it matched.
+    """
+    new_messages = to_jsonable_python(new_messages)
+    history = await cache.update(
+        f"{session_id}_{HISTORY_SUFFIX}",
+        lambda current: (current or []) + new_messages,
+        ttl=DEFAULT_CACHE_TTL,
+    )
+    previous_length = len(history) - len(new_messages)
+    if expected_length is None or previous_length == expected_length:
+        return 0
+    metrics.incr("chat.history.conflict")
+    logger.warning(
+        f"History of session {session_id} changed during the turn "
+        f"({expected_length} -> {previous_length} messages), appending after the newer messages"
+    )
+    return previous_length - expected_length
+
 def update_moderation_history(session_id: str, moderation_messages: List[ModelMessage]):
     """Update moderation history."""
     cache.set(f"{session_id}_{HISTORY_SUFFIX}_MODERATION", to_jsonable_python(moderation_messages), timeout=DEFAULT_CACHE_TTL)
@@ -0,0 +1,26 @@
+"""
+Background job worker for JOB_QUEUE_BACKEND=redis.
+
+Runs jobs that the API workers hand off through Redis, so that LLM side-jobs
+such as suggestions do not compete with chat streams for the API processes.
+
+    python -m app.worker
+"""
+import asyncio
+import app.tasks.suggestions  # noqa: F401  registers the suggestions job
+from app.core.jobs import job_executor
+from helpers.utils import get_logger
+
+logger = get_logger(__name__)
+
+
+async def main():
+    try:
+        await job_executor.run_redis_worker()
+    finally:
+        await job_executor.close()
+
+
+if __name__ == "__main__":
+    logger.info("Starting background job worker...")
+    asyncio.run(main())
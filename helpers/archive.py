@@ -0,0 +1,127 @@
+"""
+Background archiving of audio to S3.
+
+Requests only enqueue audio and return; a small pool of worker threads drains
+a bounded queue and uploads with the process-wide S3 client, switching to
+multipart uploads for large files. When the queue is full new audio is dropped
+rather than slowing requests down, and counted as ``archive.dropped``.
+
+The S3 endpoint can be pointed at MinIO with ``AWS_ENDPOINT_URL``, or the
+archiver can be given a client created under moto.
+"""
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from io import BytesIO
+from typing import Callable, Optional
+from boto3.s3.transfer import TransferConfig
+from helpers.metrics import metrics
+from helpers.utils import get_logger, get_s3_client
+
+logger = get_logger(__name__)
+
+ARCHIVE_QUEUE_SIZE = int(os.getenv("AUDIO_ARCHIVE_QUEUE_SIZE", "256"))
+ARCHIVE_WORKERS = int(os.getenv("AUDIO_ARCHIVE_WORKERS", "4"))
+MULTIPART_THRESHOLD = 8 * 1024 * 1024
+
+
+@dataclass
+class ArchiveJob:
+    bucket: str
+    key: str
+    body: bytes
+    content_type: str
+    enqueued_at: float
+
+
+class AudioArchiver:
+    """Bounded queue of uploads drained by a thread pool."""
+
+    def __init__(
+        self,
+        client_factory: Callable = get_s3_client,
+        queue_size: int = ARCHIVE_QUEUE_SIZE,
+        workers: int = ARCHIVE_WORKERS,
+        multipart_threshold: int = MULTIPART_THRESHOLD,
+    ):
+        self.client_factory = client_factory
+        self.workers = workers
+        self._queue: "queue.Queue[Optional[ArchiveJob]]" = queue.Queue(maxsize=queue_size)
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+        # Parts are uploaded one after another; parallelism comes from the worker pool
+        self._transfer_config = TransferConfig(
+            multipart_threshold=multipart_threshold,
+            multipart_chunksize=multipart_threshold,
+            use_threads=False,
+        )
+
+    def start(self) -> None:
+        with self._lock:
+            if self._executor is not None:
+                return
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="audio-archive")
+            for _ in range(self.workers):
+                self._executor.submit(self._work)
+
+    def submit(self, bucket: str, key: str, body: bytes, content_type: str = 'audio/wav') -> bool:
+        """Queue an upload without blocking. Returns False if the queue is full."""
+        self.start()
+        job = ArchiveJob(bucket, key, body, content_type, time.monotonic())
+        try:
+            self._queue.put_nowait(job)
+        except queue.Full:
+            metrics.incr("archive.dropped")
+            logger.warning(f"Audio archive queue full, dropping {key}")
+            return False
+        metrics.incr("archive.enqueued")
+        metrics.gauge("archive.queue_depth", self._queue.qsize())
+        return True
+
+    def _upload(self, job: ArchiveJob) -> None:
+        metrics.observe("archive.queue_wait", time.monotonic() - job.enqueued_at)
+        try:
+            with metrics.timer("archive.upload"):
+                self.client_factory().upload_fileobj(
+                    BytesIO(job.body),
+                    job.bucket,
+                    job.key,
+                    ExtraArgs={"ContentType": job.content_type},
+                    Config=self._transfer_config,
+                )
+        except Exception as e:
+            logger.error(f"Error archiving audio to s3://{job.bucket}/{job.key}: {e}")
+            return
+        metrics.incr("archive.uploaded")
+        metrics.incr("archive.bytes", len(job.body))
+
+    def _work(self) -> None:
+        while True:
+            job = self._queue.get()
+            try:
+                if job is None:
+                    return
+                self._upload(job)
+            finally:
+                self._queue.task_done()
+                metrics.gauge("archive.queue_depth", self._queue.qsize())
+
+    def join(self) -> None:
+        """Block until every queued upload has been attempted."""
+        self._queue.join()
+
+    def shutdown(self) -> None:
+        """Upload what is queued, then stop the workers."""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is None:
+            return
+        for _ in range(self.workers):
+            self._queue.put(None)
+        executor.shutdown(wait=True)
+
+
+audio_archiver = AudioArchiver()
@@ -0,0 +1,140 @@
+"""
+Audio preprocessing before speech recognition.
+
+Voice notes arrive at whatever rate and channel count the phone recorded, often
+with long silences around the speech. Before upload they are decoded, downmixed
+to mono, downsampled to the 16 kHz that Bhashini ASR is run at and trimmed to
+the voiced part with a simple energy-based VAD. This shrinks the upstream
+payload and the audio the ASR model has to process. Audio recorded below 16 kHz
+keeps its rate, since upsampling only makes it larger; the ASR request declares
+the rate of the audio it sends.
+"""
+import base64
+import time
+import wave
+from io import BytesIO
+from typing import Tuple
+import numpy as np
+from helpers.metrics import metrics
+from helpers.utils import get_logger
+
+logger = get_logger(__name__)
+
+TARGET_SAMPLE_RATE = 16000
+
+# Energy-based VAD: 30 ms frames are voiced when their RMS is above both an
+# absolute floor and a level relative to the loudest frame
+VAD_FRAME_MS = 30
+VAD_ABSOLUTE_DB = -50.0
+VAD_RELATIVE_DB = -35.0
+VAD_PADDING_MS = 250
+
+# Taps of the windowed-sinc low-pass filter applied before downsampling
+RESAMPLE_TAPS = 63
+
+
+def decode_wav(data: bytes) -> Tuple[np.ndarray, int]:
+    """Decode PCM WAV bytes to float32 samples in [-1, 1] of shape (frames, channels)."""
+    with wave.open(BytesIO(data), "rb") as src:
+        channels, width, rate = src.getnchannels(), src.getsampwidth(), src.getframerate()
+        raw = src.readframes(src.getnframes())
+
+    if width == 1:
+        samples = (np.frombuffer(raw, dtype=np.uint8).astype(np.float32) - 128) / 128
+    elif width == 2:
+        samples = np.frombuffer(raw, dtype="<i2").astype(np.float32) / 32768
+    elif width == 3:
+        # Sign-extend 24-bit samples into int32
+        b = np.frombuffer(raw, dtype=np.uint8).reshape(-1, 3).astype(np.int32)
+        ints = (b[:, 0] | (b[:, 1] << 8) | (b[:, 2] << 16)) << 8 >> 8
+        samples = ints.astype(np.float32) / 8388608
+    elif width == 4:
+        samples = np.frombuffer(raw, dtype="<i4").astype(np.float32) / 2147483648
+    else:
+        raise wave.Error(f"unsupported sample width: {width}")
+    return samples.reshape(-1, channels), rate
+
+
+def encode_wav(samples: np.ndarray, rate: int) -> bytes:
+    """Encode mono float samples as 16-bit PCM WAV."""
+    pcm = (np.clip(samples, -1.0, 1.0) * 32767).astype("<i2")
+    out = BytesIO()
+    with wave.open(out, "wb") as dst:
+        dst.setnchannels(1)
+        dst.setsampwidth(2)
+        dst.setframerate(rate)
+        dst.writeframes(pcm.tobytes())
+    return out.getvalue()
+
+
+def to_mono(samples: np.ndarray) -> np.ndarray:
+    return samples.mean(axis=1) if samples.shape[1] > 1 else samples[:, 0]
+
+
+def lowpass(samples: np.ndarray, cutoff: float, taps: int = RESAMPLE_TAPS) -> np.ndarray:
+    """Windowed-sinc low-pass filter; `cutoff` is a fraction of the sample rate."""
+    n = np.arange(taps) - (taps - 1) / 2
+    kernel = np.sinc(2 * cutoff * n) * np.hamming(taps)
+    kernel /= kernel.sum()
+    return np.convolve(samples, kernel.astype(np.float32), mode="same")
+
+
+def resample(samples: np.ndarray, rate: int, target_rate: int = TARGET_SAMPLE_RATE) -> np.ndarray:
+    """Resample mono audio, filtering out frequencies above the new Nyquist rate first."""
+    if rate == target_rate or len(samples) == 0:
+        return samples
+    if rate > target_rate:
+        samples = lowpass(samples, 0.5 * target_rate / rate)
+        if rate % target_rate == 0:
+            return samples[::rate // target_rate]
+    n_out = int(round(len(samples) * target_rate / rate))
+    positions = np.arange(n_out) * (rate / target_rate)
+    return np.interp(positions, np.arange(len(samples)), samples).astype(np.float32)
+
+
+def trim_silence(samples: np.ndarray, rate: int) -> np.ndarray:
+    """Cut leading and trailing silence, keeping some padding around the voiced part."""
+    frame = int(rate * VAD_FRAME_MS / 1000)
+    n_frames = len(samples) // frame
+    if n_frames == 0:
+        return samples
+
+    frames = samples[:n_frames * frame].reshape(n_frames, frame)
+    rms_db = 10 * np.log10(np.mean(frames ** 2, axis=1) + 1e-12)
+    threshold = max(VAD_ABSOLUTE_DB, rms_db.max() + VAD_RELATIVE_DB)
+    voiced = np.flatnonzero(rms_db > threshold)
+    if len(voiced) == 0:
+        # Nothing above the floor, let the ASR service decide
+        return samples
+
+    padding = int(rate * VAD_PADDING_MS / 1000)
+    start = max(0, voiced[0] * frame - padding)
+    end = min(len(samples), (voiced[-1] + 1) * frame + padding)
+    return samples[start:end]
+
+
+def preprocess_audio(data: bytes) -> bytes:
+    """Convert WAV audio to trimmed mono 16-bit WAV at 16 kHz, or lower if recorded lower.
+
+    Audio that cannot be decoded as PCM WAV is returned unchanged.
+    """
+    start = time.perf_counter()
+    try:
+        samples, rate = decode_wav(data)
+    except (wave.Error, EOFError, ValueError) as e:
+        logger.warning(f"Skipping audio preprocessing, not a PCM WAV: {e}")
+        return data
+
+    target_rate = min(rate, TARGET_SAMPLE_RATE)
+    samples = trim_silence(resample(to_mono(samples), rate, target_rate), target_rate)
+    output = encode_wav(samples, target_rate)
+
+    metrics.observe("audio.preprocess", time.perf_counter() - start)
+    metrics.incr("audio.preprocess.bytes_in", len(data))
+    metrics.incr("audio.preprocess.bytes_out", len(output))
+    return output
+
+
+def preprocess_audio_base64(audio_base64: str) -> str:
+    """Same as preprocess_audio, for base64 encoded audio."""
+    return base64.b64encode(preprocess_audio(base64.b64decode(audio_base64))).decode('ascii')
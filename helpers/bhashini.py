@@ -0,0 +1,212 @@
+"""
+Async client for the Bhashini (Dhruva) inference pipeline API.
+
+A single pooled ``httpx.AsyncClient`` is shared by transcription, language
+detection and TTS so that connections to Bhashini are reused across requests.
+Transient failures (timeouts, connection errors, 429 and 5xx responses) are
+retried with exponential backoff and full jitter. Latency of every attempt is
+recorded per pipeline task as ``bhashini.<task>``.
+"""
+import asyncio
+import os
+import random
+import time
+from typing import List, Optional, Tuple
+import httpx
+from dotenv import load_dotenv
+from helpers.metrics import metrics
+from helpers.utils import get_logger
+
+load_dotenv()
+
+logger = get_logger(__name__)
+
+BHASHINI_PIPELINE_URL = os.getenv(
+    "BHASHINI_PIPELINE_URL",
+    "https://dhruva-api.bhashini.gov.in/services/inference/pipeline",
+)
+
+# Connecting should be quick; inference on long audio can take a while
+BHASHINI_TIMEOUT = httpx.Timeout(
+    connect=float(os.getenv("BHASHINI_CONNECT_TIMEOUT", "5")),
+    read=float(os.getenv("BHASHINI_READ_TIMEOUT", "30")),
+    write=float(os.getenv("BHASHINI_WRITE_TIMEOUT", "30")),
+    pool=float(os.getenv("BHASHINI_POOL_TIMEOUT", "5")),
+)
+BHASHINI_MAX_ATTEMPTS = int(os.getenv("BHASHINI_MAX_ATTEMPTS", "3"))
+BHASHINI_BACKOFF = 0.25  # seconds, doubled on every retry
+BHASHINI_MAX_CONNECTIONS = int(os.getenv("BHASHINI_MAX_CONNECTIONS", "50"))
+
+# "pipeline" sends language detection and ASR as one multi-task request,
+# "speculative" detects on a short prefix while transcribing speculatively
+BHASHINI_ASR_MODE = os.getenv("BHASHINI_ASR_MODE", "speculative")
+
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+class BhashiniClient:
+    """Shared async client for Bhashini pipeline tasks."""
+
+    def __init__(
+        self,
+        url: str,
+        api_key: Optional[str],
+        timeout: httpx.Timeout = BHASHINI_TIMEOUT,
+        max_attempts: int = BHASHINI_MAX_ATTEMPTS,
+        backoff: float = BHASHINI_BACKOFF,
+        max_connections: int = BHASHINI_MAX_CONNECTIONS,
+        multitask_asr: bool = False,
+    ):
+        self.url = url
+        self.api_key = api_key
+        self.timeout = timeout
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.max_connections = max_connections
+        # Cleared if the service rejects multi-task ASR requests
+        self.multitask_asr = multitask_asr
+        self._client: Optional[httpx.AsyncClient] = None
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                timeout=self.timeout,
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_connections,
+                ),
+                headers={
+                    "Accept": "*/*",
+                    "Authorization": self.api_key or "",
+                },
+            )
+        return self._client
+
+    async def close(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def _retry_delay(self, attempt: int) -> float:
+        """Exponential backoff with full jitter."""
+        return random.uniform(0, self.backoff * 2 ** (attempt - 1))
+
+    async def run(self, pipeline_tasks: List[dict], input_data: dict) -> dict:
+        """Run a pipeline request and return the parsed JSON response.
+
+        Args:
+            pipeline_tasks: Bhashini ``pipelineTasks`` entries.
+            input_data: Bhashini ``inputData`` payload.
+
+        Returns:
+            dict: The pipeline response.
+
+        Raises:
+            httpx.HTTPError: If the request still fails after all attempts.
+        """
+        task = "+".join(t["taskType"] for t in pipeline_tasks)
+        payload = {"pipelineTasks": pipeline_tasks, "inputData": input_data}
+
+        for attempt in range(1, self.max_attempts + 1):
+            start = time.perf_counter()
+            try:
+                response = await self.client.post(self.url, json=payload)
+                response.raise_for_status()
+                metrics.observe(f"bhashini.{task}", time.perf_counter() - start)
+                return response.json()
+            except httpx.HTTPError as e:
+                metrics.observe(f"bhashini.{task}", time.perf_counter() - start, error=True)
+                retryable = not isinstance(e, httpx.HTTPStatusError) or e.response.status_code in RETRY_STATUS_CODES
+                if not retryable or attempt == self.max_attempts:
+                    logger.error(f"Bhashini {task} failed after {attempt} attempt(s): {e!r}")
+                    raise
+                delay = self._retry_delay(attempt)
+                metrics.incr(f"bhashini.{task}.retries")
+                logger.warning(f"Bhashini {task} attempt {attempt} failed ({e!r}), retrying in {delay:.2f}s")
+                await asyncio.sleep(delay)
+
+    async def detect_language(self, audio_base64: str) -> str:
+        """Detect the spoken language of a base64 encoded WAV and return its code."""
+        response = await self.run(
+            [{
+                "taskType": "audio-lang-detection",
+                "config": {
+                    "serviceId": "bhashini/iitmandi/audio-lang-detection/gpu",
+                    "language": {"sourceLanguage": "auto"},
+                    "audioFormat": "wav",
+                },
+            }],
+            {"audio": [{"audioContent": audio_base64}]},
+        )
+        return response['pipelineResponse'][0]['output'][0]['langPrediction'][0]['langCode']
+
+    async def transcribe(self, audio_base64: str, source_lang: str = 'mr', sampling_rate: int = 16000) -> str:
+        """Transcribe a base64 encoded WAV recorded at `sampling_rate`."""
+        response = await self.run(
+            [{
+                "taskType": "asr",
+                "config": {
+                    "language": {"sourceLanguage": source_lang},
+                    "audioFormat": "wav",
+                    "samplingRate": sampling_rate,
+                    "preProcessors": ["vad"],
+                },
+            }],
+            {"audio": [{"audioContent": audio_base64}]},
+        )
+        return response['pipelineResponse'][0]['output'][0]['source']
+
+    async def detect_and_transcribe(self, audio_base64: str, sampling_rate: int = 16000) -> Tuple[str, str]:
+        """Detect the language and transcribe in one multi-task pipeline request.
+
+        Returns:
+            Tuple[str, str]: The detected language code and the transcription.
+        """
+        response = await self.run(
+            [
+                {
+                    "taskType": "audio-lang-detection",
+                    "config": {
+                        "serviceId": "bhashini/iitmandi/audio-lang-detection/gpu",
+                        "language": {"sourceLanguage": "auto"},
+                        "audioFormat": "wav",
+                    },
+                },
+                {
+                    "taskType": "asr",
+                    "config": {
+                        "language": {"sourceLanguage": "auto"},
+                        "audioFormat": "wav",
+                        "samplingRate": sampling_rate,
+                        "preProcessors": ["vad"],
+                    },
+                },
+            ],
+            {"audio": [{"audioContent": audio_base64}]},
+        )
+        detection, asr = response['pipelineResponse'][:2]
+        return detection['output'][0]['langPrediction'][0]['langCode'], asr['output'][0]['source']
+
+    async def text_to_speech(self, text: str, source_lang: str = 'mr', gender: str = 'female', sampling_rate: int = 8000) -> str:
+        """Synthesize speech and return the base64 encoded audio."""
+        response = await self.run(
+            [{
+                "taskType": "tts",
+                "config": {
+                    "language": {"sourceLanguage": source_lang},
+                    "serviceId": "",
+                    "gender": gender,
+                    "samplingRate": sampling_rate,
+                },
+            }],
+            {"input": [{"source": text}]},
+        )
+        return response['pipelineResponse'][0]['audio'][0]['audioContent']
+
+
+bhashini = BhashiniClient(
+    url=BHASHINI_PIPELINE_URL,
+    api_key=os.getenv('MEITY_API_KEY_VALUE'),
+    multitask_asr=BHASHINI_ASR_MODE == "pipeline",
+)
@@ -0,0 +1,243 @@
+"""
+Client-side load balancing over several OpenAI-compatible inference endpoints
+(vLLM replicas).
+
+``PooledTransport`` is an httpx transport: requests built by the OpenAI client
+against the first endpoint are sent to whichever replica the ``EndpointPool``
+picks, so streaming and everything else in the client keep working unchanged.
+
+- Replicas are picked by fewest outstanding requests (``least_outstanding``,
+  ties broken by latency) or by EWMA time to response headers weighted by
+  outstanding requests (``ewma``), set with ``INFERENCE_LB_STRATEGY``.
+- A replica failing ``INFERENCE_EJECT_AFTER_FAILURES`` times in a row (connection
+  errors, 429 and 5xx) is ejected for ``INFERENCE_EJECT_SECONDS``, doubling on
+  each further ejection, and then gets traffic again.
+- Completion requests have no side effects, so they are retried on another
+  replica after a connection error or a 429/502/503/504, up to
+  ``INFERENCE_MAX_ATTEMPTS`` attempts. Nothing is retried once a response
+  has started streaming.
+- Per endpoint metrics are recorded as ``llm.endpoint.<host:port>``.
+"""
+import os
+import random
+import time
+from dataclasses import dataclass
+from typing import Callable, List, Optional, Sequence
+import httpx
+from helpers.metrics import metrics
+from helpers.utils import get_logger
+
+logger = get_logger(__name__)
+
+LB_STRATEGY = os.getenv("INFERENCE_LB_STRATEGY", "least_outstanding")  # or "ewma"
+EJECT_AFTER_FAILURES = int(os.getenv("INFERENCE_EJECT_AFTER_FAILURES", "3"))
+EJECT_SECONDS = float(os.getenv("INFERENCE_EJECT_SECONDS", "10"))
+MAX_EJECT_SECONDS = 120.0
+MAX_ATTEMPTS = int(os.getenv("INFERENCE_MAX_ATTEMPTS", "3"))
+EWMA_ALPHA = 0.3
+
+RETRY_STATUSES = {429, 502, 503, 504}
+# Requests without side effects, safe to send to another replica
+IDEMPOTENT_PATHS = ("/chat/completions", "/completions", "/embeddings", "/models")
+
+
+@dataclass(eq=False)
+class Endpoint:
+    url: httpx.URL
+    outstanding: int = 0
+    ewma: float = 0.0  # seconds to response headers, 0 until measured
+    failures: int = 0
+    ejections: int = 0
+    ejected_until: float = 0.0
+
+    @property
+    def name(self) -> str:
+        return self.url.netloc.decode()
+
+    def available(self, now: float) -> bool:
+        return now >= self.ejected_until
+
+
+class EndpointPool:
+    """Replica selection and health tracking for a list of endpoint base URLs."""
+
+    def __init__(
+        self,
+        urls: Sequence[str],
+        strategy: str = LB_STRATEGY,
+        eject_after: int = EJECT_AFTER_FAILURES,
+        eject_seconds: float = EJECT_SECONDS,
+    ):
+        if not urls:
+            raise ValueError("At least one inference endpoint is required")
+        if strategy not in ("least_outstanding", "ewma"):
+            raise ValueError(f"Invalid INFERENCE_LB_STRATEGY: {strategy}")
+        self.endpoints = [Endpoint(httpx.URL(url.rstrip("/"))) for url in urls]
+        self.strategy = strategy
+        self.eject_after = eject_after
+        self.eject_seconds = eject_seconds
+        for endpoint in self.endpoints:
+            metrics.gauge(f"llm.endpoint.{endpoint.name}.healthy", 1)
+
+    def __len__(self) -> int:
+        return len(self.endpoints)
+
+    def _score(self, endpoint: Endpoint):
+        if self.strategy == "ewma":
+            # Unmeasured replicas score 0 and get probed first
+            return endpoint.ewma * (endpoint.outstanding + 1)
+        return (endpoint.outstanding, endpoint.ewma)
+
+    def pick(self, exclude: Sequence[Endpoint] = ()) -> Optional[Endpoint]:
+        """The best available replica not in `exclude`, or None if none is left."""
+        now = time.monotonic()
+        candidates = [e for e in self.endpoints if e not in exclude]
+        if not candidates:
+            return None
+        available = [e for e in candidates if e.available(now)]
+        if not available:
+            # Everything is ejected: try whichever replica comes back first rather than failing
+            return min(candidates, key=lambda e: e.ejected_until)
+        best = min(self._score(e) for e in available)
+        return random.choice([e for e in available if self._score(e) == best])
+
+    def rewrite(self, url: httpx.URL, endpoint: Endpoint) -> httpx.URL:
+        """Point a URL built against the first endpoint at another one."""
+        base = self.endpoints[0].url
+        path = url.path[len(base.path):] if url.path.startswith(base.path) else url.path
+        return url.copy_with(
+            scheme=endpoint.url.scheme,
+            host=endpoint.url.host,
+            port=endpoint.url.port,
+            path=endpoint.url.path + path,
+        )
+
+    def acquire(self, endpoint: Endpoint) -> None:
+        endpoint.outstanding += 1
+        metrics.incr(f"llm.endpoint.{endpoint.name}.requests")
+        metrics.gauge(f"llm.endpoint.{endpoint.name}.outstanding", endpoint.outstanding)
+
+    def release(self, endpoint: Endpoint) -> None:
+        endpoint.outstanding -= 1
+        metrics.gauge(f"llm.endpoint.{endpoint.name}.outstanding", endpoint.outstanding)
+
+    def succeeded(self, endpoint: Endpoint, latency: float) -> None:
+        endpoint.ewma = latency if not endpoint.ewma else endpoint.ewma + EWMA_ALPHA * (latency - endpoint.ewma)
+        metrics.observe(f"llm.endpoint.{endpoint.name}", latency)
+        metrics.gauge(f"llm.endpoint.{endpoint.name}.ewma_ms", round(endpoint.ewma * 1000, 1))
+        # Requests sent before an ejection can still finish during it, that says nothing new
+        if not endpoint.available(time.monotonic()):
+            return
+        if endpoint.ejections:
+            logger.info(f"Inference endpoint {endpoint.name} is healthy again")
+            metrics.gauge(f"llm.endpoint.{endpoint.name}.healthy", 1)
+        endpoint.failures = 0
+        endpoint.ejections = 0
+
+    def failed(self, endpoint: Endpoint, latency: float, reason: str) -> None:
+        metrics.observe(f"llm.endpoint.{endpoint.name}", latency, error=True)
+        if not endpoint.available(time.monotonic()):
+            return
+        endpoint.failures += 1
+        if endpoint.failures < self.eject_after:
+            return
+        duration = min(self.eject_seconds * 2 ** endpoint.ejections, MAX_EJECT_SECONDS)
+        endpoint.ejected_until = time.monotonic() + duration
+        endpoint.ejections += 1
+        endpoint.failures = 0
+        metrics.incr(f"llm.endpoint.{endpoint.name}.ejections")
+        metrics.gauge(f"llm.endpoint.{endpoint.name}.healthy", 0)
+        logger.warning(f"Ejecting inference endpoint {endpoint.name} for {duration:.0f}s after {reason}")
+
+
+class _ReleasingStream(httpx.AsyncByteStream):
+    """Response body that releases its replica once it has been read or closed."""
+
+    def __init__(self, stream: httpx.AsyncByteStream, release: Callable[[], None]):
+        self._stream = stream
+        self._release = release
+
+    async def __aiter__(self):
+        async for chunk in self._stream:
+            yield chunk
+
+    async def aclose(self) -> None:
+        try:
+            await self._stream.aclose()
+        finally:
+            if self._release is not None:
+                self._release()
+                self._release = None
+
+
+class PooledTransport(httpx.AsyncBaseTransport):
+    """httpx transport that spreads requests over the replicas of an EndpointPool."""
+
+    def __init__(
+        self,
+        pool: EndpointPool,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+        max_attempts: int = MAX_ATTEMPTS,
+    ):
+        self.pool = pool
+        self.max_attempts = max_attempts
+        self._transport = transport or httpx.AsyncHTTPTransport()
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        body = await request.aread()
+        retryable = request.method in ("GET", "HEAD") or request.url.path.endswith(IDEMPOTENT_PATHS)
+        attempts = min(self.max_attempts, len(self.pool)) if retryable else 1
+        headers = request.headers.copy()
+        headers.pop("host", None)
+
+        tried: List[Endpoint] = []
+        error: Optional[Exception] = None
+        for attempt in range(attempts):
+            endpoint = self.pool.pick(exclude=tried)
+            if endpoint is None:
+                break
+            tried.append(endpoint)
+            if attempt:
+                metrics.incr(f"llm.endpoint.{endpoint.name}.retries")
+
+            upstream = httpx.Request(
+                request.method,
+                self.pool.rewrite(request.url, endpoint),
+                headers=headers,
+                content=body,
+                extensions=request.extensions,
+            )
+            self.pool.acquire(endpoint)
+            started = time.perf_counter()
+            try:
+                response = await self._transport.handle_async_request(upstream)
+            except httpx.TransportError as e:
+                self.pool.release(endpoint)
+                self.pool.failed(endpoint, time.perf_counter() - started, type(e).__name__)
+                logger.warning(f"Inference endpoint {endpoint.name} failed: {type(e).__name__}: {e}")
+                error = e
+                continue
+
+            latency = time.perf_counter() - started
+            if response.status_code in RETRY_STATUSES or response.status_code >= 500:
+                self.pool.failed(endpoint, latency, f"HTTP {response.status_code}")
+                if attempt < attempts - 1 and response.status_code in RETRY_STATUSES:
+                    await response.aclose()
+                    self.pool.release(endpoint)
+                    continue
+            else:
+                self.pool.succeeded(endpoint, latency)
+
+            return httpx.Response(
+                status_code=response.status_code,
+                headers=response.headers,
+                stream=_ReleasingStream(response.stream, lambda e=endpoint: self.pool.release(e)),
+                extensions=response.extensions,
+            )
+
+        if error is not None:
+            raise error
+        raise httpx.ConnectError("No inference endpoint available", request=request)
+
+    async def aclose(self) -> None:
+        await self._transport.aclose()
@@ -0,0 +1,111 @@
+"""
+Lightweight in-process metrics.
+
+Latencies and counters are kept per worker process and exposed on
+``/api/health/metrics``. Recording is thread safe so that metrics can also be
+updated from worker threads.
+"""
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from typing import Dict, Iterator
+
+
+class LatencyStats:
+    """Count, error count and latency distribution over a window of recent samples."""
+
+    def __init__(self, window: int = 1024):
+        self.count = 0
+        self.errors = 0
+        self.total = 0.0
+        self.max = 0.0
+        self._recent = deque(maxlen=window)
+
+    def observe(self, seconds: float, error: bool = False) -> None:
+        self.count += 1
+        self.errors += int(error)
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        self._recent.append(seconds)
+
+    def percentile(self, q: float) -> float:
+        if not self._recent:
+            return 0.0
+        samples = sorted(self._recent)
+        return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+    def snapshot(self) -> Dict[str, float]:
+        return {
+            "count": self.count,
+            "errors": self.errors,
+            "avg_ms": round(self.total / self.count * 1000, 1) if self.count else 0.0,
+            "p50_ms": round(self.percentile(0.50) * 1000, 1),
+            "p95_ms": round(self.percentile(0.95) * 1000, 1),
+            "max_ms": round(self.max * 1000, 1),
+        }
+
+
+class Metrics:
+    """Registry of named latency stats and counters."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._latency: Dict[str, LatencyStats] = {}
+        self._counters: Dict[str, int] = defaultdict(int)
+        self._gauges: Dict[str, float] = {}
+
+    def observe(self, name: str, seconds: float, error: bool = False) -> None:
+        with self._lock:
+            stats = self._latency.get(name)
+            if stats is None:
+                stats = self._latency[name] = LatencyStats()
+            stats.observe(seconds, error)
+
+    def incr(self, name: str, value: int = 1) -> None:
+        with self._lock:
+            self._counters[name] += value
+
+    def gauge(self, name: str, value: float) -> None:
+        """Set the current value of a gauge, e.g. a queue depth."""
+        with self._lock:
+            self._gauges[name] = value
+
+    def counter(self, name: str) -> int:
+        return self._counters.get(name, 0)
+
+    @contextmanager
+    def timer(self, name: str) -> Iterator[None]:
+        """Time a block; exceptions are recorded as errors and re-raised."""
+        start = time.perf_counter()
+        try:
+            yield
+        except BaseException:
+            self.observe(name, time.perf_counter() - start, error=True)
+            raise
+        self.observe(name, time.perf_counter() - start)
+
+    def hit_rate(self, name: str) -> float:
+        """Ratio of ``<name>.hit`` to ``<name>.hit`` + ``<name>.miss``."""
+        hits, misses = self.counter(f"{name}.hit"), self.counter(f"{name}.miss")
+        return hits / (hits + misses) if hits + misses else 0.0
+
+    def snapshot(self) -> Dict[str, dict]:
+        with self._lock:
+            counters = dict(sorted(self._counters.items()))
+            gauges = dict(sorted(self._gauges.items()))
+            latency = {name: stats.snapshot() for name, stats in sorted(self._latency.items())}
+        hit_rates = {
+            name[:-len(".hit")]: round(self.hit_rate(name[:-len(".hit")]), 3)
+            for name in counters if name.endswith(".hit")
+        }
+        return {"latency": latency, "counters": counters, "gauges": gauges, "hit_rates": hit_rates}
+
+    def reset(self) -> None:
+        with self._lock:
+            self._latency.clear()
+            self._counters.clear()
+            self._gauges.clear()
+
+
+metrics = Metrics()
@@ -0,0 +1,81 @@
+"""
+Compiled prompt templates.
+
+Every template in the prompt directory is compiled once, when the registry is
+created, and rendered prompts are cached per (template, context). Prompts that
+depend on the date are rendered with ``today_date`` in their context, so the
+render cache is cleared when the date changes rather than growing a day at a time.
+
+With ``PROMPT_HOT_RELOAD=true`` template files are checked for changes (by
+mtime) on every render, so prompts can be edited without a restart.
+"""
+import os
+import threading
+from datetime import date
+from functools import lru_cache
+from typing import Dict, Hashable, Optional, Tuple
+from jinja2 import Environment, FileSystemLoader, Template
+
+PROMPT_DIR = "assets/prompts"
+PROMPT_HOT_RELOAD = os.getenv("PROMPT_HOT_RELOAD", "false").lower() == "true"
+RENDER_CACHE_SIZE = 256
+
+
+class PromptRegistry:
+    """Compiled templates of a prompt directory and a cache of their renderings."""
+
+    def __init__(self, prompt_dir: str = PROMPT_DIR, hot_reload: bool = PROMPT_HOT_RELOAD):
+        self.prompt_dir = prompt_dir
+        self.hot_reload = hot_reload
+        self.env = Environment(
+            loader=FileSystemLoader(prompt_dir),
+            autoescape=False,  # We don't want HTML escaping for our prompts
+            auto_reload=hot_reload,
+        )
+        self._templates: Dict[str, Template] = {}
+        self._rendered: Dict[Tuple[str, Hashable], str] = {}
+        self._date = date.today()
+        self._lock = threading.Lock()
+        self.load_all()
+
+    def load_all(self) -> None:
+        """Compile every template in the prompt directory."""
+        for name in self.env.list_templates(extensions=["md"]):
+            self._templates[name] = self.env.get_template(name)
+
+    def template(self, name: str) -> Template:
+        if not name.endswith(".md"):
+            name += ".md"
+        template = self._templates.get(name)
+        if template is None or (self.hot_reload and not template.is_up_to_date):
+            # New or edited since it was compiled
+            template = self._templates[name] = self.env.get_template(name)
+            with self._lock:
+                self._rendered = {k: v for k, v in self._rendered.items() if k[0] != name}
+        return template
+
+    def render(self, name: str, context: Optional[Dict] = None) -> str:
+        template = self.template(name)
+        try:
+            key = (template.name, tuple(sorted(context.items())) if context else ())
+            hash(key)
+        except TypeError:
+            # Unhashable context values are rendered every time
+            return template.render(**context)
+
+        today = date.today()
+        with self._lock:
+            if today != self._date or len(self._rendered) >= RENDER_CACHE_SIZE:
+                self._rendered.clear()
+                self._date = today
+            prompt = self._rendered.get(key)
+        if prompt is None:
+            prompt = template.render(**context) if context else template.render()
+            with self._lock:
+                self._rendered[key] = prompt
+        return prompt
+
+
+@lru_cache(maxsize=None)
+def get_prompt_registry(prompt_dir: str = PROMPT_DIR) -> PromptRegistry:
+    return PromptRegistry(prompt_dir)
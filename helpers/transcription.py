@@ -1,11 +1,23 @@
-import os
+import asyncio
 import base64
-import requests
-import json
-from dotenv import load_dotenv
+import wave
 from io import BytesIO
+from typing import Tuple
+import httpx
+from helpers.bhashini import bhashini
+from helpers.metrics import metrics
+from helpers.utils import get_logger
 
-load_dotenv()
+logger = get_logger(__name__)
+
+# Length of the audio prefix sent for language detection
+LANG_DETECT_PREFIX_SECONDS = 4.0
+
+# Base64 characters decoded to read a WAV header (3 KB of audio)
+WAV_HEADER_CHARS = 4096
+
+# Words in a 4xx body telling that the multi-task pipeline is rejected as such
+MULTITASK_UNSUPPORTED_MARKERS = ("pipelinetasks", "tasktype", "audio-lang-detection", "multiple tasks")
 
 def base64_to_audio_file(base64_string: str, filename: str = "audio.wav") -> BytesIO:
     """
@@ -33,7 +45,7 @@ def convert_audio_to_base64(filepath: str) -> str:
     
 
 
-def transcribe_bhashini(audio_base64: str, source_lang='mr'):
+async def transcribe_bhashini(audio_base64: str, source_lang='mr'):
     """
     Transcribes an audio file using the Bhashini service.
 
@@ -42,78 +54,125 @@ def transcribe_bhashini(audio_base64: str, source_lang='mr'):
 
     Returns:
     str: The transcribed text if the request is successful.
-    None: If the request fails, it returns None and prints an error message.
-    """   
-    url = 'https://dhruva-api.bhashini.gov.in/services/inference/pipeline'
-    headers = {
-        'Accept': '*/*',
-        'User-Agent': 'Thunder Client (https://www.thunderclient.com)',
-        'Authorization': os.getenv('MEITY_API_KEY_VALUE'),
-        'Content-Type': 'application/json'
-    }
-    data = {
-        "pipelineTasks": [
-            {
-                "taskType": "asr",
-                "config": {
-                    # "serviceId": "bhashini/ai4bharat/conformer-multilingual-asr",
-                    "language": {
-                        "sourceLanguage": source_lang,
-                    },
-                    "audioFormat": "wav",
-                    "samplingRate": 16000,
-                    "preProcessors": ["vad"],
-                }
-            }
-        ],
-        "inputData": {
-            "audio": [
-                {
-                    "audioContent": audio_base64
-                }
-            ]
-        }
-    }    
-    response = requests.post(url, headers=headers, data=json.dumps(data))
-    response.raise_for_status()
-    response_json = response.json()
-    return response_json['pipelineResponse'][0]['output'][0]['source']
-
-def detect_audio_language_bhashini(audio_base64: str):
+
+    Raises:
+    httpx.HTTPError: If the request fails after retries.
+    """
+    return await bhashini.transcribe(audio_base64, source_lang, wav_sample_rate(audio_base64))
+
+async def detect_audio_language_bhashini(audio_base64: str):
     """
     Detects the language of an audio file using the Bhashini API.
     
     Returns:
     str: The detected language code if the request is successful.
-    str: An error message if the request fails.
+
+    Raises:
+    httpx.HTTPError: If the request fails after retries.
     """
-    url = 'https://dhruva-api.bhashini.gov.in/services/inference/pipeline'
-    headers = {
-        'Accept': '*/*',
-        'Authorization': os.getenv('MEITY_API_KEY_VALUE'),
-    }
-    data = {
-        "pipelineTasks": [
-            {
-                "taskType": "audio-lang-detection",
-                "config": {
-                    "serviceId": "bhashini/iitmandi/audio-lang-detection/gpu",
-                    "language": {
-                        "sourceLanguage": "auto"
-                    },
-                    "audioFormat": "wav",
-                }
-            }
-        ],
-        "inputData": {
-            "audio": [{"audioContent": audio_base64}]
-        }
-    }
-
-    response = requests.post(url, headers=headers, json=data)
-    response.raise_for_status()
-    response_json = response.json()
-    detected_language_code = response_json['pipelineResponse'][0]['output'][0]['langPrediction'][0]['langCode']
+    detected_language_code = await bhashini.detect_language(audio_base64)
+    return supported_language(detected_language_code)
 
+def supported_language(lang_code: str) -> str:
     # NOTE: Keeping only English and Marathi for now
-    return 'en' if detected_language_code == 'en' else 'mr'
\ No newline at end of file
+    return 'en' if lang_code == 'en' else 'mr'
+
+def wav_sample_rate(audio_base64: str, default: int = 16000) -> int:
+    """The sample rate in the header of a base64 encoded WAV, or `default` if it cannot be read."""
+    try:
+        with wave.open(BytesIO(base64.b64decode(audio_base64[:WAV_HEADER_CHARS])), "rb") as src:
+            return src.getframerate()
+    except (wave.Error, EOFError, ValueError):
+        return default
+
+def trim_wav_base64(audio_base64: str, seconds: float) -> str:
+    """
+    Return the first `seconds` of a base64 encoded WAV, base64 encoded.
+    Audio that is shorter or cannot be parsed as WAV is returned unchanged.
+    Only the needed prefix of the base64 string is decoded.
+    """
+    try:
+        # Read the format from the start of the file, then decode just enough for the prefix
+        header = base64.b64decode(audio_base64[:WAV_HEADER_CHARS])
+        with wave.open(BytesIO(header), "rb") as src:
+            params = src.getparams()
+        n_frames = int(params.framerate * seconds)
+        if params.nframes <= n_frames:
+            return audio_base64
+        n_bytes = len(header) + n_frames * params.sampwidth * params.nchannels
+        with wave.open(BytesIO(base64.b64decode(audio_base64[:-(-n_bytes // 3) * 4])), "rb") as src:
+            frames = src.readframes(n_frames)
+    except (wave.Error, EOFError, ValueError):
+        return audio_base64
+
+    out = BytesIO()
+    with wave.open(out, "wb") as dst:
+        dst.setparams(params)
+        dst.writeframes(frames)
+    return base64.b64encode(out.getvalue()).decode('utf-8')
+
+async def detect_and_transcribe_bhashini(audio_base64: str, likely_lang: str = 'mr') -> Tuple[str, str]:
+    """
+    Detects the language of an audio file and transcribes it.
+
+    If the service accepts multi-task pipelines, both run in one request.
+    Otherwise the language is detected on a short prefix of the audio while
+    the full audio is transcribed speculatively in `likely_lang`; it is only
+    transcribed again if the detected language differs.
+
+    Returns:
+    Tuple[str, str]: The transcription and the language code.
+    """
+    rate = wav_sample_rate(audio_base64)
+    if bhashini.multitask_asr:
+        try:
+            lang_code, transcription = await bhashini.detect_and_transcribe(audio_base64, rate)
+            return transcription, supported_language(lang_code)
+        except (httpx.HTTPStatusError, KeyError, IndexError, ValueError) as e:
+            if _multitask_unsupported(e):
+                # The service does not run this pipeline, don't try again in this process
+                logger.warning(f"Multi-task ASR pipeline not supported, using speculative transcription: {e!r}")
+                bhashini.multitask_asr = False
+            elif isinstance(e, httpx.HTTPStatusError) and e.response.status_code >= 500:
+                raise
+            else:
+                logger.warning(f"Multi-task ASR failed, using speculative transcription for this request: {e!r}")
+
+    speculative = asyncio.create_task(bhashini.transcribe(audio_base64, likely_lang, rate))
+    try:
+        lang_code = supported_language(
+            await bhashini.detect_language(trim_wav_base64(audio_base64, LANG_DETECT_PREFIX_SECONDS))
+        )
+    except httpx.HTTPError as e:
+        logger.warning(f"Language detection failed, keeping '{likely_lang}': {e!r}")
+        lang_code = likely_lang
+    except BaseException:
+        _discard(speculative)
+        raise
+
+    if lang_code == likely_lang:
+        metrics.incr("asr.speculative.hit")
+        return await speculative, lang_code
+
+    _discard(speculative)
+    metrics.incr("asr.speculative.miss")
+    return await bhashini.transcribe(audio_base64, lang_code, rate), lang_code
+
+def _multitask_unsupported(e: Exception) -> bool:
+    """
+    Whether Bhashini rejected the multi-task pipeline itself: 501, or a 4xx
+    that names the pipeline tasks. Anything else (a 429, a bad clip) only
+    concerns the one request.
+    """
+    if not isinstance(e, httpx.HTTPStatusError):
+        return False
+    status = e.response.status_code
+    if status == 501:
+        return True
+    body = e.response.text.casefold()
+    return status in (400, 404, 422) and any(marker in body for marker in MULTITASK_UNSUPPORTED_MARKERS)
+
+def _discard(task: asyncio.Task) -> None:
+    """Cancel a speculative transcription that is not needed, and retrieve its outcome once it ends."""
+    task.cancel()
+    task.add_done_callback(lambda t: t.cancelled() or t.exception())
@@ -1,43 +1,7 @@
-import os
 import base64
-import requests
-from dotenv import load_dotenv
+from helpers.bhashini import bhashini
 
-load_dotenv()
-
-def text_to_speech_bhashini(text, source_lang='mr', gender='female', sampling_rate=8000):
-    url = 'https://dhruva-api.bhashini.gov.in/services/inference/pipeline'
-    headers = {
-        'Accept': '*/*',
-        'Authorization': os.getenv('MEITY_API_KEY_VALUE'),
-        'Content-Type': 'application/json',
-    }
-    data = {
-        "pipelineTasks": [
-            {
-                "taskType": "tts",
-                "config": {
-                    "language": {
-                        "sourceLanguage": source_lang
-                    },
-                    "serviceId": "",  
-                    "gender": gender,
-                    "samplingRate": sampling_rate
-                }
-            }
-        ],
-        "inputData": {
-            "input": [
-                {
-                    "source": text
-                }
-            ]
-        }
-    }
-    response = requests.post(url, headers=headers, json=data)
-    assert response.status_code == 200, f"Error: {response.status_code} {response.text}"
-    response_json = response.json()
-
-    audio_content = response_json['pipelineResponse'][0]['audio'][0]['audioContent']
+async def text_to_speech_bhashini(text, source_lang='mr', gender='female', sampling_rate=8000):
+    audio_content = await bhashini.text_to_speech(text, source_lang, gender=gender, sampling_rate=sampling_rate)
     audio_data = base64.b64decode(audio_content)
-    return audio_data
\ No newline at end of file
+    return audio_data
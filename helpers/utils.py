@@ -2,29 +2,36 @@
 
 import os
 import re
+import math
+from functools import lru_cache
 from typing import List, Dict
 import logging
 from logging.handlers import TimedRotatingFileHandler
 import boto3
+from botocore.config import Config
 from dotenv import load_dotenv
 import base64
 import tiktoken
 import unicodedata as ud
 from datetime import datetime
 import simplejson as json
-from jinja2 import Environment, FileSystemLoader
 
 load_dotenv()
 
+# Shared by the archive workers and request handlers
+S3_MAX_POOL_CONNECTIONS = int(os.getenv("S3_MAX_POOL_CONNECTIONS", "16"))
 
+
+@lru_cache(maxsize=1)
 def get_s3_client():
-    """Get S3 client."""
+    """Get the process-wide S3 client (boto3 clients are thread safe)."""
     return boto3.client(
         's3',
         aws_access_key_id=os.getenv('AWS_ACCESS_KEY_ID'),
         aws_secret_access_key=os.getenv('AWS_SECRET_ACCESS_KEY'),
         region_name=os.getenv('AWS_REGION'),
-        endpoint_url=os.getenv("AWS_ENDPOINT_URL", None)
+        endpoint_url=os.getenv("AWS_ENDPOINT_URL") or None,
+        config=Config(max_pool_connections=S3_MAX_POOL_CONNECTIONS),
     )
 
 
@@ -64,6 +71,12 @@ def get_logger(name):
 
     return logger
 
+@lru_cache(maxsize=None)
+def get_token_encoder(encoding_name: str = 'cl100k_base') -> tiktoken.Encoding:
+    """Get a tiktoken encoder, loaded once per process."""
+    return tiktoken.get_encoding(encoding_name)
+
+
 def count_tokens_str(doc: str) -> int:
     """Count tokens in a string.
 
@@ -73,8 +86,25 @@ def count_tokens_str(doc: str) -> int:
         int: number of tokens in the string
 
     """
-    encoder = tiktoken.get_encoding('cl100k_base')
-    return len(encoder.encode(doc, disallowed_special=()))
+    return len(get_token_encoder().encode(doc, disallowed_special=()))
+
+
+def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Great-circle distance between two points in kilometres."""
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 6371.0 * 2 * math.asin(math.sqrt(a))
+
+
+def fold_place_name(name: str, keep: str = "") -> str:
+    """
+    Casefold a place name and turn punctuation and symbols, except the
+    characters in `keep`, into spaces. Combining marks such as Devanagari
+    vowel signs and viramas are kept, so that पुणे and पाणी stay different names.
+    """
+    text = ud.normalize("NFC", name).casefold()
+    text = "".join(" " if ud.category(char)[0] in "PS" and char not in keep else char for char in text)
+    return re.sub(r"\s+", " ", text).strip()
 
 
 def count_tokens_for_part(part) -> int:
@@ -209,7 +239,7 @@ def post_process_translation(translation: str) -> str:
 
 
 def get_prompt(prompt_file: str, context: Dict = {}, prompt_dir: str = "assets/prompts") -> str:
-    """Load a prompt from a file and format it with a context using Jinja2 templating.
+    """Render a prompt template from the prompt directory with a context using Jinja2 templating.
 
     Args:
         prompt_file (str): Name of the prompt file.
@@ -219,26 +249,15 @@ def get_prompt(prompt_file: str, context: Dict = {}, prompt_dir: str = "assets/p
     Returns:
         str: prompt
     """
-    # if extension is not .md, add it
-    if not prompt_file.endswith(".md"):
-        prompt_file += ".md"
-
-    # Create Jinja2 environment
-    env = Environment(
-        loader=FileSystemLoader(prompt_dir),
-        autoescape=False  # We don't want HTML escaping for our prompts
-    )
-
-    # Get the template
-    template = env.get_template(prompt_file)
-
-    # Render the template with the context
-    prompt = template.render(**context) if context else template.render()
-    
-    return prompt
+    # Templates are compiled once per directory and renderings are cached
+    from helpers.prompts import get_prompt_registry
+    return get_prompt_registry(prompt_dir).render(prompt_file, context)
 
 def upload_audio_to_s3(audio_base64: str, session_id: str, bucket_name: str = None) -> Dict:
-    """Upload base64 encoded audio to S3.
+    """Queue base64 encoded audio for upload to S3.
+
+    The upload happens in the background (see `helpers.archive`), so this
+    returns immediately.
     
     Args:
         audio_base64 (str): Base64 encoded audio content
@@ -246,39 +265,69 @@ def upload_audio_to_s3(audio_base64: str, session_id: str, bucket_name: str = No
         bucket_name (str, optional): S3 bucket name. Defaults to env variable.
         
     Returns:
-        dict: Dictionary containing upload details
+        dict: Dictionary containing upload details; status is 'queued', or
+        'dropped' when the archive queue is full
     """
-    try:
-        if not bucket_name:
-            bucket_name = os.getenv('AWS_S3_BUCKET')
-            
-        if not bucket_name:
-            raise ValueError("S3 bucket name not provided")
-            
-        # Decode base64 content
-        audio_content = base64.b64decode(audio_base64)
-        
-        # Generate unique filename with timestamp
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        filename = f"audio/{session_id}/{timestamp}.wav"
-        
-        # Get S3 client and upload
-        s3_client = get_s3_client()
-        s3_client.put_object(
-            Bucket=bucket_name,
-            Key=filename,
-            Body=audio_content,
-            ContentType='audio/wav'
-        )
+    from helpers.archive import audio_archiver
+
+    if not bucket_name:
+        bucket_name = os.getenv('AWS_S3_BUCKET')
         
-        return {
-            'status': 'success',
-            'bucket': bucket_name,
-            'key': filename,
-            'session_id': session_id
-        }
+    if not bucket_name:
+        raise ValueError("S3 bucket name not provided")
         
-    except Exception as e:
-        logger = get_logger(__name__)
-        logger.error(f"Error uploading audio to S3: {str(e)}")
-        raise
\ No newline at end of file
+    # Decode base64 content
+    audio_content = base64.b64decode(audio_base64)
+    
+    # Generate unique filename with timestamp
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S_%f')
+    filename = f"audio/{session_id}/{timestamp}.wav"
+    
+    queued = audio_archiver.submit(bucket_name, filename, audio_content, content_type='audio/wav')
+    
+    return {
+        'status': 'queued' if queued else 'dropped',
+        'bucket': bucket_name,
+        'key': filename,
+        'session_id': session_id
+    }
+
+
+# Bytes encoded per step; a multiple of 3 so that chunks encode without padding
+BASE64_CHUNK_SIZE = 3 * 64 * 1024
+
+
+class Base64Encoder:
+    """Incremental base64 encoder for bytes arriving in chunks of any size.
+
+    Keeps only the encoded output and at most two pending bytes, so the raw
+    audio never has to be held in memory in full.
+    """
+    def __init__(self):
+        self._pending = b""
+        self._parts = []
+
+    def update(self, chunk: bytes) -> None:
+        data = self._pending + chunk
+        cut = len(data) - len(data) % 3
+        self._parts.append(base64.b64encode(data[:cut]).decode('ascii'))
+        self._pending = data[cut:]
+
+    def getvalue(self) -> str:
+        return "".join(self._parts) + base64.b64encode(self._pending).decode('ascii')
+
+
+def encode_base64_file(fileobj, chunk_size: int = BASE64_CHUNK_SIZE) -> str:
+    """Base64 encode a binary file object chunk by chunk."""
+    encoder = Base64Encoder()
+    while chunk := fileobj.read(chunk_size):
+        encoder.update(chunk)
+    return encoder.getvalue()
+
+
+def iter_base64_decode(data: str, chunk_size: int = BASE64_CHUNK_SIZE // 3 * 4):
+    """Decode a base64 string chunk by chunk, yielding bytes."""
+    # Chunks must be a multiple of 4 characters to decode independently
+    chunk_size -= chunk_size % 4
+    for start in range(0, len(data), chunk_size):
+        yield base64.b64decode(data[start:start + chunk_size])
@@ -13,6 +13,7 @@ from app.config import settings
 from app.routers import chat_router, suggestions_router, transcribe_router, tts_router
 from app.routers.health import router as health_router
 from app.core.cache import cache
+from app.core.ratelimit import RateLimitMiddleware
 from helpers.utils import get_logger
 
 logger = get_logger(__name__)
@@ -36,13 +37,30 @@ async def lifespan(app: FastAPI):
 
     import asyncio
     asyncio.create_task(check_cache())
-    
+
+    # Load the offline gazetteer off the event loop before the first geocode
+    from agents.tools.gazetteer import get_gazetteer
+    await asyncio.to_thread(get_gazetteer)
+
     logger.info("Application startup complete")
     
     yield
     
     # Shutdown
     logger.info("Shutting down MahaVistaar AI API...")
+    from agents.tools.maps import geocoder
+    await geocoder.close()
+    from helpers.bhashini import bhashini
+    await bhashini.close()
+    from helpers.archive import audio_archiver
+    await asyncio.to_thread(audio_archiver.shutdown)
+    from app.core.jobs import job_executor
+    await job_executor.close()
+    from app.core.streams import stream_buffer
+    await stream_buffer.close()
+    from app.core.ratelimit import llm_streams, rate_limiter
+    await rate_limiter.close()
+    await llm_streams.close()
     logger.info("Application shutdown complete")
 
 def create_app() -> FastAPI:
@@ -58,6 +76,9 @@ def create_app() -> FastAPI:
         lifespan=lifespan
     )
     
+    # Rate limits; added first so that CORS headers are also set on 429 responses
+    app.add_middleware(RateLimitMiddleware)
+
     # Add CORS middleware
     app.add_middleware(
         CORSMiddleware,
@@ -0,0 +1,115 @@
+"""
+Benchmark audio preprocessing on a corpus of synthetic voice notes.
+
+Each clip is a speech-like signal (harmonics with a syllable-rate envelope and
+background noise) with silence before and after it, recorded at a typical phone
+sample rate, channel count and sample width. The benchmark reports payload and
+audio duration before and after preprocessing, how much of the known voiced
+region was kept, and processing time.
+
+Usage:
+    python scripts/bench_audio_preprocessing.py [--clips 20] [--seed 0] [--uplink-kbps 256]
+"""
+import argparse
+import io
+import os
+import sys
+import time
+import wave
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import numpy as np
+
+from helpers.audio import TARGET_SAMPLE_RATE, decode_wav, preprocess_audio
+
+RATES = [8000, 16000, 22050, 44100, 48000]
+
+
+def speech_like(seconds: float, rate: int, rng: np.random.Generator) -> np.ndarray:
+    t = np.arange(int(seconds * rate)) / rate
+    f0 = rng.uniform(100, 250)
+    voice = sum(np.sin(2 * np.pi * f0 * k * t) / k for k in range(1, 6))
+    # Syllables at ~4 Hz with short pauses between words
+    envelope = np.clip(np.sin(2 * np.pi * rng.uniform(3, 5) * t), 0, None) ** 0.5
+    return (0.3 * voice * envelope).astype(np.float32)
+
+
+def make_clip(rng: np.random.Generator) -> tuple:
+    rate = int(rng.choice(RATES))
+    channels = int(rng.choice([1, 2]))
+    width = int(rng.choice([2, 2, 3]))
+    lead, speech, tail = rng.uniform(0.5, 5), rng.uniform(3, 40), rng.uniform(0.5, 10)
+
+    noise_level = 10 ** (rng.uniform(-70, -55) / 20)
+    samples = np.concatenate([
+        np.zeros(int(lead * rate), dtype=np.float32),
+        speech_like(speech, rate, rng),
+        np.zeros(int(tail * rate), dtype=np.float32),
+    ])
+    samples += rng.normal(0, noise_level, len(samples)).astype(np.float32)
+    frames = np.repeat(samples[:, None], channels, axis=1)
+
+    ints = (np.clip(frames, -1, 1) * (2 ** (8 * width - 1) - 1)).astype("<i4")
+    if width == 2:
+        raw = ints.astype("<i2").tobytes()
+    else:
+        raw = ints.view(np.uint8).reshape(-1, 4)[:, :3].tobytes()
+
+    buf = io.BytesIO()
+    with wave.open(buf, "wb") as w:
+        w.setnchannels(channels)
+        w.setsampwidth(width)
+        w.setframerate(rate)
+        w.writeframes(raw)
+    meta = {"rate": rate, "channels": channels, "width": width, "lead": lead, "speech": speech, "tail": tail}
+    return buf.getvalue(), meta
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clips", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--uplink-kbps", type=float, default=256, help="Upload bandwidth used to estimate transfer time")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    totals = {"in": 0, "out": 0, "dur_in": 0.0, "dur_out": 0.0, "time": 0.0}
+    print(f"{'format':<18} {'in MB':>7} {'out MB':>7} {'in s':>6} {'out s':>6} {'speech s':>8} {'kept':>6} {'ms':>7}")
+    for _ in range(args.clips):
+        data, meta = make_clip(rng)
+        start = time.perf_counter()
+        output = preprocess_audio(data)
+        elapsed = time.perf_counter() - start
+
+        samples, rate = decode_wav(output)
+        assert rate == min(meta["rate"], TARGET_SAMPLE_RATE) and samples.shape[1] == 1
+        dur_in = meta["lead"] + meta["speech"] + meta["tail"]
+        dur_out = len(samples) / rate
+        # The output must still cover the whole voiced region
+        kept = min(1.0, dur_out / meta["speech"])
+
+        totals["in"] += len(data)
+        totals["out"] += len(output)
+        totals["dur_in"] += dur_in
+        totals["dur_out"] += dur_out
+        totals["time"] += elapsed
+        fmt = f"{meta['rate']}Hz/{meta['channels']}ch/{8 * meta['width']}b"
+        print(
+            f"{fmt:<18} {len(data) / 1e6:7.2f} {len(output) / 1e6:7.2f} {dur_in:6.1f} {dur_out:6.1f} "
+            f"{meta['speech']:8.1f} {kept:6.0%} {elapsed * 1000:7.1f}"
+        )
+
+    reduction = 1 - totals["out"] / totals["in"]
+    upload_in = totals["in"] * 4 / 3 * 8 / (args.uplink_kbps * 1000)
+    upload_out = totals["out"] * 4 / 3 * 8 / (args.uplink_kbps * 1000)
+    print(
+        f"\nPayload: {totals['in'] / 1e6:.1f} MB -> {totals['out'] / 1e6:.1f} MB ({reduction:.0%} smaller)\n"
+        f"Audio sent to ASR: {totals['dur_in']:.0f} s -> {totals['dur_out']:.0f} s\n"
+        f"Base64 upload at {args.uplink_kbps:.0f} kbps: {upload_in:.0f} s -> {upload_out:.0f} s\n"
+        f"Preprocessing: {totals['time'] * 1000 / args.clips:.1f} ms per clip on average"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""
+Compare memory and latency of base64 JSON and binary audio transport for
+/transcribe and /tts on 60-second clips.
+
+Bhashini is replaced by an in-process mock that answers immediately, so the
+numbers only cover the work done by this service. Memory is the peak Python
+allocation (tracemalloc) while the request is handled; request bodies are
+built beforehand. Run with the application's .env (LLM settings are needed to
+import the app).
+
+Usage:
+    python scripts/bench_audio_transport.py [--seconds 60] [--runs 5]
+"""
+import argparse
+import asyncio
+import base64
+import io
+import json
+import math
+import os
+import sys
+import time
+import tracemalloc
+import wave
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import httpx
+
+from helpers.bhashini import bhashini
+from main import create_app
+
+
+def make_wav(seconds: float, rate: int = 16000) -> bytes:
+    """A mono 16-bit tone."""
+    frames = bytearray()
+    for i in range(int(seconds * rate)):
+        sample = int(8000 * math.sin(2 * math.pi * 220 * i / rate))
+        frames += sample.to_bytes(2, "little", signed=True)
+    buf = io.BytesIO()
+    with wave.open(buf, "wb") as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(rate)
+        w.writeframes(bytes(frames))
+    return buf.getvalue()
+
+
+def mock_bhashini(tts_audio_base64: str) -> httpx.MockTransport:
+    def handler(request: httpx.Request) -> httpx.Response:
+        task = json.loads(request.content)["pipelineTasks"][0]["taskType"]
+        if task == "tts":
+            output = {"audio": [{"audioContent": tts_audio_base64}]}
+        elif task == "audio-lang-detection":
+            output = {"output": [{"langPrediction": [{"langCode": "mr"}]}]}
+        else:
+            output = {"output": [{"source": "नमस्कार"}]}
+        return httpx.Response(200, json={"pipelineResponse": [output]})
+    return httpx.MockTransport(handler)
+
+
+async def measure(client: httpx.AsyncClient, runs: int, **request) -> tuple:
+    """Best latency and peak traced memory over several runs."""
+    best, peak, size = float("inf"), 0, 0
+    for _ in range(runs):
+        tracemalloc.start()
+        start = time.perf_counter()
+        response = await client.request(**request)
+        elapsed = time.perf_counter() - start
+        peak = max(peak, tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+        response.raise_for_status()
+        best, size = min(best, elapsed), len(response.content)
+    return best, peak, size
+
+
+async def run(seconds: float, runs: int) -> None:
+    wav = make_wav(seconds)
+    wav_base64 = base64.b64encode(wav).decode("ascii")
+    bhashini._client = httpx.AsyncClient(transport=mock_bhashini(wav_base64))
+    bhashini.multitask_asr = False
+
+    app = create_app()
+    transport = httpx.ASGITransport(app=app)
+    json_body = json.dumps({"audio_content": wav_base64, "session_id": "bench"}).encode()
+    # Unique text per run would bypass the TTS cache; the cache hit path is what repeats in production
+    tts_body = json.dumps({"text": "नमस्कार", "lang_code": "mr"}).encode()
+
+    cases = [
+        ("transcribe json", dict(method="POST", url="/api/transcribe/", content=json_body,
+                                 headers={"Content-Type": "application/json"})),
+        ("transcribe upload", dict(method="POST", url="/api/transcribe/upload",
+                                   files={"file": ("clip.wav", wav, "audio/wav")}, data={"session_id": "bench"})),
+        ("transcribe binary", dict(method="POST", url="/api/transcribe/binary?session_id=bench", content=wav,
+                                   headers={"Content-Type": "audio/wav"})),
+        ("tts json", dict(method="POST", url="/api/tts/", content=tts_body,
+                          headers={"Content-Type": "application/json"})),
+        ("tts audio", dict(method="POST", url="/api/tts/audio", content=tts_body,
+                           headers={"Content-Type": "application/json"})),
+    ]
+
+    print(f"{seconds:.0f}s clip: {len(wav) / 1e6:.2f} MB WAV, {len(wav_base64) / 1e6:.2f} MB base64")
+    print(f"{'case':<20} {'latency':>10} {'peak mem':>10} {'response':>10}")
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60) as client:
+        for name, request in cases:
+            best, peak, size = await measure(client, runs, **request)
+            print(f"{name:<20} {best * 1000:8.1f}ms {peak / 1e6:8.2f}MB {size / 1e6:8.2f}MB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seconds", type=float, default=60)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+    asyncio.run(run(args.seconds, args.runs))
+
+
+if __name__ == "__main__":
+    main()
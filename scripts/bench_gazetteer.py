@@ -0,0 +1,102 @@
+"""
+Measure the offline gazetteer hit rate and lookup latency on logged geocoding queries.
+
+Queries are read from the "Tool Hits" section of the agent usage logs, e.g.
+``forward_geocode (args: {"place_name": "Wagholi, Pune"})``, or from a plain
+text file with one place name per line.
+
+Usage:
+    python scripts/bench_gazetteer.py [--log logs/app.log] [--queries queries.txt]
+"""
+import argparse
+import ast
+import json
+import os
+import re
+import sys
+import time
+from collections import Counter
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from agents.tools.gazetteer import GAZETTEER_PATH, Gazetteer
+
+TOOL_CALL = re.compile(r"forward_geocode \(args: (.*)\)\s*$")
+
+
+def parse_args(raw: str) -> dict:
+    try:
+        args = json.loads(raw)
+    except json.JSONDecodeError:
+        try:
+            args = ast.literal_eval(raw)
+        except (ValueError, SyntaxError):
+            return {}
+    # Tool call args may be logged as a JSON string
+    if isinstance(args, str):
+        return parse_args(args)
+    return args if isinstance(args, dict) else {}
+
+
+def queries_from_log(path: str):
+    with open(path, encoding="utf-8", errors="replace") as f:
+        for line in f:
+            match = TOOL_CALL.search(line)
+            if match:
+                place_name = parse_args(match.group(1)).get("place_name")
+                if place_name:
+                    yield place_name
+
+
+def queries_from_file(path: str):
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield line.strip()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--log", default="logs/app.log", help="Application log with tool usage details")
+    parser.add_argument("--queries", help="Text file with one place name per line (instead of --log)")
+    parser.add_argument("--gazetteer", default=GAZETTEER_PATH)
+    parser.add_argument("--show-misses", type=int, default=20)
+    args = parser.parse_args()
+
+    queries = list(queries_from_file(args.queries) if args.queries else queries_from_log(args.log))
+    if not queries:
+        print("No forward_geocode queries found")
+        return 1
+
+    start = time.perf_counter()
+    gazetteer = Gazetteer.load(args.gazetteer)
+    load_ms = (time.perf_counter() - start) * 1000
+
+    misses = Counter()
+    timings = []
+    for query in queries:
+        start = time.perf_counter()
+        place = gazetteer.lookup(query)
+        timings.append(time.perf_counter() - start)
+        if place is None:
+            misses[query] += 1
+
+    timings.sort()
+    hits = len(queries) - sum(misses.values())
+    print(f"Gazetteer: {len(gazetteer)} names, loaded in {load_ms:.0f} ms")
+    print(f"Queries:   {len(queries)} ({len(set(queries))} distinct)")
+    print(f"Hit rate:  {hits / len(queries):.1%} ({hits}/{len(queries)})")
+    print(
+        f"Latency:   p50 {timings[len(timings) // 2] * 1e6:.0f} us, "
+        f"p99 {timings[int(len(timings) * 0.99)] * 1e6:.0f} us, "
+        f"max {timings[-1] * 1e6:.0f} us"
+    )
+    if misses and args.show_misses:
+        print("\nMost frequent misses (resolved by Nominatim):")
+        for query, count in misses.most_common(args.show_misses):
+            print(f"  {count:>5}  {query}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,62 @@
+"""
+Microbenchmark of system prompt rendering per chat request.
+
+Compares the old approach (a new Jinja2 environment, reading and compiling
+the template on every call) with the prompt registry, with and without hot
+reload.
+
+Usage:
+    python scripts/bench_prompt_render.py [--prompt agrinet_system] [--iterations 2000]
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from jinja2 import Environment, FileSystemLoader
+
+from helpers.prompts import PROMPT_DIR, PromptRegistry
+from helpers.utils import get_today_date_str
+
+
+def render_uncached(prompt_file: str, context: dict) -> str:
+    env = Environment(loader=FileSystemLoader(PROMPT_DIR), autoescape=False)
+    return env.get_template(prompt_file).render(**context)
+
+
+def bench(label: str, render, iterations: int, baseline: float = None) -> float:
+    render()  # warm up
+    start = time.perf_counter()
+    for _ in range(iterations):
+        render()
+    per_call = (time.perf_counter() - start) / iterations * 1e6
+    speedup = f"  ({baseline / per_call:.0f}x faster)" if baseline else ""
+    print(f"{label:<28} {per_call:10.1f} us/render{speedup}")
+    return per_call
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--prompt", default="agrinet_system")
+    parser.add_argument("--iterations", type=int, default=2000)
+    args = parser.parse_args()
+
+    prompt_file = f"{args.prompt}.md"
+    context = {"today_date": get_today_date_str()}
+
+    start = time.perf_counter()
+    registry = PromptRegistry()
+    print(f"Compiled {len(registry._templates)} templates in {(time.perf_counter() - start) * 1000:.1f} ms\n")
+    reloading = PromptRegistry(hot_reload=True)
+    assert registry.render(prompt_file, context) == render_uncached(prompt_file, context)
+
+    baseline = bench("new environment per call", lambda: render_uncached(prompt_file, context), args.iterations)
+    bench("registry", lambda: registry.render(prompt_file, context), args.iterations, baseline)
+    bench("registry, hot reload", lambda: reloading.render(prompt_file, context), args.iterations, baseline)
+    bench("registry, render miss", lambda: registry.template(prompt_file).render(**context), args.iterations, baseline)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+"""
+Load test of SSE framing strategies for streamed answers.
+
+Starts a server process whose /stream endpoint emits a simulated token
+stream (short deltas at a fixed rate, sentences of ~15 tokens) framed in one
+of three ways:
+
+- raw:      one frame per model delta
+- fixed:    deltas coalesced over fixed 100 ms windows (the old debounce_by=0.1)
+- adaptive: app.core.sse.encode_sse (sentence boundary / byte threshold / max delay)
+
+Many clients stream concurrently for each mode. The script reports frames
+sent, frames per second, bytes per frame, time to first token and server CPU
+time per 1000 tokens.
+
+Usage:
+    python scripts/bench_sse.py [--clients 50] [--tokens 400] [--rate 60]
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+os.environ.setdefault("CACHE_TYPE", "memory")
+
+import httpx
+
+PORT = 18200
+WORDS = "farmers should spray neem oil on cotton early in the morning to control aphids".split()
+
+
+async def fake_tokens(count: int, rate: float):
+    for i in range(count):
+        await asyncio.sleep(1 / rate)
+        word = WORDS[i % len(WORDS)]
+        yield (" " + word) + ("." if i % 15 == 14 else "")
+
+
+def create_app():
+    from starlette.applications import Starlette
+    from starlette.responses import JSONResponse, StreamingResponse
+    from starlette.routing import Route
+
+    from app.core.sse import encode_sse, format_event
+
+    async def raw(chunks):
+        n = 0
+        async for chunk in chunks:
+            n += 1
+            yield format_event({"text": chunk}, id=n)
+        yield format_event({}, id=n + 1, event="done")
+
+    async def fixed(chunks, window=0.1):
+        loop = asyncio.get_running_loop()
+        buffer, n, last = "", 0, loop.time()
+        async for chunk in chunks:
+            buffer += chunk
+            if loop.time() - last >= window:
+                n += 1
+                yield format_event({"text": buffer}, id=n)
+                buffer, last = "", loop.time()
+        if buffer:
+            n += 1
+            yield format_event({"text": buffer}, id=n)
+        yield format_event({}, id=n + 1, event="done")
+
+    async def stream(request):
+        mode = request.query_params["mode"]
+        chunks = fake_tokens(int(request.query_params["tokens"]), float(request.query_params["rate"]))
+        body = {"raw": raw, "fixed": fixed, "adaptive": encode_sse}[mode](chunks)
+        return StreamingResponse(body, media_type="text/event-stream")
+
+    async def cpu(request):
+        return JSONResponse({"cpu": time.process_time()})
+
+    return Starlette(routes=[Route("/stream", stream), Route("/cpu", cpu)])
+
+
+def serve(port: int):
+    import uvicorn
+    uvicorn.run(create_app(), port=port, log_level="error")
+
+
+async def run_mode(client: httpx.AsyncClient, mode: str, args) -> dict:
+    params = {"mode": mode, "tokens": args.tokens, "rate": args.rate}
+    cpu_before = (await client.get("/cpu")).json()["cpu"]
+
+    async def one() -> dict:
+        start = time.perf_counter()
+        ttft, frames, size, buffer = None, 0, 0, ""
+        async with client.stream("GET", "/stream", params=params) as response:
+            async for text in response.aiter_text():
+                if ttft is None:
+                    ttft = time.perf_counter() - start
+                size += len(text.encode())
+                buffer += text
+                *complete, buffer = buffer.split("\n\n")
+                frames += sum(1 for f in complete if "data: {\"text\"" in f)
+        return {"ttft": ttft, "frames": frames, "bytes": size, "duration": time.perf_counter() - start}
+
+    started = time.perf_counter()
+    results = await asyncio.gather(*(one() for _ in range(args.clients)))
+    elapsed = time.perf_counter() - started
+    cpu_after = (await client.get("/cpu")).json()["cpu"]
+
+    frames = sum(r["frames"] for r in results)
+    return {
+        "frames": frames,
+        "fps": frames / elapsed,
+        "bytes_per_frame": sum(r["bytes"] for r in results) / frames,
+        "ttft_ms": statistics.median(r["ttft"] for r in results) * 1000,
+        "cpu_ms_per_1k_tokens": (cpu_after - cpu_before) * 1000 / (args.clients * args.tokens / 1000),
+    }
+
+
+async def main(args):
+    server = subprocess.Popen([sys.executable, __file__, "--serve", "--port", str(args.port)])
+    try:
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{args.port}", timeout=None,
+                                     limits=httpx.Limits(max_connections=args.clients + 1)) as client:
+            for _ in range(100):
+                try:
+                    await client.get("/cpu")
+                    break
+                except httpx.TransportError:
+                    await asyncio.sleep(0.1)
+
+            print(f"{args.clients} clients x {args.tokens} tokens at {args.rate:.0f} tokens/s\n")
+            print(f"{'mode':<9} {'frames':>7} {'frames/s':>9} {'B/frame':>8} {'TTFT ms':>8} {'CPU ms/1k tok':>14}")
+            for mode in ("raw", "fixed", "adaptive"):
+                r = await run_mode(client, mode, args)
+                print(
+                    f"{mode:<9} {r['frames']:>7} {r['fps']:>9.0f} {r['bytes_per_frame']:>8.0f} "
+                    f"{r['ttft_ms']:>8.0f} {r['cpu_ms_per_1k_tokens']:>14.1f}"
+                )
+    finally:
+        server.terminate()
+        server.wait()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=50)
+    parser.add_argument("--tokens", type=int, default=400)
+    parser.add_argument("--rate", type=float, default=60, help="Tokens per second per stream")
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--serve", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.serve:
+        serve(args.port)
+    else:
+        asyncio.run(main(args))
@@ -0,0 +1,116 @@
+"""
+Compare one-request-per-session suggestions with batched suggestions.
+
+Sessions finish a chat turn at a steady arrival rate and each schedules a
+suggestions refresh. The suggestions agents are replaced with a simulated
+model whose latency grows with the number of conversations in a request, and
+the script reports LLM requests, tokens and per-session latency (from the
+refresh to suggestions being in the cache) for each batch size.
+
+Usage:
+    python scripts/bench_suggestions_batch.py [--sessions 200] [--rate 5] [--batch-sizes 1,4,8]
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+os.environ.setdefault("CACHE_TYPE", "memory")
+
+from pydantic_ai.messages import ModelRequest, ModelResponse, TextPart, ToolCallPart, UserPromptPart
+from pydantic_ai.models.function import AgentInfo, FunctionModel
+
+from agents.suggestions import batch_suggestions_agent, suggestions_agent
+from app.core.jobs import JOBS, JobExecutor
+from app.utils import update_message_history
+from helpers.metrics import metrics
+import app.tasks.suggestions as suggestions_tasks
+
+QUESTIONS = ["What should I spray on cotton?", "When should I sow soybean?", "What is the onion price in Nashik?"]
+
+
+def simulated_model(base_latency: float, per_conversation: float) -> FunctionModel:
+    async def respond(messages, info: AgentInfo) -> ModelResponse:
+        prompt = messages[-1].parts[-1].content
+        conversations = max(1, prompt.count("**Conversation"))
+        await asyncio.sleep(base_latency + per_conversation * conversations)
+        tool = info.output_tools[0]
+        if "conversation" in str(tool.parameters_json_schema):
+            output = [
+                {"conversation": n, "suggestions": [f"Question {i} for {n}" for i in range(3)]}
+                for n in range(1, conversations + 1)
+            ]
+        else:
+            output = [f"Question {i}" for i in range(3)]
+        return ModelResponse(parts=[ToolCallPart(tool.name, {"response": output})])
+
+    return FunctionModel(respond)
+
+
+async def seed_history(session_id: str):
+    question = QUESTIONS[hash(session_id) % len(QUESTIONS)]
+    await update_message_history(session_id, [
+        ModelRequest(parts=[UserPromptPart(question)]),
+        ModelResponse(parts=[TextPart(f"Here is some advice about: {question} " * 20)]),
+    ])
+
+
+async def run(batch_size: int, args) -> dict:
+    metrics.reset()
+    JOBS["suggestions"].batch_size = batch_size
+    JOBS["suggestions"].batch_window = args.window
+    executor = JobExecutor(concurrency=args.concurrency, queue_size=args.sessions, backend="memory")
+    suggestions_tasks.job_executor = executor
+
+    sessions = [f"bench-{batch_size}-{i}" for i in range(args.sessions)]
+    await asyncio.gather(*(seed_history(s) for s in sessions))
+
+    async def one(session_id: str, delay: float) -> float:
+        await asyncio.sleep(delay)
+        start = time.perf_counter()
+        await suggestions_tasks.refresh_suggestions(session_id, "en")
+        result = await suggestions_tasks.wait_for_suggestions(session_id, "en", timeout=120)
+        assert result, f"no suggestions for {session_id}"
+        return time.perf_counter() - start
+
+    model = simulated_model(args.latency, args.per_conversation)
+    with suggestions_agent.override(model=model), batch_suggestions_agent.override(model=model):
+        started = time.perf_counter()
+        latencies = sorted(await asyncio.gather(*(one(s, i / args.rate) for i, s in enumerate(sessions))))
+        elapsed = time.perf_counter() - started
+    await executor.close()
+
+    counters = metrics.snapshot()["counters"]
+    return {
+        "requests": counters.get("suggestions.requests", 0),
+        "tokens": counters.get("suggestions.tokens", 0),
+        "p50": statistics.median(latencies),
+        "p95": latencies[int(0.95 * (len(latencies) - 1))],
+        "max": latencies[-1],
+        "elapsed": elapsed,
+    }
+
+
+async def main(args):
+    print(f"{'batch':>5} {'requests':>8} {'tokens':>8} {'tok/session':>11} {'p50 s':>6} {'p95 s':>6} {'max s':>6}")
+    for batch_size in args.batch_sizes:
+        r = await run(batch_size, args)
+        print(
+            f"{batch_size:>5} {r['requests']:>8} {r['tokens']:>8} {r['tokens'] / args.sessions:>11.0f} "
+            f"{r['p50']:>6.2f} {r['p95']:>6.2f} {r['max']:>6.2f}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=200)
+    parser.add_argument("--rate", type=float, default=5, help="Sessions finishing a turn per second")
+    parser.add_argument("--batch-sizes", type=lambda s: [int(x) for x in s.split(",")], default=[1, 4, 8])
+    parser.add_argument("--window", type=float, default=0.5, help="Batch collection window in seconds")
+    parser.add_argument("--concurrency", type=int, default=2, help="Background job workers")
+    parser.add_argument("--latency", type=float, default=1.0, help="Simulated seconds per LLM request")
+    parser.add_argument("--per-conversation", type=float, default=0.15, help="Extra seconds per conversation in a request")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,91 @@
+"""
+Benchmark rendering of Beckn tool responses on a 500-item catalog.
+
+Usage:
+    python scripts/bench_tool_render.py [--items 500] [--runs 20]
+"""
+import argparse
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from agents.tools.weather import WeatherResponse
+from agents.tools.warehouse import WarehouseResponse
+
+CONTEXT = {
+    "action": "on_search",
+    "timestamp": "2025-05-01T00:00:00Z",
+    "message_id": "bench",
+    "transaction_id": "bench",
+    "domain": "advisory:weather:mh-vistaar",
+    "version": "1.1.0",
+}
+
+
+def weather_payload(n_items: int) -> dict:
+    items = [
+        {
+            "id": f"item-{i}",
+            "descriptor": {"name": f"Forecast {i}", "short_desc": "Daily forecast", "long_desc": "Clear sky\nLight winds"},
+            "matched": True,
+            "recommended": False,
+            "tags": [
+                {
+                    "descriptor": {"code": f"2025-05-{i % 28 + 1:02d}"},
+                    "list": [
+                        {"descriptor": {"name": "Max Temp"}, "value": "34"},
+                        {"descriptor": {"name": "Min Temp"}, "value": "22"},
+                        {"descriptor": {"name": "Rainfall"}, "value": "0.0"},
+                        {"descriptor": {"name": "Humidity"}, "value": "48"},
+                    ],
+                }
+            ],
+        }
+        for i in range(n_items)
+    ]
+    catalog = {"descriptor": {"name": "IMD"}, "providers": [{"id": "imd", "descriptor": {"name": "IMD"}, "items": items}]}
+    return {"context": CONTEXT, "responses": [{"context": CONTEXT, "message": {"catalog": catalog}}]}
+
+
+def warehouse_payload(n_items: int) -> dict:
+    items = [
+        {
+            "id": str(i),
+            "descriptor": {"name": f"Warehouse {i}", "short_desc": "Cold storage"},
+            "address": {"address": "Plot 1", "district": "Pune", "region": "MH", "taluka": "Haveli", "vilage": "Wagholi", "pinCode": "412207"},
+            "contact": {"person": "Manager", "email": "wh@example.com", "phone": "0000000000", "webUrl": "http://example.com"},
+            "price": {"currency": "INR", "value": "100", "unit": "MT"},
+            "rating": "4",
+            "creator": {"name": "MSWC"},
+            "fulfillment_ids": [],
+            "status": [],
+            "category_ids": [],
+            "tags": [{"list": [{"descriptor": {"code": "capacity"}, "value": "5000"}]}],
+        }
+        for i in range(n_items)
+    ]
+    catalog = {"descriptor": {"name": "MSWC"}, "providers": [{"id": "mswc", "descriptor": {"name": "MSWC", "short_desc": "State warehouses"}, "fulfillments": [], "items": items}]}
+    return {"context": CONTEXT, "responses": [{"context": CONTEXT, "message": {"catalog": catalog}}]}
+
+
+def bench(name: str, model, runs: int) -> None:
+    output = str(model)
+    best = min(timeit.repeat(lambda: str(model), number=1, repeat=runs))
+    print(f"{name:<10} {best * 1000:8.2f} ms/render  {len(output):>9} chars")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--items", type=int, default=500)
+    parser.add_argument("--runs", type=int, default=20)
+    args = parser.parse_args()
+
+    print(f"Rendering catalogs with {args.items} items ({args.runs} runs each)")
+    bench("weather", WeatherResponse.model_validate(weather_payload(args.items)), args.runs)
+    bench("warehouse", WarehouseResponse.model_validate(warehouse_payload(args.items)), args.runs)
+
+
+if __name__ == "__main__":
+    main()
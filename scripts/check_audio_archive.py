@@ -0,0 +1,101 @@
+"""
+Exercise the background audio archiver against a local S3 stand-in.
+
+With --moto an in-process moto mock is used (pip install moto). Otherwise the
+S3 endpoint from AWS_ENDPOINT_URL is used, e.g. MinIO:
+
+    docker run -p 9000:9000 minio/minio server /data
+    AWS_ENDPOINT_URL=http://localhost:9000 AWS_ACCESS_KEY_ID=minioadmin \
+    AWS_SECRET_ACCESS_KEY=minioadmin AWS_REGION=us-east-1 \
+    python scripts/check_audio_archive.py
+
+The script measures how long enqueueing takes on the caller's side, waits for
+the queue to drain, checks every object (including a multipart one) landed in
+the bucket, and prints the archive metrics.
+
+Usage:
+    python scripts/check_audio_archive.py [--moto] [--clips 200] [--bucket audio-archive-check]
+"""
+import argparse
+import base64
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from helpers.archive import AudioArchiver, MULTIPART_THRESHOLD
+from helpers.metrics import metrics
+from helpers.utils import get_s3_client
+
+
+def run(args) -> int:
+    client = get_s3_client()
+    try:
+        client.create_bucket(Bucket=args.bucket)
+    except (client.exceptions.BucketAlreadyOwnedByYou, client.exceptions.BucketAlreadyExists):
+        pass
+
+    archiver = AudioArchiver(queue_size=args.queue_size, workers=args.workers)
+    clip = os.urandom(args.clip_kb * 1024)
+    large = os.urandom(MULTIPART_THRESHOLD + 1024 * 1024)
+
+    keys = []
+    start = time.perf_counter()
+    for i in range(args.clips):
+        key = f"check/clip-{i}.wav"
+        if archiver.submit(args.bucket, key, clip):
+            keys.append(key)
+    if archiver.submit(args.bucket, "check/large.wav", large):
+        keys.append("check/large.wav")
+    enqueue_ms = (time.perf_counter() - start) * 1000
+
+    archiver.join()
+    drain_ms = (time.perf_counter() - start) * 1000
+    archiver.shutdown()
+
+    missing = [key for key in keys if not _exists(client, args.bucket, key)]
+    large_head = client.head_object(Bucket=args.bucket, Key="check/large.wav") if "check/large.wav" in keys else {}
+
+    print(f"Enqueued {args.clips + 1} uploads in {enqueue_ms:.1f} ms ({enqueue_ms / (args.clips + 1):.3f} ms each)")
+    print(f"Queue drained after {drain_ms:.0f} ms, {len(keys)} accepted, {len(missing)} missing")
+    if large_head:
+        # Multipart uploads get an ETag with a part count suffix
+        print(f"Large object ETag: {large_head['ETag']} ({large_head['ContentLength']} bytes)")
+    print(json.dumps({k: v for k, v in metrics.snapshot().items() if k != "hit_rates"}, indent=2))
+    return 1 if missing else 0
+
+
+def _exists(client, bucket: str, key: str) -> bool:
+    try:
+        client.head_object(Bucket=bucket, Key=key)
+        return True
+    except client.exceptions.ClientError:
+        return False
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--moto", action="store_true", help="Use an in-process moto S3 mock")
+    parser.add_argument("--bucket", default="audio-archive-check")
+    parser.add_argument("--clips", type=int, default=200)
+    parser.add_argument("--clip-kb", type=int, default=256)
+    parser.add_argument("--queue-size", type=int, default=256)
+    parser.add_argument("--workers", type=int, default=4)
+    args = parser.parse_args()
+
+    if not args.moto:
+        return run(args)
+
+    from moto import mock_aws
+
+    os.environ.setdefault("AWS_ACCESS_KEY_ID", "testing")
+    os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "testing")
+    os.environ.setdefault("AWS_REGION", "us-east-1")
+    with mock_aws():
+        return run(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,101 @@
+"""
+Hammer the history of one session from many coroutines.
+
+Each writer plays a number of turns: it reads the history, "thinks" for a
+random moment as the agents would, then saves the user prompt and answer of
+its turn. Writes go through either the old read-then-set pattern
+(update_message_history with the full history) or append_message_history.
+Reports how many messages each left in the history out of the number written.
+
+Runs against one of these backends:
+
+- memory:    the in-process cache (default)
+- redis:     a Redis server at REDIS_HOST/REDIS_PORT
+- fakeredis: an in-process fake Redis (needs the fakeredis package), which
+             exercises the WATCH/MULTI path without a server
+
+With a Redis backend the check also fails if the cache gave up on Redis for
+its memory fallback along the way.
+
+Usage:
+    python scripts/check_history_concurrency.py [--backend memory] [--writers 50] [--turns 10]
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import uuid
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from pydantic_ai.messages import ModelRequest, ModelResponse, TextPart, UserPromptPart
+
+
+def turn_messages(writer: int, turn: int) -> list:
+    return [
+        ModelRequest(parts=[UserPromptPart(content=f"question {writer}.{turn}")]),
+        ModelResponse(parts=[TextPart(content=f"answer {writer}.{turn}")]),
+    ]
+
+
+async def writer(mode: str, session_id: str, index: int, turns: int, think: float) -> int:
+    from app.utils import _get_message_history, append_message_history, update_message_history
+
+    conflicts = 0
+    for turn in range(turns):
+        history = await _get_message_history(session_id)
+        await asyncio.sleep(random.uniform(0, think))
+        new_messages = turn_messages(index, turn)
+        if mode == "set":
+            await update_message_history(session_id, [*history, *new_messages])
+        elif await append_message_history(session_id, new_messages, expected_length=len(history)):
+            conflicts += 1
+    return conflicts
+
+
+async def run(mode: str, args) -> int:
+    from app.utils import _get_message_history
+
+    session_id = f"history-check-{uuid.uuid4()}"
+    conflicts = await asyncio.gather(*(writer(mode, session_id, i, args.turns, args.think) for i in range(args.writers)))
+    history = await _get_message_history(session_id)
+    expected = args.writers * args.turns * 2
+    prompts = {part.content for message in history for part in message.parts if part.part_kind == "user-prompt"}
+    print(
+        f"{mode:<7} {len(history):>6} / {expected} messages kept, "
+        f"{len(prompts)} distinct turns, {expected - len(history)} lost"
+    )
+    if mode == "append":
+        print(f"\nappend: {sum(conflicts)} writes landed on a history newer than the one their turn was generated from")
+    return expected - len(history)
+
+
+async def main(args) -> int:
+    from app.core.cache import cache
+
+    if args.backend == "fakeredis":
+        import fakeredis
+        cache._redis.client = fakeredis.FakeAsyncRedis()
+    print(f"{args.writers} writers x {args.turns} turns on one session, cache {args.backend}\n")
+    await run("set", args)
+    lost = await run("append", args)
+    if args.backend != "memory" and cache._use_fallback:
+        print("\nThe cache fell back from Redis to memory during the run")
+        return 1
+    return 1 if lost else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backend", choices=("memory", "redis", "fakeredis"), default="memory")
+    parser.add_argument("--writers", type=int, default=50)
+    parser.add_argument("--turns", type=int, default=10)
+    parser.add_argument("--think", type=float, default=0.01, help="Max seconds between read and write")
+    args = parser.parse_args()
+    # The cache picks its backend when app.core.cache is first imported
+    os.environ["CACHE_TYPE"] = "memory" if args.backend == "memory" else "redis"
+    if args.backend == "fakeredis":
+        # Any host the production placeholder check accepts; the client is replaced
+        os.environ["REDIS_HOST"] = "fakeredis"
+    sys.exit(asyncio.run(main(args)))
@@ -0,0 +1,134 @@
+"""
+Exercise the pooled vLLM client against local fake OpenAI-compatible servers.
+
+Starts one fake /v1/chat/completions server per replica, each with its own
+latency, then sends requests (half of them streamed) through the same model
+the app builds for INFERENCE_ENDPOINT_URLS. Midway one replica is stopped and
+another starts answering 503, to check that requests fail over to the rest.
+Reports how requests were spread, failures seen by callers and the per
+endpoint metrics.
+
+Usage:
+    python scripts/check_llm_pool.py [--replicas 3] [--requests 300] [--concurrency 24] [--strategy ewma]
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from collections import Counter
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+os.environ.setdefault("LLM_PROVIDER", "vllm")
+os.environ.setdefault("LLM_MODEL_NAME", "fake")
+os.environ.setdefault("INFERENCE_ENDPOINT_URL", "http://127.0.0.1:1/v1")
+
+import uvicorn
+from pydantic_ai import Agent
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Route
+
+BASE_PORT = 18100
+
+
+def fake_server(name: str, latency: float, state: dict) -> Starlette:
+    async def completions(request: Request):
+        body = await request.json()
+        state["served"][name] += 1
+        if state["unavailable"] == name:
+            return JSONResponse({"error": {"message": "overloaded"}}, status_code=503)
+        await asyncio.sleep(latency)
+        text = f"answer from {name}"
+        if not body.get("stream"):
+            return JSONResponse({
+                "id": "cmpl", "object": "chat.completion", "created": int(time.time()), "model": body["model"],
+                "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": text}}],
+                "usage": {"prompt_tokens": 10, "completion_tokens": 3, "total_tokens": 13},
+            })
+
+        async def events():
+            for word in text.split():
+                chunk = {
+                    "id": "cmpl", "object": "chat.completion.chunk", "created": int(time.time()), "model": body["model"],
+                    "choices": [{"index": 0, "delta": {"content": word + " "}, "finish_reason": None}],
+                }
+                yield f"data: {json.dumps(chunk)}\n\n"
+                await asyncio.sleep(latency / 4)
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    return Starlette(routes=[Route("/v1/chat/completions", completions, methods=["POST"])])
+
+
+async def main(args):
+    # Read when the pool module is first imported, by get_llm_model
+    os.environ["INFERENCE_LB_STRATEGY"] = args.strategy
+    from agents.models import ModelConfig, get_llm_model
+    from helpers.metrics import metrics
+
+    state = {"served": Counter(), "unavailable": None}
+    latencies = [0.05 + 0.1 * i for i in range(args.replicas)]
+    servers = []
+    for i, latency in enumerate(latencies):
+        config = uvicorn.Config(fake_server(f"replica-{i}", latency, state), port=BASE_PORT + i, log_level="error")
+        servers.append(uvicorn.Server(config))
+    tasks = [asyncio.create_task(server.serve()) for server in servers]
+    while not all(server.started for server in servers):
+        await asyncio.sleep(0.05)
+
+    urls = tuple(f"http://127.0.0.1:{BASE_PORT + i}/v1" for i in range(args.replicas))
+    agent = Agent(get_llm_model(ModelConfig("vllm", "fake", urls, "empty")))
+
+    answered, failures = Counter(), Counter()
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def one(i: int):
+        async with semaphore:
+            if i == args.requests // 3:
+                await servers[-1].shutdown()  # the slowest replica goes away
+                print(f"request {i}: stopped replica-{args.replicas - 1}")
+            if i == args.requests // 2:
+                state["unavailable"] = "replica-0"
+                print(f"request {i}: replica-0 answers 503")
+            try:
+                if i % 2:
+                    async with agent.run_stream("hello") as result:
+                        text = "".join([chunk async for chunk in result.stream_text(delta=True)])
+                else:
+                    text = (await agent.run("hello")).output
+                answered[text.split()[-1]] += 1
+            except Exception as e:
+                failures[type(e).__name__] += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(args.requests)))
+    elapsed = time.perf_counter() - started
+
+    print(f"\n{args.requests} requests in {elapsed:.1f}s with {args.strategy}, replica latencies {latencies}")
+    print(f"Answered by: {dict(sorted(answered.items()))}")
+    print(f"Requests received by replicas: {dict(sorted(state['served'].items()))}")
+    print(f"Failures seen by callers: {dict(failures) or 'none'}")
+    snapshot = metrics.snapshot()
+    endpoint_metrics = {
+        section: {k: v for k, v in values.items() if k.startswith("llm.endpoint.")}
+        for section, values in snapshot.items() if section != "hit_rates"
+    }
+    print(json.dumps(endpoint_metrics, indent=2))
+
+    for server in servers:
+        server.should_exit = True
+    await asyncio.gather(*tasks, return_exceptions=True)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--replicas", type=int, default=3)
+    parser.add_argument("--requests", type=int, default=300)
+    parser.add_argument("--concurrency", type=int, default=24)
+    parser.add_argument("--strategy", choices=["least_outstanding", "ewma"], default="least_outstanding")
+    sys.exit(asyncio.run(main(parser.parse_args())))